@@ -0,0 +1,310 @@
+"""
+Async Data Processing Service
+asyncio counterpart of SecureDataProcessor for high-concurrency outbound calls (requires aiohttp)
+"""
+
+import asyncio
+import os
+import uuid
+
+import aiohttp
+
+from Security_Issue_Python_code_FIXED import (
+    API_BASE_URL,
+    API_KEY,
+    WEBHOOK_ENDPOINT,
+    APIError,
+    SecureDataProcessor,
+)
+from payload_codec import MSGPACK_TYPES, EncodeError, decode_body
+from rate_limit import THROTTLE_STATUSES, RateLimited, parse_retry_after
+
+# Connection pool and concurrency limits. In-flight requests per endpoint are
+# also capped by the shared outbound limiter (OUTBOUND_MAX_CONCURRENCY)
+ASYNC_MAX_CONNECTIONS = int(os.environ.get('ASYNC_MAX_CONNECTIONS', '200'))
+ASYNC_ENDPOINT_CONCURRENCY = int(os.environ.get('ASYNC_ENDPOINT_CONCURRENCY', '64'))
+ASYNC_REQUEST_TIMEOUT = float(os.environ.get('ASYNC_REQUEST_TIMEOUT', '30'))
+
+
+class AsyncSecureDataProcessor:
+    """Non-blocking SecureDataProcessor sharing one HTTP connection pool
+
+    Validation, signature checks, crypto and database access are delegated to a
+    SecureDataProcessor so both versions enforce identical rules and raise the
+    same exception types. External API calls share its circuit breaker,
+    hedger, payload codecs and outbound limiters. Use as an async context
+    manager, or call close().
+    """
+
+    def __init__(self, api_base_url=API_BASE_URL, webhook_endpoint=WEBHOOK_ENDPOINT,
+                 max_connections=ASYNC_MAX_CONNECTIONS,
+                 endpoint_concurrency=ASYNC_ENDPOINT_CONCURRENCY,
+                 timeout=ASYNC_REQUEST_TIMEOUT):
+        self.processor = SecureDataProcessor(api_base_url, webhook_endpoint)
+        self.logger = self.processor.logger
+        self.api_base_url = api_base_url
+        self.webhook_endpoint = webhook_endpoint
+        self.max_connections = max_connections
+        self.endpoint_concurrency = endpoint_concurrency
+        self.timeout = timeout
+
+        self._session = None
+        self._limits = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """Close the shared HTTP connection pool and the processor's workers"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        await asyncio.to_thread(self.processor.close)
+
+    def _get_session(self):
+        # Created lazily so it binds to the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                ssl=True  # SECURE: SSL verification enabled
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    def _limit_for(self, endpoint):
+        """Per-endpoint semaphore bounding in-flight requests"""
+        limit = self._limits.get(endpoint)
+        if limit is None:
+            limit = self._limits[endpoint] = asyncio.Semaphore(self.endpoint_concurrency)
+        return limit
+
+    async def _post(self, endpoint, headers=None, raise_for_status=True, **body):
+        """POST json= or data= to endpoint; returns (status, decoded response or None)"""
+        # The adaptive limiter is shared with the sync processor's threads, so
+        # both back off together when the upstream throttles
+        limiter = self.processor.outbound_limiter(endpoint)
+        started = await limiter.acquire_async()
+        status = None
+        retry_after = None
+        try:
+            # Semaphore and response are released by their context managers even
+            # when the awaiting task is cancelled or the timeout fires
+            async with self._limit_for(endpoint):
+                async with self._get_session().post(endpoint, headers=headers, **body) as response:
+                    status = response.status
+                    if status in THROTTLE_STATUSES:
+                        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    if raise_for_status:
+                        response.raise_for_status()
+                    if response.content_type in MSGPACK_TYPES:
+                        return status, decode_body(await response.read(), response.content_type)
+                    if response.content_type == 'application/json':
+                        return status, await response.json()
+                    return status, None
+        finally:
+            limiter.release(started, status=status, error=status is None, retry_after=retry_after)
+
+    async def call_external_api(self, data):
+        """Make API calls with proper security and error handling
+
+        Same protection as the sync version, sharing its state: fails fast
+        with APIError while the circuit breaker is open, and with hedging
+        enabled a slow call is sent again under the same Idempotency-Key and
+        the losing attempt is cancelled.
+        """
+        breaker = self.processor.api_breaker
+        if not breaker.allow():
+            self.logger.error("API circuit open, failing fast")
+            raise APIError("Upstream unavailable (circuit open)")
+
+        hedger = self.processor.api_hedger
+        try:
+            if hedger is not None:
+                result = await hedger.call_async(self._post_api, "/process", data, uuid.uuid4().hex)
+            else:
+                result = await self._post_api("/process", data)
+        except APIError as e:
+            self.processor._record_api_failure(e)
+            raise
+        except BaseException:
+            # Not an upstream outcome (or cancelled), but a half-open probe must not stay claimed
+            breaker.record_skipped()
+            raise
+        breaker.record_success()
+        return result
+
+    async def _post_api(self, path, data, idempotency_key=None):
+        """POST data to the external API and return the decoded response"""
+        negotiator = self.processor.api_codecs
+        headers = {
+            'Authorization': f'Bearer {API_KEY}',
+            'Accept': negotiator.accept,
+            'User-Agent': 'SecureDataProcessor/2.0'
+        }
+        if idempotency_key:
+            # Lets the upstream recognise a hedged duplicate
+            headers['Idempotency-Key'] = idempotency_key
+
+        url = f"{self.api_base_url}{path}"
+        codec = negotiator.codec_for(url)
+        try:
+            encoded = codec.encode(data)
+        except EncodeError as e:
+            self.logger.error("API request not sent: %s", e)
+            raise APIError("Payload could not be encoded") from e
+
+        try:
+            while True:
+                body, content_headers = encoded
+                try:
+                    _, result = await self._post(url, {**headers, **content_headers}, data=body)
+                    return result
+                except aiohttp.ClientResponseError as e:
+                    # A 415 body was not processed, so resending it differently is safe
+                    if e.status != 415 or not negotiator.reject(url, codec, e.headers or {}):
+                        raise
+                    fallback = negotiator.codec_for(url)
+                    try:
+                        encoded = fallback.encode(data)
+                    except EncodeError:
+                        raise e from None  # Reported as the 415 it is
+                    self.logger.warning("API endpoint rejected %s, falling back to %s",
+                                        codec.name, fallback.name)
+                    codec = fallback
+
+        except RateLimited as e:
+            self.logger.error("API request not sent: %s", e)
+            raise APIError("Client-side rate limit exceeded") from e
+        except asyncio.TimeoutError:
+            self.logger.error("API request timed out")
+            raise APIError(f"Request timeout after {self.timeout:g} seconds")
+        except aiohttp.ClientResponseError as e:
+            self.logger.error("API HTTP error: %s", e.status)
+            raise APIError(f"HTTP {e.status}") from e
+        except aiohttp.ClientError as e:
+            self.logger.error("API request failed: %s", type(e).__name__)
+            raise APIError("Request failed") from e
+
+    async def fetch_user_data(self, user_id):
+        """Fetch user data without blocking the event loop"""
+        return await asyncio.to_thread(self.processor.fetch_user_data, user_id)
+
+    async def upload_to_cloud(self, file_path, bucket_name="company-sensitive-data"):
+        """Upload a file to cloud storage without blocking the event loop"""
+        # Raises CloudStorageError, exactly like the sync version
+        async with self._limit_for('s3'):
+            return await asyncio.to_thread(
+                self.processor.upload_to_cloud, file_path, bucket_name
+            )
+
+    async def send_notification_email(self, recipient, subject, body):
+        """Send a notification email without blocking the event loop"""
+        async with self._limit_for('smtp'):
+            return await asyncio.to_thread(
+                self.processor.send_notification_email, recipient, subject, body
+            )
+
+    async def process_webhook_data(self, webhook_data, signature, delivery_id=None):
+        """Process incoming webhook with SECURE validation and authentication"""
+        # Raises AuthenticationError, exactly like the sync version
+        self.processor.verify_webhook_signature(webhook_data, signature)
+        return await self._handle_webhook(webhook_data,
+                                          self.processor.webhook_delivery_key(delivery_id))
+
+    async def process_webhook_body(self, raw_body, signature, delivery_id=None):
+        """Process a webhook from its raw request body, signed over those exact bytes"""
+        try:
+            webhook_data = self.processor.verify_webhook_body(raw_body, signature)
+        except ValueError as e:
+            self.logger.error("Webhook validation failed: %s", type(e).__name__)
+            return {"status": "error", "message": "Invalid webhook data"}
+        return await self._handle_webhook(webhook_data,
+                                          self.processor.webhook_delivery_key(delivery_id))
+
+    def _claim_delivery(self, delivery_key):
+        # Runs in a worker thread: creating the store and claiming both use SQLite
+        dedup = self.processor.webhook_dedup
+        if dedup is None:
+            return None, True, None
+        return (dedup, *dedup.claim(delivery_key))
+
+    async def _handle_webhook(self, webhook_data, delivery_key=None):
+        # Same dedup rules as the sync processor
+        dedup = None
+        if delivery_key:
+            dedup, claimed, stored = await asyncio.to_thread(self._claim_delivery, delivery_key)
+            if not claimed:
+                self.logger.info("Duplicate webhook delivery ignored")
+                return stored or {"status": "duplicate", "message": "Delivery is being processed"}
+        if dedup is None:
+            return (await self._apply_webhook(webhook_data))[0]
+
+        try:
+            result, final = await self._apply_webhook(webhook_data)
+        except asyncio.CancelledError:
+            # Not processed to the end; the sender's retry must run again
+            dedup.release(delivery_key)
+            raise
+        if final:
+            await asyncio.to_thread(dedup.complete, delivery_key, result)
+        else:
+            await asyncio.to_thread(dedup.release, delivery_key)  # Let the sender's retry run again
+        return result
+
+    async def _apply_webhook(self, webhook_data):
+        """Return (result, final); final is False for failures a retry may fix"""
+        try:
+            permissions = self.processor.permissions
+            if not permissions.loaded:
+                # The first load reads the whole permissions table; later
+                # refreshes run in the index's own background thread
+                await asyncio.to_thread(permissions.ensure_loaded)
+            user_id, action = self.processor.validate_webhook(webhook_data)
+
+            if action == 'delete_user':
+                await asyncio.to_thread(self.processor.delete_user, user_id)
+            elif action == 'update_user':
+                self.processor.invalidate_cached_users([user_id])
+
+            # SECURE: HTTPS with SSL verification
+            status, _ = await self._post(
+                self.webhook_endpoint, json=webhook_data, raise_for_status=False
+            )
+            return {"status": "processed", "webhook_response": status}, True
+
+        except ValueError as e:
+            self.logger.error("Webhook validation failed: %s", e)
+            return {"status": "error", "message": "Invalid webhook data"}, True
+        except PermissionError as e:
+            self.logger.warning("Webhook rejected: %s", e)
+            return {"status": "error", "message": "Not authorized"}, True
+        except Exception as e:
+            self.logger.error("Webhook processing failed: %s", type(e).__name__)
+            return {"status": "error", "message": "Processing failed"}, False
+
+    # CPU-bound crypto runs in worker threads (single items) or the crypto
+    # process pool (batches), never on the event loop
+
+    async def hash_password(self, password):
+        return await asyncio.to_thread(self.processor.hash_password, password)
+
+    async def verify_password(self, password, password_hash):
+        return await asyncio.to_thread(self.processor.verify_password, password, password_hash)
+
+    async def encrypt_many(self, values):
+        return await asyncio.to_thread(self.processor.encrypt_many, values)
+
+    async def decrypt_many(self, encrypted_values):
+        return await asyncio.to_thread(self.processor.decrypt_many, encrypted_values)
+
+    async def hash_passwords(self, passwords):
+        return await asyncio.to_thread(self.processor.hash_passwords, passwords)
+
+    async def verify_passwords(self, pairs):
+        return await asyncio.to_thread(self.processor.verify_passwords, pairs)
@@ -0,0 +1,176 @@
+"""
+Micro-Batching
+Groups small requests into batches by size or deadline and coalesces duplicates
+"""
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class BatchMetrics:
+    """Batch fill and queue delay counters"""
+
+    def __init__(self, max_batch_size):
+        self._lock = threading.Lock()
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.items = 0
+        self.coalesced = 0
+        self.failed_batches = 0
+        self.total_queue_delay = 0.0
+        self.max_queue_delay = 0.0
+
+    def record_batch(self, queue_delays):
+        with self._lock:
+            self.batches += 1
+            self.items += len(queue_delays)
+            self.total_queue_delay += sum(queue_delays)
+            self.max_queue_delay = max(self.max_queue_delay, max(queue_delays))
+
+    def record_coalesced(self):
+        with self._lock:
+            self.coalesced += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failed_batches += 1
+
+    def snapshot(self):
+        """Return the counters plus derived averages as a dict"""
+        with self._lock:
+            batches = self.batches or 1
+            items = self.items or 1
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'coalesced': self.coalesced,
+                'failed_batches': self.failed_batches,
+                'avg_batch_size': self.items / batches,
+                'avg_batch_fill': self.items / batches / self.max_batch_size,
+                'avg_queue_delay_seconds': self.total_queue_delay / items,
+                'max_queue_delay_seconds': self.max_queue_delay,
+            }
+
+
+def payload_key(payload):
+    """Digest of the canonical JSON encoding, used to detect identical payloads"""
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.sha256(encoded).digest()
+
+
+class MicroBatcher:
+    """Collects submitted payloads and hands them to `send_batch` in groups
+
+    A batch is flushed when it reaches `max_batch_size` items or when its oldest
+    item has waited `max_delay` seconds, whichever comes first. `send_batch`
+    receives a list of payloads and must return a list of results in the same
+    order. Identical payloads submitted while one is already queued or in
+    flight share a single future, so callers must treat results as read-only.
+    At most `max_in_flight` batches are sent concurrently; while all senders
+    are busy, waiting batches keep filling up to `max_batch_size`.
+    """
+
+    def __init__(self, send_batch, max_batch_size=64, max_delay=0.005,
+                 max_in_flight=4, coalesce=True):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.send_batch = send_batch
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.coalesce = coalesce
+        self.metrics = BatchMetrics(max_batch_size)
+
+        self._pending = []
+        self._in_flight = {}
+        self._closed = False
+        self._cond = threading.Condition()
+        self._senders = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_in_flight, thread_name_prefix='batch-send')
+        self._thread = threading.Thread(target=self._run, name='batch-flush', daemon=True)
+        self._thread.start()
+
+    def submit(self, payload):
+        """Queue a payload and return a Future for its individual result"""
+        key = payload_key(payload) if self.coalesce else object()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.metrics.record_coalesced()
+                return future
+
+            future = Future()
+            self._in_flight[key] = future
+            self._pending.append((key, payload, future, time.monotonic()))
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch_size:
+                self._cond.notify()
+        return future
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None
+
+            deadline = self._pending[0][3] + self.max_delay
+            while len(self._pending) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            # Waiting for a free sender before cutting the batch lets batches
+            # grow while the upstream is slow
+            self._senders.acquire()
+            batch = self._next_batch()
+            if batch is None:
+                self._senders.release()
+                return
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch):
+        try:
+            now = time.monotonic()
+            self.metrics.record_batch([now - enqueued for _, _, _, enqueued in batch])
+            try:
+                results = self.send_batch([payload for _, payload, _, _ in batch])
+                if len(results) != len(batch):
+                    raise ValueError(
+                        f"Batch response has {len(results)} results for {len(batch)} payloads"
+                    )
+            except Exception as e:
+                self.metrics.record_failure()
+                self._complete(batch, error=e)
+            else:
+                self._complete(batch, results=results)
+        finally:
+            self._senders.release()
+
+    def _complete(self, batch, results=None, error=None):
+        with self._cond:
+            for key, _, _, _ in batch:
+                self._in_flight.pop(key, None)
+        for index, (_, _, future, _) in enumerate(batch):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[index])
+
+    def close(self):
+        """Flush queued payloads and stop the background threads"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
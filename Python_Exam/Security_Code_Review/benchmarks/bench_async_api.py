@@ -0,0 +1,82 @@
+"""
+Benchmark: call_external_api throughput, sync vs async
+Runs both processors against a local stub server with simulated upstream latency and
+reports the peak number of requests the async run actually had in flight
+
+Usage: python benchmarks/bench_async_api.py --requests 500 --latency 0.02 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import StubServer  # noqa: E402
+
+
+def configure_environment(concurrency):
+    """Let the shared outbound limiter start at and allow `concurrency`; must run before import
+
+    The async processor acquires the same adaptive limiter as the sync one,
+    so its defaults (start at 8, at most 64) would cap the run long before
+    the requested concurrency.
+    """
+    os.environ['OUTBOUND_INITIAL_CONCURRENCY'] = str(concurrency)
+    os.environ['OUTBOUND_MAX_CONCURRENCY'] = str(concurrency)
+
+
+def bench_sync(base_url, n):
+    from Security_Issue_Python_code_FIXED import SecureDataProcessor
+
+    processor = SecureDataProcessor(api_base_url=base_url)
+    try:
+        started = time.perf_counter()
+        for i in range(n):
+            processor.call_external_api({"seq": i})
+        return time.perf_counter() - started
+    finally:
+        processor.close()
+
+
+async def bench_async(base_url, n, concurrency):
+    from async_processor import AsyncSecureDataProcessor
+
+    async with AsyncSecureDataProcessor(api_base_url=base_url, max_connections=concurrency,
+                                        endpoint_concurrency=concurrency) as processor:
+        limiter = processor.processor.outbound_limiter(f"{base_url}/process")
+        peak_before = limiter.stats()['peak_in_flight']
+        started = time.perf_counter()
+        await asyncio.gather(*(processor.call_external_api({"seq": i}) for i in range(n)))
+        seconds = time.perf_counter() - started
+        stats = limiter.stats()
+    # The sync run goes first and one call at a time, so any higher peak is the async run's
+    return seconds, max(peak_before, stats['peak_in_flight']), stats['limit']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help="simulated upstream latency per request, in seconds")
+    parser.add_argument('--concurrency', type=int, default=200,
+                        help="async requests in flight; also the outbound limiter's start and max")
+    args = parser.parse_args()
+    configure_environment(args.concurrency)
+
+    with StubServer(latency=args.latency) as server:
+        sync_seconds = bench_sync(server.url, args.requests)
+        async_seconds, peak, limit = asyncio.run(
+            bench_async(server.url, args.requests, args.concurrency)
+        )
+
+    print(f"sync : {args.requests / sync_seconds:10.1f} req/s ({sync_seconds:.2f}s)")
+    print(f"async: {args.requests / async_seconds:10.1f} req/s ({async_seconds:.2f}s), "
+          f"peak {peak} in flight of {args.concurrency} requested (limit now {limit})")
+    print(f"speedup: {sync_seconds / async_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark: choose the bcrypt cost factor for a target hashing latency on this host
+Also reports how verify_passwords scales over the crypto process pool
+
+Usage: python benchmarks/bench_bcrypt_cost.py --target-ms 250
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import bcrypt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def time_hash(rounds, samples):
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        bcrypt.hashpw(b"benchmark-password", bcrypt.gensalt(rounds))
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def pick_rounds(target_seconds, samples, min_rounds=4, max_rounds=16):
+    """Highest cost factor whose median hash time stays within the target"""
+    chosen = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        seconds = time_hash(rounds, samples)
+        print(f"rounds={rounds:2d}  median={seconds * 1000:9.1f} ms")
+        if seconds > target_seconds:
+            break
+        chosen = rounds
+    return chosen
+
+
+def bench_pool(rounds, count):
+    from cryptography.fernet import Fernet
+
+    from crypto_pool import CryptoPool
+
+    key = Fernet.generate_key()
+    pairs = [(f"pw-{i}", bcrypt.hashpw(f"pw-{i}".encode(), bcrypt.gensalt(rounds)))
+             for i in range(count)]
+
+    started = time.perf_counter()
+    for password, password_hash in pairs:
+        bcrypt.checkpw(password.encode(), password_hash)
+    inline_seconds = time.perf_counter() - started
+
+    pool = CryptoPool(Fernet(key), key, bcrypt_rounds=rounds)
+    try:
+        pool.verify_passwords(pairs[:pool.max_workers * 2])  # start the workers
+        started = time.perf_counter()
+        assert all(pool.verify_passwords(pairs))
+        pool_seconds = time.perf_counter() - started
+    finally:
+        pool.close()
+
+    print(f"verify {count} passwords: inline {count / inline_seconds:8.1f}/s, "
+          f"pool({pool.max_workers}) {count / pool_seconds:8.1f}/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--target-ms', type=float, default=250.0)
+    parser.add_argument('--samples', type=int, default=3)
+    parser.add_argument('--verify-count', type=int, default=64)
+    args = parser.parse_args()
+
+    rounds = pick_rounds(args.target_ms / 1000, args.samples)
+    print(f"\nRecommended BCRYPT_ROUNDS={rounds} for a {args.target_ms:g} ms target\n")
+    bench_pool(rounds, args.verify_count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""
+Benchmark: end-to-end SecureDataProcessor workloads against local stand-ins
+Starts the stub API/webhook server, the stub SMTP server, an in-process S3 mock (moto, if
+installed) and a pre-populated SQLite file, drives each method and mixed workloads at the
+given concurrency, and writes ops/s, p50/p95/p99 latency and RSS as JSON
+
+Usage: python benchmarks/bench_e2e.py --users 10000 --concurrency 8 --output run.json
+       python benchmarks/bench_e2e.py --workloads fetch_user_data,mixed_service --baseline run.json
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema import TIMESTAMP_FORMAT  # noqa: E402
+from stub_server import StubServer  # noqa: E402
+from stub_smtp import StubSMTPServer  # noqa: E402
+
+BUCKET = 'bench-bucket'
+EPOCH = datetime(2024, 1, 1)
+
+# Weighted method mixes; weights are relative
+MIXES = {
+    'mixed_reads': {'fetch_user_data': 70, 'find_users_by_username': 20,
+                    'list_users_created_between': 10},
+    'mixed_service': {'fetch_user_data': 40, 'call_external_api': 25, 'process_webhook_data': 20,
+                      'send_notification_email': 10, 'upload_buffer_to_cloud': 5},
+}
+
+
+def configure_environment(db_path, api, smtp, bcrypt_rounds):
+    """Point the processor's configuration at the stand-ins; must run before it is imported"""
+    os.environ.update({
+        'DATABASE_PATH': db_path,
+        'SMTP_SERVER': smtp.host,
+        'SMTP_PORT': str(smtp.port),
+        'SMTP_USE_TLS': 'false',
+        'BCRYPT_ROUNDS': str(bcrypt_rounds),
+    })
+    # Throwaway secrets, so the benchmark never needs real ones
+    for name in ('API_KEY', 'DATABASE_PASSWORD', 'AWS_ACCESS_KEY', 'AWS_SECRET_KEY',
+                 'SMTP_PASSWORD', 'WEBHOOK_SECRET'):
+        os.environ.setdefault(name, f"bench-{name.lower()}")
+    os.environ.setdefault('ENCRYPTION_KEY', base64.urlsafe_b64encode(os.urandom(32)).decode())
+
+
+def start_s3_mock():
+    """Patch botocore with moto's in-process S3, or return None if moto is not installed"""
+    try:
+        from moto import mock_aws
+    except ImportError:
+        try:
+            from moto import mock_s3 as mock_aws  # moto < 5
+        except ImportError:
+            return None
+    mock = mock_aws()
+    mock.start()
+    return mock
+
+
+def populate(processor, users, seed=7):
+    """Fill user_data with encrypted rows spread over one year of created_at, and grant webhooks"""
+    rng = random.Random(seed)
+    password_hash = processor.hash_password('bench-password')
+    rows = []
+    for user_id in range(1, users + 1):
+        created_at = (EPOCH + timedelta(seconds=rng.randrange(365 * 24 * 3600)))
+        rows.append((user_id, f"user{user_id}", password_hash,
+                     processor.encrypt_sensitive_data(f"4111-1111-1111-{user_id % 10000:04d}"),
+                     processor.encrypt_sensitive_data(f"000-00-{user_id % 10000:04d}"),
+                     created_at.strftime(TIMESTAMP_FORMAT)))
+    with processor.connect_to_database() as conn:
+        conn.executemany("INSERT INTO user_data VALUES (?, ?, ?, ?, ?, ?)", rows)
+    # The webhook workload sends update_user as requester 1
+    processor.grant_permission(1, 'update_user')
+    return password_hash
+
+
+class Workloads:
+    """One callable per benchmarked method, each taking a per-thread Random"""
+
+    def __init__(self, processor, users, password_hash, s3_available):
+        self.processor = processor
+        self.users = users
+        self.password_hash = password_hash
+        self.token = processor.encrypt_sensitive_data('4111-1111-1111-1111')
+        self.blob = os.urandom(64 * 1024)
+        self.webhook_key = os.environ['WEBHOOK_SECRET'].encode()
+        self.s3_available = s3_available
+
+    def _user_id(self, rng):
+        return rng.randint(1, self.users)
+
+    def fetch_user_data(self, rng):
+        self.processor.fetch_user_data(self._user_id(rng))
+
+    def find_users_by_username(self, rng):
+        self.processor.find_users_by_username(f"user{self._user_id(rng)}")
+
+    def list_users_created_between(self, rng):
+        start = EPOCH + timedelta(days=rng.randrange(364))
+        self.processor.list_users_created_between(start, start + timedelta(days=1))
+
+    def count_users(self, rng):
+        start = EPOCH + timedelta(days=rng.randrange(335))
+        self.processor.count_users(start, start + timedelta(days=30))
+
+    def call_external_api(self, rng):
+        self.processor.call_external_api({'user_id': self._user_id(rng), 'event': 'bench'})
+
+    def call_external_api_batched(self, rng):
+        self.processor.call_external_api_batched({'user_id': self._user_id(rng), 'event': 'bench'})
+
+    def forward_webhook(self, rng):
+        self.processor.forward_webhook({'user_id': self._user_id(rng), 'action': 'update_user'})
+
+    def process_webhook_data(self, rng):
+        # update_user rather than delete_user, so the table keeps its size
+        webhook = {'user_id': self._user_id(rng), 'action': 'update_user', 'requester_id': 1}
+        signature = hmac.new(self.webhook_key, json.dumps(webhook, sort_keys=True).encode(),
+                             hashlib.sha256).hexdigest()
+        result = self.processor.process_webhook_data(webhook, signature)
+        if result.get('status') != 'processed':
+            raise RuntimeError(result.get('message'))
+
+    def send_notification_email(self, rng):
+        self.processor.send_notification_email(f"user{self._user_id(rng)}@example.com",
+                                               "Benchmark", "Benchmark notification body")
+
+    def upload_buffer_to_cloud(self, rng):
+        self.processor.upload_buffer_to_cloud(self.blob, f"bench/{rng.getrandbits(64):016x}",
+                                              bucket_name=BUCKET)
+
+    def encrypt_sensitive_data(self, rng):
+        self.processor.encrypt_sensitive_data('4111-1111-1111-1111')
+
+    def decrypt_sensitive_data(self, rng):
+        self.processor.decrypt_sensitive_data(self.token)
+
+    def hash_password(self, rng):
+        self.processor.hash_password('bench-password')
+
+    def verify_password(self, rng):
+        self.processor.verify_password('bench-password', self.password_hash)
+
+    def names(self):
+        return ['fetch_user_data', 'find_users_by_username', 'list_users_created_between',
+                'count_users', 'call_external_api', 'call_external_api_batched', 'forward_webhook',
+                'process_webhook_data', 'send_notification_email', 'upload_buffer_to_cloud',
+                'encrypt_sensitive_data', 'decrypt_sensitive_data', 'hash_password',
+                'verify_password']
+
+    def unavailable(self, name):
+        """Reason a workload cannot run here, or None"""
+        if name == 'upload_buffer_to_cloud' and not self.s3_available:
+            return "moto is not installed"
+        return None
+
+    def mix(self, weights):
+        names = [name for name in weights if self.unavailable(name) is None]
+        ops = [getattr(self, name) for name in names]
+        cumulative = list(itertools.accumulate(weights[name] for name in names))
+
+        def run(rng):
+            rng.choices(ops, cum_weights=cumulative)[0](rng)
+
+        return run, [name for name in weights if name not in names]
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def rss_mb():
+    """Current resident set size, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_workload(op, concurrency, ops, duration, warmup, seed):
+    """Run op from `concurrency` threads until `ops` calls or `duration` seconds"""
+    warm_rng = random.Random(seed)
+    for _ in range(warmup):
+        op(warm_rng)
+
+    counter = itertools.count()
+    errors = {}
+    errors_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(seed + index + 1)
+        latencies = []
+        while next(counter) < ops and time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                op(rng)
+            except Exception as e:
+                with errors_lock:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        per_thread = list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(itertools.chain.from_iterable(per_thread))
+    return {
+        'ops': len(latencies),
+        'errors': errors,
+        'seconds': elapsed,
+        'ops_per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': _ms(percentile(latencies, 0.50)),
+        'p95_ms': _ms(percentile(latencies, 0.95)),
+        'p99_ms': _ms(percentile(latencies, 0.99)),
+        'max_ms': _ms(latencies[-1] if latencies else None),
+        'rss_mb': rss_mb(),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def compare(results, baseline_path):
+    """Add new/baseline ratios for throughput and p99 to each workload in both runs"""
+    with open(baseline_path) as f:
+        baseline = json.load(f).get('workloads', {})
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before or 'ops_per_second' not in before or 'ops_per_second' not in result:
+            continue
+        result['vs_baseline'] = {
+            'ops_per_second_ratio': (result['ops_per_second'] / before['ops_per_second']
+                                     if before['ops_per_second'] else None),
+            'p99_ratio': (result['p99_ms'] / before['p99_ms']
+                          if before.get('p99_ms') and result['p99_ms'] is not None else None),
+        }
+
+
+def print_summary(results):
+    """Human-readable table on stderr, so stdout stays valid JSON"""
+    print(f"{'workload':<30}{'ops/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}",
+          file=sys.stderr)
+    for name, result in results.items():
+        if 'skipped' in result:
+            print(f"{name:<30}  skipped: {result['skipped']}", file=sys.stderr)
+            continue
+        print(f"{name:<30}{result['ops_per_second']:>10.1f}{result['p50_ms'] or 0:>9.2f}"
+              f"{result['p95_ms'] or 0:>9.2f}{result['p99_ms'] or 0:>9.2f}"
+              f"{sum(result['errors'].values()):>8}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000, help="rows in the SQLite fixture")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=2000, help="calls per workload")
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help="stop a workload after this many seconds even if --ops is not reached")
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--workloads', default='all',
+                        help="comma-separated method and mix names (default: all)")
+    parser.add_argument('--api-latency', type=float, default=0.005,
+                        help="simulated upstream latency of the stub API, in seconds")
+    parser.add_argument('--smtp-latency', type=float, default=0.0)
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--log-level', default='WARNING',
+                        help="service log level; INFO logs every call and skews the results")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--baseline', help="earlier JSON report to compare against")
+    args = parser.parse_args()
+    # Configured before the processor, whose own basicConfig then does nothing
+    logging.basicConfig(level=args.log_level.upper())
+
+    with tempfile.TemporaryDirectory() as workdir, \
+            StubServer(latency=args.api_latency) as api, \
+            StubSMTPServer(latency=args.smtp_latency) as smtp:
+        configure_environment(os.path.join(workdir, 'bench_users.db'), api, smtp,
+                              args.bcrypt_rounds)
+        s3_mock = start_s3_mock()
+
+        from Security_Issue_Python_code_FIXED import SecureDataProcessor
+
+        processor = SecureDataProcessor(api_base_url=api.url, webhook_endpoint=api.webhook_url)
+        try:
+            if s3_mock is not None:
+                processor._s3_client().create_bucket(Bucket=BUCKET)
+            password_hash = populate(processor, args.users, args.seed)
+            workloads = Workloads(processor, args.users, password_hash, s3_mock is not None)
+
+            names = workloads.names() + list(MIXES)
+            if args.workloads != 'all':
+                names = [name.strip() for name in args.workloads.split(',')]
+
+            results = {}
+            for name in names:
+                if name in MIXES:
+                    op, skipped_ops = workloads.mix(MIXES[name])
+                elif name in workloads.names():
+                    reason = workloads.unavailable(name)
+                    if reason:
+                        results[name] = {'skipped': reason}
+                        continue
+                    op, skipped_ops = getattr(workloads, name), []
+                else:
+                    parser.error(f"unknown workload: {name}")
+                results[name] = run_workload(op, args.concurrency, args.ops, args.duration,
+                                             args.warmup, args.seed)
+                if skipped_ops:
+                    results[name]['skipped_ops'] = skipped_ops
+        finally:
+            processor.close()
+            if s3_mock is not None:
+                s3_mock.stop()
+
+        standins = {'api_requests': dict(api.requests), 'smtp': dict(smtp.stats)}
+
+    if args.baseline:
+        compare(results, args.baseline)
+    report = {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args),
+        },
+        'workloads': results,
+        'standins': standins,
+    }
+
+    print_summary(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
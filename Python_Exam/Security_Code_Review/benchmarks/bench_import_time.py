@@ -0,0 +1,79 @@
+"""
+Benchmark: cold-start import time of the service module, checked against a budget
+Runs `python -X importtime` in fresh interpreters and exits non-zero when over budget
+
+Usage: python benchmarks/bench_import_time.py --budget-ms 80 [--module Security_Issue_Python_code_FIXED]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependencies that must stay off the import path; they load on first use.
+# python-dotenv is left out: it is imported whenever a .env file exists.
+DEFERRED_MODULES = ('requests', 'bcrypt', 'cryptography', 'boto3', 'botocore',
+                    'aiohttp', 'pyarrow', 'smtplib', 'multiprocessing')
+
+DEFAULT_BUDGET_MS = 80
+
+
+def import_once(module):
+    """Return ({module: cumulative microseconds}, loaded deferred modules) for one cold import"""
+    probe = (f"import sys, {module}; "
+             f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))")
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', probe],
+        cwd=SERVICE_DIR, capture_output=True, text=True, check=True
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = int(cumulative)
+    loaded = [name for name in result.stdout.strip().split(',') if name]
+    return timings, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--module', default='Security_Issue_Python_code_FIXED')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    # Warm the bytecode cache so every measured run is a cold start, not a compile
+    import_once(args.module)
+
+    runs = [import_once(args.module) for _ in range(args.runs)]
+    totals = [timings[args.module] / 1000 for timings, _ in runs]
+    median_ms = statistics.median(totals)
+
+    last_timings, loaded = runs[-1]
+    print(f"{args.module}: median {median_ms:.1f} ms over {args.runs} runs "
+          f"(min {min(totals):.1f}, max {max(totals):.1f}); budget {args.budget_ms:.0f} ms")
+    print("\nslowest imports (cumulative, last run):")
+    slowest = sorted(last_timings.items(), key=lambda item: item[1], reverse=True)
+    slowest = [item for item in slowest if item[0] != args.module]
+    for name, micros in slowest[:args.top]:
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if loaded:
+        print(f"\nFAIL: deferred modules loaded at import: {', '.join(loaded)}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print(f"\nFAIL: import time {median_ms:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if not failed:
+        print("\nOK: within budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
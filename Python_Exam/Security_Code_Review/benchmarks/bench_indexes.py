@@ -0,0 +1,109 @@
+"""
+Benchmark: full table scan vs secondary indexes on a synthetic user_data table
+Builds the table without indexes, times lookups, applies the migrations, times them again
+
+Usage: python benchmarks/bench_indexes.py --rows 10000000 [--db /tmp/bench_users.db]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_pool import SQLiteConnectionPool  # noqa: E402
+from schema import TIMESTAMP_FORMAT, USER_DATA_MIGRATIONS, USER_DATA_SCHEMA  # noqa: E402
+
+EPOCH = datetime(2020, 1, 1)
+
+
+def populate(path, rows, seed=7):
+    rng = random.Random(seed)
+    span = 5 * 365 * 24 * 3600  # created_at spread over five years
+
+    def synthetic():
+        for user_id in range(1, rows + 1):
+            created_at = (EPOCH + timedelta(seconds=rng.randrange(span))).strftime(TIMESTAMP_FORMAT)
+            yield (user_id, f"user{rng.randrange(rows)}", b"hash", b"card", b"ssn", created_at)
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    for statement in USER_DATA_SCHEMA:
+        conn.execute(statement)
+    with conn:
+        conn.executemany("INSERT INTO user_data VALUES (?, ?, ?, ?, ?, ?)", synthetic())
+    conn.close()
+
+
+def timed(conn, query, params, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(query, params).fetchall()
+    return (time.perf_counter() - started) / repeat
+
+
+def run_queries(conn, rows, repeat):
+    day_start = (EPOCH + timedelta(days=400)).strftime(TIMESTAMP_FORMAT)
+    day_end = (EPOCH + timedelta(days=401)).strftime(TIMESTAMP_FORMAT)
+    queries = {
+        'username lookup': ("SELECT * FROM user_data WHERE username = ?",
+                            (f"user{rows // 2}",)),
+        'count in 1-day range': ("SELECT COUNT(*) FROM user_data WHERE created_at >= ? AND created_at < ?",
+                                 (day_start, day_end)),
+        'first page of range (100)': ("SELECT * FROM user_data WHERE created_at >= ? AND created_at < ? "
+                                      "ORDER BY created_at, id LIMIT 100",
+                                      (day_start, day_end)),
+    }
+    results = {}
+    for name, (query, params) in queries.items():
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        results[name] = (timed(conn, query, params, repeat), plan[-1][-1])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', help="reuse or create this database file instead of a temp file")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench_users.db')
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        populate(path, args.rows)
+        print(f"populated {args.rows:,} rows in {time.perf_counter() - started:.1f}s ({path})")
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA user_version = 0")
+    for index in ('idx_user_data_username', 'idx_user_data_created_at'):
+        conn.execute(f"DROP INDEX IF EXISTS {index}")
+    conn.commit()
+    before = run_queries(conn, args.rows, args.repeat)
+    conn.close()
+
+    started = time.perf_counter()
+    pool = SQLiteConnectionPool(path, schema=USER_DATA_SCHEMA, migrations=USER_DATA_MIGRATIONS)
+    pool.release(pool.acquire())
+    pool.close_all()
+    print(f"migrations (index build) took {time.perf_counter() - started:.1f}s")
+
+    conn = sqlite3.connect(path)
+    after = run_queries(conn, args.rows, args.repeat)
+    conn.close()
+
+    print(f"\n{'query':28} {'scan ms':>10} {'index ms':>10} {'speedup':>9}")
+    for name, (scan_seconds, _) in before.items():
+        index_seconds, plan = after[name]
+        print(f"{name:28} {scan_seconds * 1000:10.2f} {index_seconds * 1000:10.2f} "
+              f"{scan_seconds / index_seconds:8.0f}x   {plan}")
+
+
+if __name__ == "__main__":
+    main()
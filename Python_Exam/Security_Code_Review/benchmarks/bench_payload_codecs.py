@@ -0,0 +1,114 @@
+"""
+Benchmark: external API payload serializers and compression
+Encode time, wire size and end-to-end latency against the local stub server for every
+serializer x compression pair whose package is installed
+
+Usage: python benchmarks/bench_payload_codecs.py --records 20000 --repeat 20
+"""
+
+import argparse
+import http.client
+import os
+import random
+import statistics
+import sys
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payload_codec import PayloadCodec, decode_body, get_compressor, get_serializer  # noqa: E402
+from stub_server import StubServer  # noqa: E402
+
+SERIALIZERS = ('json', 'orjson', 'msgpack')
+COMPRESSIONS = ('identity', 'gzip', 'zstd')
+
+
+def make_payload(records, seed=0):
+    """Batch of user-like records, repetitive enough to resemble real API traffic"""
+    rng = random.Random(seed)
+    return {"items": [
+        {
+            "id": i,
+            "username": f"user{i:07d}",
+            "email": f"user{i:07d}@example.com",
+            "active": rng.random() < 0.9,
+            "score": round(rng.random() * 100, 3),
+            "tags": rng.sample(["admin", "beta", "billing", "support", "trial"], 2),
+            "created_at": f"2024-{1 + i % 12:02d}-{1 + i % 28:02d} 12:00:00",
+        }
+        for i in range(records)
+    ]}
+
+
+def codecs():
+    for serializer_name in SERIALIZERS:
+        serializer = get_serializer(serializer_name)
+        if serializer is None:
+            print(f"skipping {serializer_name}: not installed")
+            continue
+        for compression in COMPRESSIONS:
+            compressor = get_compressor(compression)
+            if compressor is None and compression != 'identity':
+                print(f"skipping {serializer_name}+{compression}: not installed")
+                continue
+            yield PayloadCodec(serializer, compressor, min_compress_bytes=0)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def post(conn, body, headers):
+    conn.request('POST', '/process', body=body, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    if response.status != 200:
+        raise RuntimeError(f"stub answered {response.status}")
+
+
+def bench_codec(codec, payload, conn, repeat):
+    encode_seconds, (body, headers) = timed(lambda: codec.encode(payload), repeat)
+    decode_seconds, _ = timed(
+        lambda: decode_body(body, headers['Content-Type'], headers.get('Content-Encoding')), repeat)
+    # Encoding is part of every real call, so it is inside the end-to-end time
+    e2e_seconds, _ = timed(lambda: post(conn, *codec.encode(payload)), repeat)
+    return {'codec': codec.name, 'bytes': len(body), 'encode_ms': encode_seconds * 1000,
+            'decode_ms': decode_seconds * 1000, 'e2e_ms': e2e_seconds * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    payload = make_payload(args.records)
+    results = []
+    with StubServer() as server:
+        address = urlsplit(server.url)
+        conn = http.client.HTTPConnection(address.hostname, address.port)  # Keep-alive
+        try:
+            for codec in codecs():
+                post(conn, *codec.encode(payload))  # Warm up
+                results.append(bench_codec(codec, payload, conn, args.repeat))
+        finally:
+            conn.close()
+
+    baseline = next(result for result in results if result['codec'] == 'json+identity')
+    print(f"{args.records} records, median of {args.repeat}")
+    print(f"{'codec':<18}{'wire KB':>10}{'ratio':>8}{'encode ms':>11}{'decode ms':>11}"
+          f"{'e2e ms':>9}")
+    for result in results:
+        print(f"{result['codec']:<18}{result['bytes'] / 1024:>10.1f}"
+              f"{baseline['bytes'] / result['bytes']:>7.1f}x{result['encode_ms']:>11.2f}"
+              f"{result['decode_ms']:>11.2f}{result['e2e_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark: in-memory permission index vs a SQLite lookup per authorization check
+Loads grants for many requesters, then times checks, the bulk load and an incremental refresh
+
+Usage: python benchmarks/bench_permissions.py --requesters 1000000 [--db /tmp/bench_permissions.db]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_pool import SQLiteConnectionPool  # noqa: E402
+from permissions import PermissionIndex  # noqa: E402
+from schema import USER_DATA_MIGRATIONS, USER_DATA_SCHEMA  # noqa: E402
+
+ACTIONS = ('delete_user', 'update_user', 'create_user')
+
+
+def populate(path, requesters, seed=7):
+    """Grant each action to a random half of the requesters, as one bulk version"""
+    rng = random.Random(seed)
+
+    def grants():
+        for requester_id in range(1, requesters + 1):
+            for action in ACTIONS:
+                if rng.random() < 0.5:
+                    yield (requester_id, action, 1, 1)
+
+    pool = SQLiteConnectionPool(path, schema=USER_DATA_SCHEMA, migrations=USER_DATA_MIGRATIONS)
+    pool.release(pool.acquire())
+    pool.close_all()
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany("INSERT INTO permissions VALUES (?, ?, ?, ?)", grants())
+    count = conn.execute("SELECT COUNT(*) FROM permissions").fetchone()[0]
+    conn.close()
+    return count
+
+
+def connector(pool):
+    @contextmanager
+    def connect():
+        with pool.connection() as conn:
+            with conn:
+                yield conn
+    return connect
+
+
+def time_checks(check, probes):
+    started = time.perf_counter()
+    allowed = 0
+    for requester_id, action in probes:
+        if check(requester_id, action):
+            allowed += 1
+    return (time.perf_counter() - started) / len(probes), allowed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requesters', type=int, default=1_000_000)
+    parser.add_argument('--checks', type=int, default=1_000_000)
+    parser.add_argument('--sqlite-checks', type=int, default=100_000,
+                        help="checks for the per-request SQLite baseline")
+    parser.add_argument('--changes', type=int, default=10_000,
+                        help="grants and revocations applied by the incremental refresh")
+    parser.add_argument('--db', help="reuse or create this database file instead of a temp file")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench_permissions.db')
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        rows = populate(path, args.requesters)
+        print(f"populated {rows:,} grants for {args.requesters:,} requesters "
+              f"in {time.perf_counter() - started:.1f}s ({path})")
+
+    pool = SQLiteConnectionPool(path, schema=USER_DATA_SCHEMA, migrations=USER_DATA_MIGRATIONS)
+    index = PermissionIndex(connector(pool), refresh_interval=3600)
+    started = time.perf_counter()
+    index.refresh()
+    load_seconds = time.perf_counter() - started
+    stats = index.stats()
+    print(f"bulk load: {load_seconds:.2f}s, {stats['bitset_bytes'] / 1024:.0f} KiB of bitsets "
+          f"for {stats['actions']} actions")
+
+    rng = random.Random(11)
+    probes = [(rng.randint(1, args.requesters), rng.choice(ACTIONS)) for _ in range(args.checks)]
+
+    # Loop overhead alone, so the per-check figure is the check itself
+    empty, _ = time_checks(lambda requester_id, action: True, probes)
+    memory, allowed = time_checks(index.allows, probes)
+
+    lookup = ("SELECT 1 FROM permissions WHERE requester_id = ? AND action = ? AND granted = 1")
+    with pool.connection() as conn:
+        def sqlite_check(requester_id, action):
+            return conn.execute(lookup, (requester_id, action)).fetchone() is not None
+
+        sample = probes[:args.sqlite_checks]
+        per_request, sqlite_allowed = time_checks(sqlite_check, sample)
+    expected = sum(1 for requester_id, action in sample if index.allows(requester_id, action))
+    if sqlite_allowed != expected:
+        raise RuntimeError(f"Index and table disagree: {expected} != {sqlite_allowed}")
+
+    print(f"\n{'check':24} {'ns/check':>10} {'checks/s':>14}")
+    for name, seconds in (('in-memory index', memory - empty), ('SQLite per request', per_request)):
+        print(f"{name:24} {seconds * 1e9:10.0f} {1 / seconds:14,.0f}")
+    print(f"(loop overhead {empty * 1e9:.0f} ns/check; {allowed / len(probes):.0%} allowed)")
+
+    # Another worker grants and revokes; this one catches up with one refresh
+    writer = PermissionIndex(connector(pool))
+    changes = [(rng.randint(1, args.requesters), rng.choice(ACTIONS), rng.random() < 0.5)
+               for _ in range(args.changes)]
+    started = time.perf_counter()
+    writer.set_many(changes)
+    write_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    index.refresh()
+    refresh_seconds = time.perf_counter() - started
+    final = {(requester_id, action): granted for requester_id, action, granted in changes}
+    stale = sum(1 for (requester_id, action), granted in final.items()
+                if index.allows(requester_id, action) != granted)
+    print(f"\n{args.changes:,} changes written in {write_seconds:.2f}s, "
+          f"applied by incremental refresh in {refresh_seconds * 1000:.1f} ms "
+          f"({stale} stale after refresh)")
+    pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
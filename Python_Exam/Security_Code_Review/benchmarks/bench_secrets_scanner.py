@@ -0,0 +1,131 @@
+"""
+Benchmark: secrets scanner modes on a corpus built from the unmarked and FIXED service files
+Compares one regex per rule with the combined matcher, the prefilters, the process pool and cached re-scans
+
+Usage: python benchmarks/bench_secrets_scanner.py --copies 1000 [--workers 4]
+"""
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+
+import secrets_scanner  # noqa: E402
+from secrets_scanner import RULES, SecretsScanner, iter_files, scan  # noqa: E402
+
+FIXTURES = {
+    'unmarked': os.path.join(os.path.dirname(HERE), 'Security_Issue_Python_code_unmarked.py'),
+    'fixed': os.path.join(HERE, 'Security_Issue_Python_code_FIXED.py'),
+}
+
+
+def build_corpus(root, copies):
+    """Write `copies` variants of each fixture; a trailing comment keeps every digest distinct"""
+    for name, path in FIXTURES.items():
+        with open(path, 'rb') as f:
+            source = f.read()
+        directory = os.path.join(root, name)
+        os.makedirs(directory)
+        for number in range(copies):
+            with open(os.path.join(directory, f"{name}_{number}.py"), 'wb') as f:
+                f.write(source + f"\n# copy {number}\n".encode())
+
+
+def naive_scan(root):
+    """One compiled regex per rule, each run over the whole file; overlapping rules count twice"""
+    patterns = [(rule[0], re.compile(rule[4])) for rule in RULES]
+    findings = 0
+    for path in iter_files([root]):
+        with open(path, 'rb') as f:
+            data = f.read()
+        for _, pattern in patterns:
+            findings += sum(1 for _ in pattern.finditer(data))
+    return findings
+
+
+def single_process(root, prefilter):
+    scanner = SecretsScanner(prefilter=prefilter)
+    return sum(len(scanner.scan_file(path)[4] or ()) for path in iter_files([root]))
+
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def per_fixture(report):
+    counts = dict.fromkeys(FIXTURES, 0)
+    for path, _ in report.findings:
+        counts[os.path.basename(os.path.dirname(path))] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--copies', type=int, default=1000, help="files per fixture")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--modify', type=float, default=0.01,
+                        help="fraction of files changed before the incremental re-scan")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench_secrets_')
+    try:
+        corpus = os.path.join(root, 'corpus')
+        build_corpus(corpus, args.copies)
+        files = list(iter_files([corpus]))
+        size = sum(os.path.getsize(path) for path in files)
+        print(f"corpus: {len(files):,} files, {size / 1024 / 1024:.1f} MiB "
+              f"({args.copies:,} copies of each fixture), {args.workers} worker(s)")
+
+        rows = [('one regex per rule',) + timed(naive_scan, corpus) + (len(files),)]
+        for prefilter in ('none', 'find', 'aho'):
+            if prefilter == 'aho' and secrets_scanner._load_automaton() is None:
+                print("(pyahocorasick not installed; skipping the 'aho' prefilter)")
+                continue
+            rows.append((f"combined, prefilter={prefilter}",)
+                        + timed(single_process, corpus, prefilter) + (len(files),))
+
+        cache_path = os.path.join(root, 'cache.db')
+        seconds, report = timed(scan, [corpus], workers=args.workers, cache_path=cache_path)
+        rows.append((f"pool x{args.workers}, cold cache", seconds, len(report.findings),
+                     report.files_scanned))
+        counts = per_fixture(report)
+
+        seconds, report = timed(scan, [corpus], workers=args.workers, cache_path=cache_path)
+        rows.append(("re-scan, unchanged", seconds, len(report.findings), report.files_scanned))
+
+        # Touched files need hashing but not scanning
+        now = time.time() - 10
+        for path in files:
+            os.utime(path, (now, now))
+        seconds, report = timed(scan, [corpus], workers=args.workers, cache_path=cache_path)
+        rows.append(("re-scan, all touched", seconds, len(report.findings), report.files_scanned))
+
+        changed = files[::max(1, int(1 / args.modify))] if args.modify else []
+        for path in changed:
+            with open(path, 'ab') as f:
+                f.write(b"# edited\n")
+            os.utime(path, (now, now))
+        seconds, report = timed(scan, [corpus], workers=args.workers, cache_path=cache_path)
+        rows.append((f"re-scan, {len(changed)} edited", seconds, len(report.findings),
+                     report.files_scanned))
+
+        print(f"\n{'mode':34} {'seconds':>9} {'MiB/s':>9} {'findings':>9} {'scanned':>8}")
+        for name, seconds, findings, scanned in rows:
+            print(f"{name:34} {seconds:9.3f} {size / 1024 / 1024 / seconds:9.1f} "
+                  f"{findings:9,} {scanned:8,}")
+        print("\nfindings per fixture copy: "
+              + ', '.join(f"{name} {count / args.copies:g}" for name, count in counts.items()))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
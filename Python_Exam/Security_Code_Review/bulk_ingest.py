@@ -0,0 +1,246 @@
+"""
+Bulk Ingest Pipeline
+Validate, hash/encrypt in parallel and write user_data rows in large transactions
+"""
+
+import itertools
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from schema import TIMESTAMP_FORMAT
+
+INSERT_USER_DATA = """
+    INSERT INTO user_data (id, username, password_hash, credit_card_encrypted,
+                           ssn_encrypted, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+class PreparedBatch:
+    """A batch of rows that has already been hashed and encrypted
+
+    Kept on the report when its write fails so retry_failed() can write it
+    again without repeating the bcrypt work. With shards, only the rows of
+    the shards whose write failed are kept; `written` counts the others.
+    `indexes` holds each row's position in the input, and `rejected` the
+    (index, reason) of rows the table refused, e.g. for a duplicate id.
+    """
+
+    __slots__ = ('number', 'rows', 'indexes', 'error', 'written', 'rejected')
+
+    def __init__(self, number, rows, indexes=()):
+        self.number = number
+        self.rows = rows
+        self.indexes = list(indexes)
+        self.error = None
+        self.written = 0
+        self.rejected = []
+
+
+class IngestReport:
+    """Counters, throughput and failed batches of one bulk_ingest run"""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_written = 0
+        self.invalid_rows = []  # (input index, reason); never the values themselves
+        self.failed_batches = []
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows_written / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'rows_read': self.rows_read,
+            'rows_written': self.rows_written,
+            'invalid_rows': len(self.invalid_rows),
+            'failed_batches': len(self.failed_batches),
+            'failed_rows': sum(len(batch.rows) for batch in self.failed_batches),
+            'elapsed_seconds': self.elapsed,
+            'rows_per_second': self.rows_per_second,
+        }
+
+
+def validate_row(row):
+    """Return a reason string if the input row is unusable, else None"""
+    if not isinstance(row, dict):
+        return "row is not a mapping"
+    user_id = row.get('id')
+    if user_id is not None and (not isinstance(user_id, int) or isinstance(user_id, bool)
+                                or user_id <= 0):
+        return "id must be a positive integer"
+    username = row.get('username')
+    if not isinstance(username, str) or not username:
+        return "username is required"
+    if not isinstance(row.get('password'), str) or not row['password']:
+        return "password is required"
+    for field in ('credit_card', 'ssn'):
+        if row.get(field) is not None and not isinstance(row[field], str):
+            return f"{field} must be a string"
+    created_at = row.get('created_at')
+    if created_at is not None and not isinstance(created_at, datetime):
+        # Stored as text that must sort chronologically for the range queries
+        try:
+            datetime.strptime(created_at, TIMESTAMP_FORMAT)
+        except (TypeError, ValueError):
+            return f"created_at must be a datetime or a {TIMESTAMP_FORMAT} string"
+    return None
+
+
+def _created_at(value, default):
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value or default
+
+
+class BulkIngestor:
+    """Three-stage streaming ingest of user_data rows
+
+    1. validate each input row, recording the index and reason of bad rows
+    2. bcrypt-hash passwords and Fernet-encrypt card/SSN fields for a whole
+       batch at once on the processor's crypto process pool
+    3. insert the batch with one executemany inside a single transaction;
+       if a row breaks a constraint (a duplicate id), the batch is inserted
+       again row by row and only the offending rows are reported invalid
+
+    The input is consumed lazily, one batch at a time, and the write of batch
+    N overlaps with hashing batch N+1. `progress` is called with
+    IngestReport.as_dict() after every batch.
+    """
+
+    def __init__(self, processor, batch_size=5000, progress=None):
+        self.processor = processor
+        self.logger = processor.logger
+        self.batch_size = batch_size
+        self.progress = progress
+
+    def run(self, rows):
+        report = IngestReport()
+        numbered = enumerate(rows)
+        pending_write = None
+
+        with ThreadPoolExecutor(1, thread_name_prefix='ingest-write') as writer:
+            for number in itertools.count():
+                chunk = list(itertools.islice(numbered, self.batch_size))
+                if not chunk:
+                    break
+                report.rows_read += len(chunk)
+                batch = self._prepare(number, chunk, report)
+
+                if pending_write is not None:
+                    self._finish(pending_write.result(), report)
+                pending_write = writer.submit(self._write, batch) if batch.rows else None
+
+            if pending_write is not None:
+                self._finish(pending_write.result(), report)
+
+        report.finished = time.perf_counter()
+        return report
+
+    def retry_failed(self, report):
+        """Write the report's failed batches again, reusing their hashed rows"""
+        failed, report.failed_batches = report.failed_batches, []
+        report.finished = None
+        for batch in failed:
+            self._finish(self._write(batch), report)
+        report.finished = time.perf_counter()
+        return report
+
+    def _prepare(self, number, chunk, report):
+        valid = []
+        indexes = []
+        sharded = self.processor.user_shards is not None
+        for index, row in chunk:
+            reason = validate_row(row)
+            if reason is None and sharded and row.get('id') is None:
+                reason = "id is required when user_data is sharded"
+            if reason:
+                report.invalid_rows.append((index, reason))
+            else:
+                valid.append(row)
+                indexes.append(index)
+
+        if not valid:
+            return PreparedBatch(number, [])
+
+        hashes = self.processor.hash_passwords([row['password'] for row in valid])
+        cards = self._encrypt_optional([row.get('credit_card') for row in valid])
+        ssns = self._encrypt_optional([row.get('ssn') for row in valid])
+
+        now = time.strftime(TIMESTAMP_FORMAT)
+        prepared = [
+            (row.get('id'), row['username'], password_hash, card, ssn,
+             _created_at(row.get('created_at'), now))
+            for row, password_hash, card, ssn in zip(valid, hashes, cards, ssns)
+        ]
+        return PreparedBatch(number, prepared, indexes)
+
+    def _encrypt_optional(self, values):
+        present = [value for value in values if value is not None]
+        encrypted = iter(self.processor.encrypt_many(present))
+        return [None if value is None else next(encrypted) for value in values]
+
+    def _write(self, batch):
+        batch.error = None
+        batch.written = 0
+        batch.rejected = []
+        rows = batch.rows
+        shards = self.processor.user_shards
+        positions = range(len(rows))
+        groups = (shards.group(positions, key=lambda position: rows[position][0])
+                  if shards else {None: positions})
+        failed = []
+        # One transaction per shard; each shard has its own writer lock
+        for shard, group in groups.items():
+            try:
+                try:
+                    with self.processor.connect_to_database(shard=shard) as conn:
+                        conn.executemany(INSERT_USER_DATA, [rows[position] for position in group])
+                    batch.written += len(group)
+                except sqlite3.IntegrityError:
+                    # The transaction was rolled back; keep every row but the offending ones
+                    written, rejected = self._write_rows(batch, group, shard)
+                    batch.written += written
+                    batch.rejected.extend(rejected)
+            except Exception as e:
+                # DatabaseError from checkout or sqlite3.Error from the insert
+                batch.error = type(e).__name__
+                failed.extend(group)
+                self.logger.error("Ingest batch %s failed: %s", batch.number, batch.error)
+        if batch.error is not None:
+            batch.rows = [rows[position] for position in failed]
+            batch.indexes = [batch.indexes[position] for position in failed]
+        return batch
+
+    def _write_rows(self, batch, positions, shard):
+        """Insert rows one at a time in one transaction; returns (written, rejected)"""
+        written = 0
+        rejected = []
+        with self.processor.connect_to_database(shard=shard) as conn:
+            for position in positions:
+                try:
+                    # A failed statement is undone on its own; the transaction goes on
+                    conn.execute(INSERT_USER_DATA, batch.rows[position])
+                except sqlite3.IntegrityError as e:
+                    reason = "id already exists" if 'UNIQUE' in str(e) else "row violates a constraint"
+                    rejected.append((batch.indexes[position], reason))
+                else:
+                    written += 1
+        return written, rejected
+
+    def _finish(self, batch, report):
+        report.rows_written += batch.written
+        report.invalid_rows.extend(batch.rejected)
+        if batch.error is not None:
+            report.failed_batches.append(batch)
+        if self.progress:
+            self.progress(report.as_dict())
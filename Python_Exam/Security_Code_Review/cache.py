@@ -0,0 +1,125 @@
+"""
+User Record Cache
+Bounded LRU cache with TTL and a byte budget for user_data rows
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def row_size(row):
+    """Approximate memory footprint of a cached row in bytes"""
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+
+
+class UserRecordCache:
+    """Thread-safe read-through cache keyed by user id
+
+    Rows are stored exactly as read from user_data, so card and SSN fields
+    stay Fernet-encrypted in memory and only the password hash is held, never
+    a password. Entries expire after `ttl` seconds and the least recently used
+    ones are evicted when either `max_entries` or `max_bytes` is exceeded.
+    The cache is per process: invalidations do not reach other workers, so
+    `ttl` bounds how stale another worker's copy can get.
+    """
+
+    def __init__(self, max_entries=10000, ttl=60.0, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()  # user_id -> (row, size, expires_at)
+        self._bytes = 0
+        self._generation = 0
+        # user_id -> generation of its latest invalidation, oldest first; the
+        # most recent max_entries are kept, `_floor` is the newest one forgotten
+        self._invalidated = OrderedDict()
+        self._floor = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0,
+                       'invalidations': 0, 'hit_seconds': 0.0, 'miss_seconds': 0.0}
+
+    def get(self, user_id):
+        """Return the cached row, or None on a miss or expired entry"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry[2] <= time.monotonic():
+                self._remove(user_id)
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self._stats['hits'] += 1
+            return entry[0]
+
+    def generation(self):
+        """Token to pass to put() so a row read before its invalidation is not cached"""
+        return self._generation
+
+    def _stale(self, user_id, generation):
+        # Called with the lock held
+        if generation < self._floor:
+            # Older than the invalidations still remembered; assume the worst
+            return True
+        return self._invalidated.get(user_id, 0) > generation
+
+    def put(self, user_id, row, generation=None):
+        size = row_size(row)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and self._stale(user_id, generation):
+                # An invalidation of this user raced with the read; the row may be stale
+                return
+            if user_id in self._entries:
+                self._remove(user_id)
+            self._entries[user_id] = (row, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+
+    def _remove(self, user_id):
+        _, size, _ = self._entries.pop(user_id)
+        self._bytes -= size
+
+    def invalidate(self, user_ids):
+        """Drop any cached rows for the given ids"""
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._invalidated[user_id] = self._generation
+                self._invalidated.move_to_end(user_id)
+                if user_id in self._entries:
+                    self._remove(user_id)
+                    self._stats['invalidations'] += 1
+            while len(self._invalidated) > self.max_entries:
+                _, self._floor = self._invalidated.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def record_latency(self, hit, seconds):
+        with self._lock:
+            self._stats['hit_seconds' if hit else 'miss_seconds'] += seconds
+
+    def stats(self):
+        """Counters plus hit rate, occupancy and average hit/miss latency"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['avg_hit_seconds'] = stats['hit_seconds'] / stats['hits'] if stats['hits'] else 0.0
+        stats['avg_miss_seconds'] = (stats['miss_seconds'] / stats['misses']
+                                     if stats['misses'] else 0.0)
+        return stats
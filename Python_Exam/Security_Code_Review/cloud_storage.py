@@ -0,0 +1,354 @@
+"""
+Cloud Storage Helpers
+Cached S3 clients and a parallel, hash-aware multipart uploader
+"""
+
+import functools
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Object metadata key holding the SHA-256 of the uploaded content
+HASH_METADATA_KEY = 'sha256'
+
+MB = 1024 * 1024
+
+
+@functools.lru_cache(maxsize=None)
+def get_s3_client(region, access_key=None, secret_key=None, endpoint_url=None):
+    """Return a shared S3 client per region and credentials
+
+    boto3 clients are thread-safe, so one client is built (and credentials
+    resolved) once and reused for every upload. Call get_s3_client.cache_clear()
+    after rotating credentials.
+    """
+    import boto3
+
+    return boto3.client(
+        's3',
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        region_name=region,
+        endpoint_url=endpoint_url
+    )
+
+
+def file_sha256(path, block_size=MB):
+    """Hex SHA-256 of a file, read in fixed-size blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable file-like view over a buffer, without copying it up front
+
+    botocore needs a file-like Body; slicing a memoryview is zero-copy, so each
+    multipart part reads straight from the caller's bytes, bytearray or mmap.
+    """
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def __len__(self):
+        return len(self._view)
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = len(self._view) + offset
+        self._pos = max(0, min(self._pos, len(self._view)))
+        return self._pos
+
+    def readinto(self, buffer):
+        chunk = self._view[self._pos:self._pos + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def read(self, size=-1):
+        """Next `size` bytes as a read-only memoryview slice of the buffer, never a copy"""
+        end = len(self._view) if size is None or size < 0 else self._pos + size
+        chunk = self._view[self._pos:end]
+        self._pos += len(chunk)
+        return chunk
+
+    def readall(self):
+        return self.read()
+
+
+def as_byte_view(buffer):
+    """Flat, read-only memoryview of bytes, bytearray, memoryview or mmap"""
+    view = memoryview(buffer)
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    return view.toreadonly()
+
+
+class UploadResult:
+    """Outcome and timing of one file in an upload_many batch"""
+
+    __slots__ = ('path', 'key', 'status', 'size', 'seconds', 'error')
+
+    def __init__(self, path, key, status, size=0, seconds=0.0, error=None):
+        self.path = path
+        self.key = key
+        self.status = status  # 'uploaded', 'skipped' or 'failed'
+        self.size = size
+        self.seconds = seconds
+        self.error = error
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"UploadResult(key={self.key!r}, status={self.status!r}, seconds={self.seconds:.3f})"
+
+
+class S3Uploader:
+    """Uploads many files concurrently with tuned multipart settings
+
+    Files whose content hash matches the `sha256` metadata of the existing
+    object are skipped. Each file gets its own UploadResult with timings; a
+    failure on one file does not stop the others.
+    """
+
+    def __init__(self, client, max_workers=8, multipart_threshold=16 * MB,
+                 multipart_chunksize=16 * MB, max_concurrency=4, logger=None):
+        from boto3.s3.transfer import TransferConfig
+
+        self.client = client
+        self.max_workers = max_workers
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+        self.max_concurrency = max_concurrency
+        self.logger = logger
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=max_concurrency,
+            use_threads=max_concurrency > 1
+        )
+
+    def _remote_hash(self, bucket, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self.client.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return head.get('Metadata', {}).get(HASH_METADATA_KEY)
+
+    def upload_file(self, path, bucket, key=None, skip_unchanged=True):
+        """Upload one file and return its UploadResult"""
+        key = key or os.path.basename(path)
+        started = time.perf_counter()
+        size = 0
+        try:
+            size = os.path.getsize(path)
+            digest = file_sha256(path)
+            if skip_unchanged and self._remote_hash(bucket, key) == digest:
+                return UploadResult(path, key, 'skipped', size, time.perf_counter() - started)
+
+            self.client.upload_file(
+                path, bucket, key,
+                ExtraArgs={'Metadata': {HASH_METADATA_KEY: digest}},
+                Config=self.transfer_config
+            )
+            return UploadResult(path, key, 'uploaded', size, time.perf_counter() - started)
+        except Exception as e:
+            # Never log credentials
+            if self.logger:
+                self.logger.error("S3 upload of %s failed: %s", key, type(e).__name__)
+            return UploadResult(path, key, 'failed', size, time.perf_counter() - started,
+                                error=type(e).__name__)
+
+    def upload_many(self, paths, bucket, key_prefix='', skip_unchanged=True):
+        """Upload files in parallel; returns UploadResults in input order"""
+        def upload(path):
+            key = f"{key_prefix}{os.path.basename(path)}"
+            return self.upload_file(path, bucket, key, skip_unchanged)
+
+        with ThreadPoolExecutor(self.max_workers, thread_name_prefix='s3-upload') as pool:
+            return list(pool.map(upload, paths))
+
+    def upload_buffer(self, buffer, bucket, key):
+        """Upload bytes, bytearray, memoryview or mmap without intermediate copies
+
+        Small buffers go up in one put_object; larger ones are split into
+        multipart parts that are zero-copy slices of the buffer, uploaded
+        concurrently. A failed multipart upload is aborted so no orphaned
+        parts are left behind.
+        """
+        view = as_byte_view(buffer)
+        started = time.perf_counter()
+        metadata = {HASH_METADATA_KEY: hashlib.sha256(view).hexdigest()}
+        try:
+            if len(view) <= self.multipart_threshold:
+                self.client.put_object(Bucket=bucket, Key=key, Body=BufferReader(view),
+                                       Metadata=metadata)
+            else:
+                self._multipart_upload(view, bucket, key, metadata)
+            return UploadResult(None, key, 'uploaded', len(view), time.perf_counter() - started)
+        except Exception as e:
+            # Never log credentials
+            if self.logger:
+                self.logger.error("S3 upload of %s failed: %s", key, type(e).__name__)
+            return UploadResult(None, key, 'failed', len(view), time.perf_counter() - started,
+                                error=type(e).__name__)
+
+    def _multipart_upload(self, view, bucket, key, metadata):
+        upload_id = self.client.create_multipart_upload(
+            Bucket=bucket, Key=key, Metadata=metadata
+        )['UploadId']
+
+        def upload_part(part):
+            number, start = part
+            response = self.client.upload_part(
+                Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number,
+                Body=BufferReader(view[start:start + self.multipart_chunksize])
+            )
+            return {'PartNumber': number, 'ETag': response['ETag']}
+
+        parts = enumerate(range(0, len(view), self.multipart_chunksize), start=1)
+        try:
+            with ThreadPoolExecutor(self.max_concurrency, thread_name_prefix='s3-part') as pool:
+                completed = list(pool.map(upload_part, parts))
+            self.client.complete_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={'Parts': completed}
+            )
+        except Exception:
+            self.client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            raise
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """Writable file object that streams into an S3 multipart upload
+
+    Bytes are buffered until a part is full and then uploaded in the
+    background; at most `max_concurrency` parts are in flight, so memory stays
+    bounded by (max_concurrency + 1) * part_size however much is written.
+    close() uploads the final part and completes the object; leaving a `with`
+    block on an exception, or dropping the writer without close(), aborts
+    the upload instead.
+    """
+
+    def __init__(self, client, bucket, key, part_size=16 * MB, max_concurrency=4):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.bytes_written = 0
+
+        self._buffer = bytearray()
+        self._parts = []
+        self._futures = []
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_concurrency, thread_name_prefix='s3-stream')
+        self._upload_id = client.create_multipart_upload(Bucket=bucket, Key=key)['UploadId']
+        self._done = False
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self._done:
+            raise ValueError("write to a closed S3MultipartWriter")
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._submit_part(part)
+        return len(data)
+
+    def _submit_part(self, part):
+        self._slots.acquire()
+        number = len(self._futures) + 1
+        self._futures.append(self._executor.submit(self._upload_part, number, part))
+
+    def _upload_part(self, number, part):
+        try:
+            response = self.client.upload_part(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                PartNumber=number, Body=part
+            )
+            return {'PartNumber': number, 'ETag': response['ETag']}
+        finally:
+            self._slots.release()
+
+    def close(self):
+        if self._done:
+            return
+        try:
+            # The last part may be smaller than the 5 MB S3 minimum
+            if self._buffer or not self._futures:
+                self._submit_part(bytes(self._buffer))
+                self._buffer.clear()
+            parts = [future.result() for future in self._futures]
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._done = True
+            self._executor.shutdown(wait=True)
+            super().close()
+
+    def abort(self):
+        """Discard the upload and every part sent so far"""
+        if self._done:
+            return
+        self._done = True
+        self._executor.shutdown(wait=True)
+        self.client.abort_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+        )
+        super().close()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+        return False
+
+    def __del__(self):
+        # IOBase.__del__ would close() and so publish whatever was written
+        # so far; a writer dropped without close() was abandoned, not finished
+        if getattr(self, '_done', True):
+            return
+        self._done = True
+        # May run on a pool thread that just dropped the last reference, so no join;
+        # no part is still uploading, as each one holds a reference to the writer
+        self._executor.shutdown(wait=False)
+        try:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+            )
+        except Exception:
+            pass
@@ -0,0 +1,115 @@
+"""
+Crypto Worker Pool
+Spreads bcrypt and Fernet work for batches over a process pool
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Below this many items a Fernet batch runs inline; IPC would cost more than it saves.
+# A single bcrypt hash already outweighs IPC, so bcrypt batches only inline one item.
+FERNET_INLINE_THRESHOLD = 256
+BCRYPT_INLINE_THRESHOLD = 1
+
+_cipher = None
+
+
+def _init_worker(encryption_key):
+    # Each worker builds its own cipher once; the key never travels again
+    global _cipher
+    from cryptography.fernet import Fernet
+
+    _cipher = Fernet(encryption_key)
+
+
+def _encrypt_values(cipher, values):
+    return [cipher.encrypt(value.encode()) for value in values]
+
+
+def _decrypt_values(cipher, tokens):
+    return [None if token is None else cipher.decrypt(token).decode() for token in tokens]
+
+
+def _encrypt_chunk(values):
+    return _encrypt_values(_cipher, values)
+
+
+def _decrypt_chunk(tokens):
+    return _decrypt_values(_cipher, tokens)
+
+
+def _hash_chunk(passwords, rounds):
+    import bcrypt
+
+    return [bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)) for password in passwords]
+
+
+def _verify_chunk(pairs):
+    import bcrypt
+
+    return [bcrypt.checkpw(password.encode(), password_hash) for password, password_hash in pairs]
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class CryptoPool:
+    """Process pool for CPU-bound password hashing and field encryption
+
+    bcrypt and Fernet hold the GIL for most of their work, so threads do not
+    help; separate processes let a burst use every core. Results come back in
+    input order. Workers are started with `spawn` so they never inherit locks
+    or sockets from a threaded parent.
+    """
+
+    def __init__(self, cipher, encryption_key, max_workers=None, chunk_size=64, bcrypt_rounds=12):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.bcrypt_rounds = bcrypt_rounds
+        # Used for small batches that run inline in this process
+        self._cipher = cipher
+        self._executor = ProcessPoolExecutor(
+            self.max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(encryption_key,)
+        )
+
+    def _run(self, function, inline, inline_threshold, items, chunk_size, *args):
+        items = list(items)
+        if len(items) <= inline_threshold:
+            return inline(items, *args)
+
+        futures = [self._executor.submit(function, chunk, *args)
+                   for chunk in _chunks(items, chunk_size)]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    def encrypt_many(self, values):
+        """Fernet-encrypt strings, returning tokens in input order"""
+        return self._run(_encrypt_chunk, lambda items: _encrypt_values(self._cipher, items),
+                         FERNET_INLINE_THRESHOLD, values, self.chunk_size * 16)
+
+    def decrypt_many(self, tokens):
+        """Fernet-decrypt tokens to strings; None entries stay None"""
+        return self._run(_decrypt_chunk, lambda items: _decrypt_values(self._cipher, items),
+                         FERNET_INLINE_THRESHOLD, tokens, self.chunk_size * 16)
+
+    def hash_passwords(self, passwords):
+        """bcrypt-hash passwords with the configured cost factor"""
+        # bcrypt is slow per item, so much smaller chunks keep workers balanced
+        return self._run(_hash_chunk, _hash_chunk, BCRYPT_INLINE_THRESHOLD, passwords,
+                         max(1, self.chunk_size // 16), self.bcrypt_rounds)
+
+    def verify_passwords(self, pairs):
+        """Check (password, password_hash) pairs, returning a list of bools"""
+        return self._run(_verify_chunk, _verify_chunk, BCRYPT_INLINE_THRESHOLD, pairs,
+                         max(1, self.chunk_size // 16))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
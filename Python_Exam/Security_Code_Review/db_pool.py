@@ -0,0 +1,318 @@
+"""
+SQLite Connection Pool
+Bounded, long-lived connections with one-time schema bootstrap, migrations and WAL mode
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available before the checkout timeout"""
+    pass
+
+
+class PoolMetrics:
+    """Checkout and wait counters for a connection pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.connections_created = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_checkout(self, waited, wait_seconds):
+        with self._lock:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.total_wait_seconds += wait_seconds
+                self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def record_created(self):
+        with self._lock:
+            self.connections_created += 1
+
+    def snapshot(self):
+        """Return a consistent copy of the counters as a dict"""
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'connections_created': self.connections_created,
+                'total_wait_seconds': self.total_wait_seconds,
+                'max_wait_seconds': self.max_wait_seconds,
+            }
+
+
+class SQLiteConnectionPool:
+    """Bounded pool of SQLite connections shared by the threads of one worker process
+
+    The schema and any pending migrations are applied once, on the first
+    checkout, instead of on every connect. Checkouts are reentrant per thread, so nested use of the pool on the
+    same thread reuses the connection it already holds instead of deadlocking;
+    transaction() keeps such a nested checkout from ending the outer transaction.
+    """
+
+    def __init__(self, database, schema=(), migrations=(), max_size=5, timeout=5.0,
+                 journal_mode='WAL', busy_timeout_ms=5000):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.database = database
+        self.schema = tuple(schema)
+        self.migrations = tuple(sorted(migrations))
+        self.max_size = max_size
+        self.timeout = timeout
+        self.journal_mode = journal_mode
+        self.busy_timeout_ms = busy_timeout_ms
+        self.metrics = PoolMetrics()
+
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._size = 0
+        self._bootstrapped = False
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._closed = False
+
+    @property
+    def settings(self):
+        """Everything a pool was created with except the database path"""
+        return (self.schema, self.migrations, self.max_size, self.timeout,
+                self.journal_mode, self.busy_timeout_ms)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        if self.journal_mode:
+            conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+            if self.journal_mode.upper() == 'WAL':
+                # WAL only needs a sync at checkpoints to stay durable
+                conn.execute("PRAGMA synchronous = NORMAL")
+        self.metrics.record_created()
+        return conn
+
+    def _bootstrap(self, conn):
+        """Run the schema statements and pending migrations once per pool"""
+        with self._lock:
+            if self._bootstrapped:
+                return
+            with conn:
+                for statement in self.schema:
+                    conn.execute(statement)
+            self._migrate(conn)
+            self._bootstrapped = True
+
+    def _migrate(self, conn):
+        """Apply (version, statements) migrations newer than PRAGMA user_version
+
+        The version is stored in the database file, so each migration runs once
+        per database, not once per process. BEGIN IMMEDIATE serializes workers
+        that start at the same time; the version is re-read under that lock.
+        """
+        if not self.migrations:
+            return
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= self.migrations[-1][0]:
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            for version, statements in self.migrations:
+                if version <= current:
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _reset_after_fork(self):
+        # Connections must never cross a fork; start over with an empty pool
+        self._idle = queue.LifoQueue(maxsize=self.max_size)
+        self._lock = threading.Lock()
+        self._size = 0
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    def _reserve_slot(self):
+        with self._lock:
+            if self._size < self.max_size:
+                self._size += 1
+                return True
+            return False
+
+    def acquire(self, timeout=None):
+        """Check out a connection, waiting up to `timeout` seconds for one to free up"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed connection pool")
+        if os.getpid() != self._pid:
+            self._reset_after_fork()
+
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            return held
+
+        timeout = self.timeout if timeout is None else timeout
+        conn = None
+        waited = False
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            if self._reserve_slot():
+                try:
+                    conn = self._connect()
+                except sqlite3.Error:
+                    with self._lock:
+                        self._size -= 1
+                    raise
+            else:
+                waited = True
+                try:
+                    conn = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    self.metrics.record_timeout()
+                    raise PoolTimeout(
+                        f"No database connection available after {timeout} seconds"
+                    ) from None
+
+        if not self._bootstrapped:
+            try:
+                self._bootstrap(conn)
+            except sqlite3.Error:
+                self._discard(conn)
+                raise
+
+        self.metrics.record_checkout(waited, time.perf_counter() - started)
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn):
+        """Return a connection checked out with acquire()"""
+        if getattr(self._local, 'conn', None) is conn:
+            self._local.depth -= 1
+            if self._local.depth > 0:
+                return
+            self._local.conn = None
+
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            self._discard(conn)
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            self._discard(conn)
+
+    @contextmanager
+    def transaction(self, conn):
+        """Commit conn on success and roll back on error, like `with conn`
+
+        Inside a nested checkout of the same connection this is a SAVEPOINT
+        instead, so the inner block neither commits nor rolls back the outer
+        transaction early; only its own changes are undone on error.
+        """
+        depth = getattr(self._local, 'depth', 0) if getattr(self._local, 'conn', None) is conn else 0
+        if depth <= 1:
+            with conn:
+                yield conn
+            return
+
+        name = f"pool_checkout_{depth}"
+        conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute(f"ROLLBACK TO {name}")
+            conn.execute(f"RELEASE {name}")
+            raise
+        conn.execute(f"RELEASE {name}")
+
+    def _discard(self, conn):
+        with self._lock:
+            self._size -= 1
+        conn.close()
+
+    def connection(self, timeout=None):
+        """Context manager that checks out a connection and always returns it"""
+        return _Checkout(self, timeout)
+
+    def close_all(self):
+        """Close every idle connection; checked-out connections close on release
+
+        The pool cannot be used afterwards: acquire() raises sqlite3.ProgrammingError.
+        """
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    @property
+    def in_use(self):
+        return self._size - self._idle.qsize()
+
+    def stats(self):
+        """Pool metrics plus current occupancy"""
+        stats = self.metrics.snapshot()
+        stats.update({'size': self._size, 'idle': self._idle.qsize(),
+                      'in_use': self.in_use, 'max_size': self.max_size})
+        return stats
+
+
+class _Checkout:
+    def __init__(self, pool, timeout):
+        self.pool = pool
+        self.timeout = timeout
+        self.conn = None
+
+    def __enter__(self):
+        self.conn = self.pool.acquire(self.timeout)
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.pool.release(self.conn)
+        return False
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database, schema=(), migrations=(), **kwargs):
+    """Return the process-wide pool for `database`, creating it on first use
+
+    Every caller must pass the same schema, migrations and pool settings for
+    a database; a mismatch raises ValueError instead of handing back a pool
+    that never applies the caller's schema or migrations.
+    """
+    key = (os.getpid(), os.path.abspath(database) if database != ':memory:' else database)
+    requested = SQLiteConnectionPool(database, schema=schema, migrations=migrations, **kwargs)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = _pools[key] = requested
+        elif pool.settings != requested.settings:
+            raise ValueError(f"Database {database} is already in use with a different schema, "
+                             "migrations or pool settings")
+        return pool
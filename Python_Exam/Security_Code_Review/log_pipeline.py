@@ -0,0 +1,133 @@
+"""
+Log Pipeline
+Queue-based logging with deferred formatting, success-log sampling and secret redaction
+"""
+
+import itertools
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+REDACTED = '****'
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that hands records over unformatted and never blocks
+
+    The stock QueueHandler merges args into the message on the calling
+    thread; here that work, and all handler I/O, happens on the listener
+    thread. The queue is in-process, so records are not pickled; arguments
+    are read when the record is emitted, so callers must not mutate them
+    afterwards. When the queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps one in `rate` records tagged with extra={'sample': key}, counted per key
+
+    Untagged records always pass, so errors and warnings are never sampled.
+    Kept records carry `sample_rate` so counts can be scaled back up.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = max(1, int(rate))
+        self.sampled_out = 0
+        self._counters = {}
+
+    def filter(self, record):
+        key = getattr(record, 'sample', None)
+        if key is None or self.rate == 1:
+            return True
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters.setdefault(key, itertools.count())
+        if next(counter) % self.rate:
+            self.sampled_out += 1
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+class RedactingFilter(logging.Filter):
+    """Replaces any configured secret value in the final message with ****
+
+    A safety net only: callers still must never pass credentials to a logger.
+    """
+
+    def __init__(self, secrets):
+        super().__init__()
+        # Longest first so a secret containing another is redacted whole
+        self.secrets = sorted({secret for secret in secrets if secret}, key=len, reverse=True)
+
+    def filter(self, record):
+        message = record.getMessage()
+        for secret in self.secrets:
+            if secret in message:
+                message = message.replace(secret, REDACTED)
+        record.msg = message
+        record.args = None
+        return True
+
+
+class QueueLogging:
+    """Moves a logger's handlers behind a bounded queue and a background listener
+
+    Logging calls on the request path only append the record to the queue;
+    formatting, redaction and handler I/O run on the listener thread.
+    stop() drains the queue and puts the original handlers back.
+    """
+
+    def __init__(self, logger, handlers=None, queue_size=10000, secrets=()):
+        self.logger = logger
+        self.handlers = list(handlers if handlers is not None else logger.handlers)
+        if not self.handlers:
+            default = logging.StreamHandler()
+            default.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+            self.handlers.append(default)
+
+        self.redactor = RedactingFilter(secrets)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.handler = DeferredQueueHandler(self.queue)
+        self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self._detached = []
+        self._started = False
+
+    def start(self):
+        if self._started:
+            return
+        self._detached = [handler for handler in self.handlers if handler in self.logger.handlers]
+        for handler in self.handlers:
+            self.logger.removeHandler(handler)
+            handler.addFilter(self.redactor)
+        self.logger.addHandler(self.handler)
+        self.listener.start()
+        self._started = True
+
+    def stop(self):
+        """Flush queued records and restore the logger's own handlers"""
+        if not self._started:
+            return
+        self.logger.removeHandler(self.handler)
+        self.listener.stop()
+        for handler in self.handlers:
+            handler.removeFilter(self.redactor)
+        for handler in self._detached:
+            self.logger.addHandler(handler)
+        self._started = False
+
+    def stats(self):
+        return {'queued': self.queue.qsize(), 'dropped': self.handler.dropped}
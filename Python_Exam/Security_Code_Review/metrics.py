@@ -0,0 +1,187 @@
+"""
+Method Metrics
+Latency histograms, error counts and in-flight gauges exported in Prometheus text format
+"""
+
+import bisect
+import functools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; spans SQLite point reads through bcrypt hashes and S3 uploads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MethodStats:
+    """Latency histogram, error counts and in-flight gauge for one method"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.in_flight = 0
+        self.errors = {}  # exception type name -> count
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def exit(self, seconds, error=None):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.in_flight -= 1
+            self.bucket_counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if error is not None:
+                self.errors[error] = self.errors.get(error, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return (list(self.bucket_counts), self.count, self.sum, self.in_flight,
+                    dict(self.errors))
+
+
+class MetricsRegistry:
+    """Per-method stats plus callback gauges, rendered as Prometheus text
+
+    wrap() returns an instrumented version of a callable; nothing is
+    recorded for callables that were never wrapped, so leaving
+    instrumentation off costs nothing.
+    """
+
+    def __init__(self, namespace='securedata', buckets=DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self._methods = {}
+        self._gauges = {}  # name -> (help, callable returning a number)
+        self._lock = threading.Lock()
+
+    def method(self, name):
+        with self._lock:
+            stats = self._methods.get(name)
+            if stats is None:
+                stats = self._methods[name] = MethodStats(self.buckets)
+            return stats
+
+    def wrap(self, name, func):
+        """Record latency, errors by exception type and in-flight calls of func"""
+        stats = self.method(name)
+
+        @functools.wraps(func)
+        def instrumented(*args, **kwargs):
+            stats.enter()
+            error = None
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                stats.exit(time.perf_counter() - started, error)
+
+        return instrumented
+
+    def register_gauge(self, name, help_text, read):
+        """Export read() as a gauge, sampled at scrape time"""
+        with self._lock:
+            self._gauges[name] = (help_text, read)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        prefix = self.namespace
+        with self._lock:
+            methods = sorted(self._methods.items())
+            gauges = sorted(self._gauges.items())
+
+        latency, errors, in_flight = [], [], []
+        for method, stats in methods:
+            bucket_counts, count, total, active, method_errors = stats.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                latency.append(f'{prefix}_method_duration_seconds_bucket'
+                               f'{{method="{method}",le="{le}"}} {cumulative}')
+            latency.append(f'{prefix}_method_duration_seconds_sum{{method="{method}"}} {total}')
+            latency.append(f'{prefix}_method_duration_seconds_count{{method="{method}"}} {count}')
+            for exception, error_count in sorted(method_errors.items()):
+                errors.append(f'{prefix}_method_errors_total'
+                              f'{{method="{method}",exception="{exception}"}} {error_count}')
+            in_flight.append(f'{prefix}_method_in_flight{{method="{method}"}} {active}')
+
+        lines = [
+            f'# HELP {prefix}_method_duration_seconds Latency of SecureDataProcessor methods',
+            f'# TYPE {prefix}_method_duration_seconds histogram',
+            *latency,
+            f'# HELP {prefix}_method_errors_total Exceptions raised by SecureDataProcessor methods',
+            f'# TYPE {prefix}_method_errors_total counter',
+            *errors,
+            f'# HELP {prefix}_method_in_flight Calls currently executing',
+            f'# TYPE {prefix}_method_in_flight gauge',
+            *in_flight,
+        ]
+        for name, (help_text, read) in gauges:
+            try:
+                value = read()
+            except Exception:
+                continue  # A failing collector must not break the scrape
+            lines += [f'# HELP {prefix}_{name} {help_text}',
+                      f'# TYPE {prefix}_{name} gauge',
+                      f'{prefix}_{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the service log
+        pass
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer:
+    """Serves GET /metrics for a registry from a daemon thread
+
+    Binds to localhost by default; expose it further only behind the
+    scraper's network policy, as method names reveal the service layout.
+    """
+
+    def __init__(self, registry, host='127.0.0.1', port=9464):
+        self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self._server.daemon_threads = True
+        self._server.registry = registry
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-server',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
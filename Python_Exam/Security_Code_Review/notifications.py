@@ -0,0 +1,258 @@
+"""
+Notification Delivery
+Persistent SMTP connection pool and a background queue that sends in batches
+"""
+
+import queue
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+
+# Errors after which a connection can no longer be trusted. Every
+# SMTPException is an OSError, so catch MESSAGE_ERRORS first.
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, OSError)
+# Replies that refuse one message. smtplib resets the transaction (or, on a
+# 421, closes the connection itself) before raising them, so the connection
+# can go on to the next message.
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                  smtplib.SMTPDataError, smtplib.SMTPNotSupportedError)
+
+
+class SMTPConnectionPool:
+    """Bounded pool of logged-in SMTP connections
+
+    Connections are reused across messages so STARTTLS and AUTH run once per
+    connection instead of once per email. Connections idle for longer than
+    `health_check_after` seconds are probed with NOOP before reuse and
+    replaced if the server has dropped them.
+    """
+
+    def __init__(self, host, port, username=None, password=None, use_tls=True,
+                 max_size=4, timeout=30, health_check_after=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.connects = 0
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            self._close_quietly(server)
+            raise
+        with self._lock:
+            self.connects += 1
+        return server
+
+    @staticmethod
+    def _close_quietly(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _healthy(self, server):
+        try:
+            return server.noop()[0] == 250
+        except CONNECTION_ERRORS:
+            return False
+
+    def acquire(self, timeout=None):
+        """Check out a live connection, connecting or reconnecting as needed"""
+        if not self._slots.acquire(timeout=timeout if timeout is not None else self.timeout):
+            raise smtplib.SMTPException("No SMTP connection available")
+        try:
+            while True:
+                try:
+                    server, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if time.monotonic() - last_used < self.health_check_after or self._healthy(server):
+                    return server
+                self._close_quietly(server)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, server, broken=False):
+        """Return a connection; broken connections are closed instead of reused"""
+        if broken:
+            self._close_quietly(server)
+        else:
+            self._idle.put((server, time.monotonic()))
+        self._slots.release()
+
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close_quietly(server)
+
+
+def build_message(sender, recipient, subject, body):
+    message = MIMEText(body)
+    message['From'] = sender
+    message['To'] = recipient
+    message['Subject'] = subject
+    return message
+
+
+class NotificationQueue:
+    """Bounded in-memory queue drained in batches by background workers
+
+    Each worker takes up to `batch_size` queued messages and sends them over a
+    single pooled connection. If the connection drops mid-batch, the worker
+    reconnects and retries the unsent messages once before counting them as
+    failed. A message the server refuses, or that cannot be sent at all, is
+    counted as failed on its own; the rest of the batch carries on.
+    """
+
+    _STOP = object()
+
+    def __init__(self, pool, sender, batch_size=50, workers=2, max_queue=10000, logger=None):
+        self.pool = pool
+        self.sender = sender
+        self.batch_size = batch_size
+        self.logger = logger
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stats_lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._run, name=f'notify-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def enqueue(self, recipient, subject, body):
+        """Queue a message without blocking; raises queue.Full when at capacity"""
+        self._queue.put_nowait((recipient, subject, body))
+
+    def _next_batch(self):
+        item = self._queue.get()
+        batch = [item]
+        while item is not self._STOP and len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is self._STOP
+            messages = batch[:-1] if stop else batch
+            try:
+                if messages:
+                    self._send_batch(messages)
+            except Exception as e:
+                # Never let one batch take the worker down with it
+                self._log_failure(e)
+                self._record(failed=len(messages), batches=1)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _send_batch(self, messages):
+        pending = list(messages)
+        for attempt in range(2):
+            try:
+                server = self.pool.acquire()
+            except Exception as e:
+                self._log_failure(e)
+                continue
+
+            broken = False
+            try:
+                while pending:
+                    recipient, subject, body = pending[0]
+                    try:
+                        server.send_message(build_message(self.sender, recipient, subject, body))
+                        self._record(sent=1)
+                    except CONNECTION_ERRORS as e:
+                        if not isinstance(e, MESSAGE_ERRORS):
+                            raise
+                        # Refused message, not a bad connection
+                        self._log_failure(e)
+                        self._record(failed=1)
+                    except Exception as e:
+                        # A message that cannot be encoded or sent at all
+                        self._log_failure(e)
+                        self._record(failed=1)
+                    pending.pop(0)
+            except CONNECTION_ERRORS as e:
+                broken = True
+                self._log_failure(e)
+            finally:
+                self.pool.release(server, broken=broken)
+
+            if not pending:
+                break
+
+        self._record(failed=len(pending), batches=1)
+
+    def _record(self, sent=0, failed=0, batches=0):
+        with self._stats_lock:
+            self.sent += sent
+            self.failed += failed
+            self.batches += batches
+
+    def _log_failure(self, error):
+        # Never log password
+        if self.logger:
+            self.logger.error("Notification delivery failed: %s", type(error).__name__)
+
+    def stats(self):
+        with self._stats_lock:
+            return {'queued': self._queue.qsize(), 'sent': self.sent, 'failed': self.failed,
+                    'batches': self.batches, 'connects': self.pool.connects}
+
+    def flush(self):
+        """Block until every queued message has been attempted"""
+        self._queue.join()
+
+    def close(self, timeout=30.0):
+        """Drain the queue, stop the workers and close pooled connections
+
+        Waits at most `timeout` seconds for the queue to drain. Returns
+        False if the workers were still busy then; what they had not sent
+        stays in stats()['queued'].
+        """
+        deadline = time.monotonic() + timeout
+        stopped = True
+        for _ in self._workers:
+            try:
+                self._queue.put(self._STOP, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                stopped = False
+                break
+        for worker in self._workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+            stopped = stopped and not worker.is_alive()
+        if not stopped and self.logger:
+            self.logger.error("Notification queue did not drain within %s seconds", timeout)
+        self.pool.close_all()
+        return stopped
@@ -0,0 +1,240 @@
+"""
+Payload Codecs
+Request serialization (json, orjson, msgpack) and compression (gzip, zstd), chosen per endpoint
+"""
+
+import gzip
+import json
+import threading
+
+JSON_TYPE = 'application/json'
+MSGPACK_TYPE = 'application/msgpack'
+MSGPACK_TYPES = (MSGPACK_TYPE, 'application/x-msgpack')
+
+
+class EncodeError(ValueError):
+    """Raised when a payload cannot be represented in the codec's format"""
+    pass
+
+
+class Serializer:
+    __slots__ = ('name', 'content_type', 'dumps', 'loads')
+
+    def __init__(self, name, content_type, dumps, loads):
+        self.name = name
+        self.content_type = content_type
+        self.dumps = dumps
+        self.loads = loads
+
+
+class Compressor:
+    __slots__ = ('name', 'compress', 'decompress')
+
+    def __init__(self, name, compress, decompress):
+        self.name = name
+        self.compress = compress
+        self.decompress = decompress
+
+
+def _json_serializer():
+    return Serializer(
+        'json', JSON_TYPE,
+        lambda obj: json.dumps(obj, separators=(',', ':')).encode(),
+        json.loads
+    )
+
+
+def _orjson_serializer():
+    import orjson
+
+    stdlib_dumps = _json_serializer().dumps
+
+    def dumps(obj):
+        try:
+            return orjson.dumps(obj)
+        except orjson.JSONEncodeError:
+            # orjson is stricter than json (non-str keys, ints over 64 bits, ...)
+            return stdlib_dumps(obj)
+
+    # Same wire format as json, several times faster to encode
+    return Serializer('orjson', JSON_TYPE, dumps, orjson.loads)
+
+
+def _msgpack_serializer():
+    import msgpack
+
+    return Serializer(
+        'msgpack', MSGPACK_TYPE,
+        lambda obj: msgpack.packb(obj, use_bin_type=True),
+        lambda data: msgpack.unpackb(data, raw=False)
+    )
+
+
+def _gzip_compressor(level):
+    return Compressor('gzip', lambda data: gzip.compress(data, compresslevel=level),
+                      gzip.decompress)
+
+
+def _zstd_compressor(level):
+    import zstandard
+
+    # ZstdCompressor objects must not be shared between threads; keep one per thread
+    local = threading.local()
+
+    def compress(data):
+        compressor = getattr(local, 'compressor', None)
+        if compressor is None:
+            compressor = local.compressor = zstandard.ZstdCompressor(level=level)
+        return compressor.compress(data)
+
+    def decompress(data):
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+    return Compressor('zstd', compress, decompress)
+
+
+_SERIALIZERS = {'json': _json_serializer, 'orjson': _orjson_serializer,
+                'msgpack': _msgpack_serializer}
+_COMPRESSORS = {'gzip': (_gzip_compressor, 5), 'zstd': (_zstd_compressor, 3)}
+
+
+def get_serializer(name):
+    """Serializer by name, or None if its optional package is not installed"""
+    factory = _SERIALIZERS.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown serializer: {name}")
+    try:
+        return factory()
+    except ImportError:
+        return None
+
+
+def get_compressor(name, level=None):
+    """Compressor by name ('identity' is None), or None if its package is missing"""
+    if name == 'identity':
+        return None
+    entry = _COMPRESSORS.get(name)
+    if entry is None:
+        raise ValueError(f"Unknown compression: {name}")
+    factory, default_level = entry
+    try:
+        return factory(default_level if level is None else level)
+    except ImportError:
+        return None
+
+
+def decode_body(body, content_type=None, content_encoding=None):
+    """Decode a request or response body from its Content-Type and Content-Encoding"""
+    encoding = (content_encoding or 'identity').strip().lower()
+    if encoding != 'identity':
+        compressor = get_compressor(encoding)
+        if compressor is None:
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+        body = compressor.decompress(body)
+    media_type = (content_type or JSON_TYPE).split(';', 1)[0].strip().lower()
+    if media_type in MSGPACK_TYPES:
+        serializer = get_serializer('msgpack')
+        if serializer is None:
+            raise ValueError("msgpack body but msgpack is not installed")
+        return serializer.loads(body)
+    return json.loads(body)
+
+
+class PayloadCodec:
+    """One serializer plus optional compression
+
+    Bodies smaller than `min_compress_bytes` are sent uncompressed, since
+    compressing them costs more CPU than it saves on the wire.
+    """
+
+    def __init__(self, serializer, compressor=None, min_compress_bytes=1024, choice=None):
+        self.serializer = serializer
+        self.compressor = compressor
+        self.min_compress_bytes = min_compress_bytes
+        self.choice = choice  # Position in the negotiator's preference lists
+
+    @property
+    def name(self):
+        compression = self.compressor.name if self.compressor else 'identity'
+        return f"{self.serializer.name}+{compression}"
+
+    def encode(self, obj):
+        """Return (body, headers) for a request carrying obj; raises EncodeError"""
+        try:
+            body = self.serializer.dumps(obj)
+        except (TypeError, ValueError, OverflowError) as e:
+            # The message may quote the payload; only the type is kept
+            raise EncodeError(f"{self.serializer.name} cannot encode the payload: "
+                              f"{type(e).__name__}") from e
+        headers = {'Content-Type': self.serializer.content_type}
+        if self.compressor is not None and len(body) >= self.min_compress_bytes:
+            body = self.compressor.compress(body)
+            headers['Content-Encoding'] = self.compressor.name
+        return body, headers
+
+
+class CodecNegotiator:
+    """Picks a codec per endpoint from preference lists and falls back on 415
+
+    Every endpoint starts on the first available serializer and compression
+    in the preference lists. When an endpoint answers 415 Unsupported Media
+    Type, reject() moves it to the next combination the server accepts
+    (using its Accept / Accept-Encoding response headers when present) and
+    remembers that choice for later calls.
+    """
+
+    def __init__(self, serializers=('json',), compressions=('identity',), min_compress_bytes=1024):
+        self.serializers = [serializer for serializer in map(get_serializer, serializers)
+                            if serializer is not None] or [_json_serializer()]
+        self.compressors = [compressor for name in compressions
+                            for compressor in [get_compressor(name)]
+                            if compressor is not None or name == 'identity'] or [None]
+        self.min_compress_bytes = min_compress_bytes
+        self._choices = {}  # endpoint -> (serializer index, compressor index)
+        self._lock = threading.Lock()
+
+    @property
+    def accept(self):
+        """Accept header listing the response types we can decode"""
+        types = [JSON_TYPE]
+        if any(serializer.name == 'msgpack' for serializer in self.serializers):
+            types.append(MSGPACK_TYPE)
+        return ', '.join(types)
+
+    def codec_for(self, endpoint):
+        with self._lock:
+            serializer_index, compressor_index = self._choices.get(endpoint, (0, 0))
+        return self._codec(serializer_index, compressor_index)
+
+    def _codec(self, serializer_index, compressor_index):
+        return PayloadCodec(self.serializers[serializer_index], self.compressors[compressor_index],
+                            self.min_compress_bytes, (serializer_index, compressor_index))
+
+    def reject(self, endpoint, codec, headers=None):
+        """Downgrade an endpoint after `codec` got a 415; False once nothing is left to try"""
+        headers = headers or {}
+        accept = headers.get('Accept', '').lower()
+        accept_encoding = headers.get('Accept-Encoding', '').lower()
+        with self._lock:
+            serializer_index, compressor_index = self._choices.get(endpoint, (0, 0))
+            if codec.choice < (serializer_index, compressor_index):
+                return True  # Another thread already moved past this codec
+            options = [(s, c) for s in range(len(self.serializers))
+                       for c in range(len(self.compressors))
+                       if (s, c) > (serializer_index, compressor_index)]
+            for s, c in options:
+                serializer, compressor = self.serializers[s], self.compressors[c]
+                if accept and serializer.content_type not in accept and '*/*' not in accept:
+                    continue
+                if (accept_encoding and compressor is not None
+                        and compressor.name not in accept_encoding):
+                    continue
+                self._choices[endpoint] = (s, c)
+                return True
+            return False
+
+    def choices(self):
+        """Codec name per endpoint that has been downgraded from the default"""
+        with self._lock:
+            choices = dict(self._choices)
+        return {endpoint: self._codec(*choice).name for endpoint, choice in choices.items()}
@@ -0,0 +1,328 @@
+"""
+Permission Index
+Requester -> action grants held as in-memory bitsets, bulk-loaded from SQLite and refreshed incrementally
+"""
+
+import os
+import threading
+import time
+
+# Requester ids below this are bits in a per-action bytearray (16 MB per action
+# at the limit); larger ids are kept in a per-action set instead
+MAX_DENSE_ID = 1 << 27
+
+# Each change gets the next version, so a refresh only reads what it has not seen
+UPSERT_PERMISSION = """
+    INSERT INTO permissions (requester_id, action, granted, version)
+    VALUES (?, ?, ?, (SELECT COALESCE(MAX(version), 0) + 1 FROM permissions))
+    ON CONFLICT (requester_id, action) DO UPDATE
+    SET granted = excluded.granted, version = excluded.version
+"""
+
+
+class PermissionsUnavailable(Exception):
+    """Raised by a check when the permissions table has not been loaded or the index expired"""
+    pass
+
+
+def _check_grant(requester_id, action):
+    if not isinstance(requester_id, int) or isinstance(requester_id, bool) or requester_id <= 0:
+        raise ValueError("Invalid requester_id: must be positive integer")
+    if not isinstance(action, str) or not action:
+        raise ValueError("Invalid action: must be a non-empty string")
+    return requester_id, action
+
+
+class PermissionIndex:
+    """Answers "may requester R perform action A?" from memory, without I/O or locks
+
+    Each action has a bitset indexed by requester id, so a check is a dict
+    lookup and a byte test. The permissions table is bulk-loaded on the
+    first check (or by ensure_loaded()). After that, the first check every
+    `refresh_interval` seconds starts a background thread that applies the
+    rows whose version is newer than the last one seen, so grants and
+    revocations made by any worker show up without a full reload and no
+    check ever waits on SQLite once the index is loaded. If refreshing
+    fails, the index is trusted for at most `ttl` seconds after the last
+    successful refresh; after that, and before the first successful load,
+    checks raise PermissionsUnavailable.
+    """
+
+    def __init__(self, connect, refresh_interval=5.0, ttl=300.0, logger=None):
+        self.connect = connect  # Context manager yielding a connection, committing on exit
+        self.refresh_interval = refresh_interval
+        self.ttl = ttl
+        self.logger = logger
+
+        self._index = {}  # action -> (bytearray of requester bits, set of ids >= MAX_DENSE_ID)
+        self._loaded = False
+        self._version = 0
+        self._refresh_at = 0.0
+        self._expires_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._stats = {'full_loads': 0, 'refreshes': 0, 'changes_applied': 0,
+                       'refresh_errors': 0, 'expired': 0}
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def allows(self, requester_id, action):
+        """True if requester_id has been granted action; anything malformed is denied"""
+        now = time.monotonic()
+        if now >= self._refresh_at:
+            self._maybe_refresh()
+        if not self._loaded or now >= self._expires_at:
+            # SECURE: Fail closed, but distinguishably from a denial
+            raise PermissionsUnavailable("Permissions could not be loaded")
+        if type(requester_id) is not int or requester_id <= 0:
+            return False
+        entry = self._index.get(action)
+        if entry is None:
+            return False
+        if requester_id < MAX_DENSE_ID:
+            bits = entry[0]
+            byte = requester_id >> 3
+            return byte < len(bits) and bits[byte] >> (requester_id & 7) & 1 == 1
+        return requester_id in entry[1]
+
+    def _maybe_refresh(self):
+        if not self._loaded:
+            # Nothing to answer from yet, so wait for the load rather than deny
+            with self._refresh_lock:
+                if not self._loaded and time.monotonic() >= self._refresh_at:
+                    self._refresh()
+            return
+        # One background thread refreshes; every check keeps using the current index
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        if time.monotonic() < self._refresh_at:
+            self._refresh_lock.release()
+            return
+        try:
+            threading.Thread(target=self._refresh_in_background, name='permissions-refresh',
+                             daemon=True).start()
+        except BaseException:
+            self._refresh_lock.release()
+            raise
+
+    def _refresh_in_background(self):
+        try:
+            self._refresh()
+        finally:
+            self._refresh_lock.release()
+
+    def ensure_loaded(self):
+        """Load the table now if the index is not loaded; returns whether it is
+
+        Lets callers that must not block (an event loop) do the first load in
+        a worker thread; after it, checks do no I/O.
+        """
+        if not self._loaded and time.monotonic() >= self._refresh_at:
+            self._maybe_refresh()
+        return self._loaded
+
+    def refresh(self):
+        """Bring the index up to date now; returns False if the table could not be read"""
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self):
+        # Called with the refresh lock held
+        now = time.monotonic()
+        try:
+            with self.connect() as conn:
+                if self._loaded:
+                    self._apply_changes(conn)
+                else:
+                    self._load(conn)
+        except Exception as e:
+            # DatabaseError from checkout or sqlite3.Error from the query
+            self._stats['refresh_errors'] += 1
+            if self.logger:
+                self.logger.error("Permission refresh failed: %s", type(e).__name__)
+            if self._loaded and now >= self._expires_at:
+                # Fail closed once the index is older than the TTL
+                self._index = {}
+                self._loaded = False
+                self._stats['expired'] += 1
+            self._refresh_at = now + self.refresh_interval
+            if self._loaded:
+                # Retry no later than the expiry, so the TTL is enforced on time
+                self._refresh_at = min(self._refresh_at, self._expires_at)
+            return False
+        self._refresh_at = now + self.refresh_interval
+        self._expires_at = now + self.ttl
+        return True
+
+    def _load(self, conn):
+        # Changes committed after this version are replayed by the next refresh;
+        # applying one that the scan below already saw is harmless
+        version = conn.execute("SELECT COALESCE(MAX(version), 0) FROM permissions").fetchone()[0]
+        sizes = conn.execute(
+            "SELECT action, MAX(requester_id) FROM permissions "
+            "WHERE granted = 1 AND requester_id < ? GROUP BY action",
+            (MAX_DENSE_ID,)
+        ).fetchall()
+        index = {action: (bytearray((max_id >> 3) + 1), set()) for action, max_id in sizes}
+
+        rows = conn.execute("SELECT requester_id, action FROM permissions WHERE granted = 1")
+        for requester_id, action in rows:
+            entry = index.get(action)
+            if entry is None:
+                entry = index[action] = (bytearray(), set())
+            if requester_id < MAX_DENSE_ID:
+                bits = entry[0]
+                byte = requester_id >> 3
+                if byte >= len(bits):
+                    # Granted after the sizing query above
+                    bits.extend(bytes(byte + 1 - len(bits)))
+                bits[byte] |= 1 << (requester_id & 7)
+            else:
+                entry[1].add(requester_id)
+
+        # Swapped in whole, so a check never sees a half-built index
+        self._index = index
+        self._version = version
+        self._loaded = True
+        self._stats['full_loads'] += 1
+        if not index and self.logger:
+            self.logger.warning("No permissions granted; every webhook is denied until grants "
+                                "are seeded with `python permissions.py`")
+
+    def _apply_changes(self, conn):
+        latest = conn.execute("SELECT COALESCE(MAX(version), 0) FROM permissions").fetchone()[0]
+        if latest < self._version:
+            # The table was rebuilt or restored from a backup
+            self._load(conn)
+            return
+        if latest == self._version:
+            return
+        rows = conn.execute(
+            "SELECT requester_id, action, granted, version FROM permissions "
+            "WHERE version > ? ORDER BY version",
+            (self._version,)
+        ).fetchall()
+        for requester_id, action, granted, version in rows:
+            self._set(requester_id, action, granted)
+            self._version = version
+        self._stats['refreshes'] += 1
+        self._stats['changes_applied'] += len(rows)
+
+    def _set(self, requester_id, action, granted):
+        entry = self._index.get(action)
+        if entry is None:
+            if not granted:
+                return
+            entry = self._index[action] = (bytearray(), set())
+        bits, sparse = entry
+        if requester_id >= MAX_DENSE_ID:
+            if granted:
+                sparse.add(requester_id)
+            else:
+                sparse.discard(requester_id)
+            return
+        byte = requester_id >> 3
+        if byte >= len(bits):
+            if not granted:
+                return
+            # Grown in place with headroom, so readers holding `bits` stay valid
+            size = max(byte + 1, min(2 * len(bits), MAX_DENSE_ID >> 3))
+            bits.extend(bytes(size - len(bits)))
+        if granted:
+            bits[byte] |= 1 << (requester_id & 7)
+        else:
+            bits[byte] &= ~(1 << (requester_id & 7)) & 0xFF
+
+    def set_many(self, changes):
+        """Write (requester_id, action, granted) changes in one transaction and apply them here
+
+        Other workers pick the changes up on their next refresh.
+        """
+        rows = [(*_check_grant(requester_id, action), 1 if granted else 0)
+                for requester_id, action, granted in changes]
+        with self.connect() as conn:
+            conn.executemany(UPSERT_PERMISSION, rows)
+        if self._loaded:
+            # Otherwise the first check loads everything, these changes included
+            self.refresh()
+        return len(rows)
+
+    def grant(self, requester_id, action):
+        self.set_many([(requester_id, action, True)])
+
+    def revoke(self, requester_id, action):
+        self.set_many([(requester_id, action, False)])
+
+    def grant_many(self, pairs):
+        """Grant every (requester_id, action) pair; returns how many were written"""
+        return self.set_many((requester_id, action, True) for requester_id, action in pairs)
+
+    def stats(self):
+        stats = dict(self._stats)
+        stats.update({
+            'version': self._version,
+            'actions': len(self._index),
+            'bitset_bytes': sum(len(bits) for bits, _ in self._index.values()),
+            'sparse_ids': sum(len(sparse) for _, sparse in self._index.values()),
+        })
+        return stats
+
+
+def _parse_grant(value):
+    requester_id, _, action = value.partition(':')
+    try:
+        return _check_grant(int(requester_id), action)
+    except ValueError as e:
+        raise ValueError(f"{value!r}: {e}; expected REQUESTER_ID:ACTION") from None
+
+
+def main(argv=None):
+    """Seed or change webhook permission grants; safe to run while the service is up"""
+    import argparse
+    from contextlib import contextmanager
+
+    from db_pool import SQLiteConnectionPool
+    from schema import USER_DATA_MIGRATIONS, USER_DATA_SCHEMA
+
+    parser = argparse.ArgumentParser(
+        description="Grant or revoke webhook actions per requester. Checks deny by default, so "
+                    "a new deployment needs its grants seeded before webhooks are accepted. "
+                    "Running workers pick changes up within PERMISSIONS_REFRESH_SECONDS."
+    )
+    parser.add_argument('--database', default=os.environ.get('DATABASE_PATH', 'app_data.db'))
+    parser.add_argument('--grant', action='append', default=[], metavar='REQUESTER_ID:ACTION')
+    parser.add_argument('--revoke', action='append', default=[], metavar='REQUESTER_ID:ACTION')
+    parser.add_argument('--file', help="file of REQUESTER_ID:ACTION lines to grant; # comments")
+    args = parser.parse_args(argv)
+
+    grants = list(args.grant)
+    if args.file:
+        with open(args.file) as f:
+            grants += [line.split('#', 1)[0].strip() for line in f]
+    try:
+        changes = ([(*_parse_grant(value), True) for value in grants if value]
+                   + [(*_parse_grant(value), False) for value in args.revoke])
+    except ValueError as e:
+        parser.error(str(e))
+    if not changes:
+        parser.error("nothing to do: pass --grant, --revoke or --file")
+
+    # Creates the permissions table on a database the service has not opened yet
+    pool = SQLiteConnectionPool(args.database, schema=USER_DATA_SCHEMA,
+                                migrations=USER_DATA_MIGRATIONS, max_size=1)
+
+    @contextmanager
+    def connect():
+        with pool.connection() as conn, pool.transaction(conn):
+            yield conn
+
+    try:
+        written = PermissionIndex(connect).set_many(changes)
+    finally:
+        pool.close_all()
+    print(f"Wrote {written} permission change(s) to {args.database}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Outbound Rate Limiting
+Per-endpoint token buckets and AIMD adaptive concurrency, shared by threads and asyncio tasks
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+# Responses that mean the upstream is overloaded and we should back off
+THROTTLE_STATUSES = frozenset({429, 502, 503, 504})
+
+
+class RateLimited(Exception):
+    """Raised when no permit becomes available before the acquire timeout"""
+    pass
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second up to `burst`
+
+    reserve() takes a token immediately, going into debt if none is left,
+    and returns how long the caller must wait before using it. Callers are
+    therefore served in arrival order whether they sleep on a thread or
+    await on an event loop. A rate of 0 only honours pause().
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait=None):
+        """Take a token and return the seconds to wait, or None if that exceeds max_wait"""
+        if self.rate <= 0 and self._paused_until <= time.monotonic():
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self.rate > 0:
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                wait = max(wait, (1.0 - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            if self.rate > 0:
+                self._tokens -= 1.0
+            return wait
+
+    def try_acquire(self):
+        """Take a token only if one is available right now"""
+        return self.reserve(max_wait=0.0) is not None
+
+    def refund(self):
+        """Give back a token taken by reserve() that was never used"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1.0)
+
+    def pause(self, seconds):
+        """Hand out no tokens for `seconds`, e.g. after a Retry-After header"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class _ThreadWaiter:
+    def __init__(self):
+        self.event = threading.Event()
+
+    def grant(self):
+        self.event.set()
+        return True
+
+
+class _AsyncWaiter:
+    def __init__(self, limiter, loop):
+        self.limiter = limiter
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def grant(self):
+        if self.future.done():
+            return False
+        self.loop.call_soon_threadsafe(self._resolve)
+        return True
+
+    def _resolve(self):
+        if self.future.done():
+            # Cancelled after the slot was granted; hand it on
+            self.limiter.release_slot()
+        else:
+            self.future.set_result(None)
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on in-flight calls, driven by throttling and latency
+
+    Each answered call raises the limit by 1/limit (about +1 per round trip
+    at full load). A throttling status, a transport error or a latency above
+    `latency_tolerance` times the baseline cuts it by `decrease_factor`, at
+    most once per `cooldown` seconds so one burst of failures counts as one
+    congestion signal. The baseline is the `baseline_quantile` of the last
+    `baseline_window` successful (non-4xx/5xx) latencies, so one unusually
+    fast response cannot pin the limit down and the baseline follows the
+    upstream when it gets slower for good. Waiters are served in FIFO order
+    from threads and event loops alike.
+    """
+
+    def __init__(self, initial=8, min_limit=1, max_limit=64, decrease_factor=0.5,
+                 latency_tolerance=3.0, cooldown=0.5, baseline_window=200,
+                 baseline_quantile=0.1):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self.baseline_quantile = baseline_quantile
+
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._waiters = deque()
+        self._latencies = deque(maxlen=baseline_window)
+        # Recomputed every tenth of a window rather than on every call
+        self._baseline_every = max(1, baseline_window // 10)
+        self._since_baseline = 0
+        self._baseline = None
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'increases': 0, 'decreases': 0, 'throttled': 0, 'errors': 0, 'slow': 0}
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def _try_take(self):
+        if not self._waiters and self._in_flight < int(self._limit):
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+            return True
+        return False
+
+    def _wake(self):
+        # Called with the lock held
+        while self._waiters and self._in_flight < int(self._limit):
+            waiter = self._waiters.popleft()
+            if waiter.grant():
+                self._in_flight += 1
+                self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+
+    def acquire(self, timeout=None):
+        """Block the calling thread until a slot is free"""
+        with self._lock:
+            if self._try_take():
+                return
+            waiter = _ThreadWaiter()
+            self._waiters.append(waiter)
+        if waiter.event.wait(timeout):
+            return
+        with self._lock:
+            if waiter.event.is_set():
+                return  # Granted while timing out
+            self._waiters.remove(waiter)
+        raise RateLimited(f"No outbound slot available after {timeout} seconds")
+
+    async def acquire_async(self, timeout=None):
+        """Wait on the running event loop until a slot is free"""
+        with self._lock:
+            if self._try_take():
+                return
+            waiter = _AsyncWaiter(self, asyncio.get_running_loop())
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                granted = waiter not in self._waiters
+                if not granted:
+                    self._waiters.remove(waiter)
+            waiter.future.cancel()
+            if granted and waiter.future.done() and not waiter.future.cancelled():
+                self.release_slot()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise RateLimited(f"No outbound slot available after {timeout} seconds") from None
+
+    def release_slot(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._wake()
+
+    def release(self, latency, status=None, error=False):
+        """Return a slot and adjust the limit from the call's outcome"""
+        with self._lock:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if error or status in THROTTLE_STATUSES:
+                self._stats['errors' if error else 'throttled'] += 1
+                self._decrease(now)
+            else:
+                if status is None or status < 400:
+                    self._record_latency(latency)
+                if self._baseline is not None and latency > self._baseline * self.latency_tolerance:
+                    self._stats['slow'] += 1
+                    self._decrease(now)
+                elif self._limit < self.max_limit:
+                    self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+                    self._stats['increases'] += 1
+            self._wake()
+
+    def _record_latency(self, latency):
+        # Called with the lock held
+        self._latencies.append(latency)
+        self._since_baseline += 1
+        if self._since_baseline >= self._baseline_every:
+            self._since_baseline = 0
+            ordered = sorted(self._latencies)
+            self._baseline = ordered[int(self.baseline_quantile * (len(ordered) - 1))]
+
+    def _decrease(self, now):
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+        self._stats['decreases'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({'limit': int(self._limit), 'in_flight': self._in_flight,
+                          'peak_in_flight': self._peak_in_flight, 'waiting': len(self._waiters), 'baseline_latency': self._baseline})
+        return stats
+
+
+class EndpointLimiter:
+    """Token bucket plus adaptive concurrency for one outbound endpoint
+
+    acquire()/acquire_async() return a start time to pass back to
+    release() together with the response status (or error=True), which is
+    what drives the adaptive limit. The timeout covers the wait for a token
+    and for a concurrency slot together; a token taken for an acquire that
+    then times out is given back. A Retry-After from the upstream pauses
+    the bucket so no caller sends before it has elapsed.
+    """
+
+    def __init__(self, name, rate=0.0, burst=None, timeout=30.0, **concurrency):
+        self.name = name
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AdaptiveConcurrency(**concurrency)
+
+    def _reserve(self, timeout):
+        wait = self.bucket.reserve(max_wait=timeout)
+        if wait is None:
+            raise RateLimited(f"Rate limit for {self.name} exceeded")
+        return wait
+
+    @staticmethod
+    def _remaining(deadline):
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        wait = self._reserve(timeout)
+        try:
+            if wait:
+                time.sleep(wait)
+            self.concurrency.acquire(self._remaining(deadline))
+        except BaseException:
+            self.bucket.refund()
+            raise
+        return time.perf_counter()
+
+    async def acquire_async(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        wait = self._reserve(timeout)
+        try:
+            if wait:
+                await asyncio.sleep(wait)
+            await self.concurrency.acquire_async(self._remaining(deadline))
+        except BaseException:
+            # Also on cancellation, so the token is not lost with the task
+            self.bucket.refund()
+            raise
+        return time.perf_counter()
+
+    def release(self, started, status=None, error=False, retry_after=None):
+        self.concurrency.release(time.perf_counter() - started, status=status, error=error)
+        if retry_after:
+            self.bucket.pause(retry_after)
+
+    def stats(self):
+        stats = self.concurrency.stats()
+        stats['rate'] = self.bucket.rate
+        return stats
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header given in seconds; HTTP dates are ignored"""
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name, **kwargs):
+    """Return the process-wide limiter for an endpoint, creating it on first use"""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _limiters[name] = EndpointLimiter(name, **kwargs)
+        return limiter
+
+
+def limiter_stats():
+    """Stats of every limiter created in this process, by endpoint"""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.stats() for name, limiter in limiters.items()}
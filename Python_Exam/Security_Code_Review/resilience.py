@@ -0,0 +1,279 @@
+"""
+Call Resilience
+Circuit breaker and latency-based request hedging for idempotent upstream calls
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker
+
+    After `failure_threshold` failures in a row the circuit opens and calls
+    fail fast for `reset_timeout` seconds. Then one probe call is let
+    through (half-open): success closes the circuit, failure opens it
+    again. A threshold of 0 disables the breaker.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._stats = {'opened': 0, 'rejected': 0, 'successes': 0, 'failures': 0}
+
+    def allow(self):
+        """Return True if a call may go ahead now"""
+        if not self.failure_threshold or self.state == self.CLOSED:
+            return True
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            if self.state == self.CLOSED:
+                return True
+            self._stats['rejected'] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._stats['successes'] += 1
+            self._failures = 0
+            self.state = self.CLOSED
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._stats['failures'] += 1
+            self._failures += 1
+            if not self.failure_threshold:
+                return
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self._stats['opened'] += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def record_skipped(self):
+        """Forget an allowed call that never reached the upstream"""
+        with self._lock:
+            self._probing = False
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['state'] = self.state
+        return stats
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies with a cached quantile
+
+    The quantile is recomputed every `refresh_every` samples rather than on
+    every call, so reading it stays O(1) on the request path.
+    """
+
+    def __init__(self, window=1000, refresh_every=50):
+        self._samples = deque(maxlen=window)
+        self._refresh_every = refresh_every
+        self._since_refresh = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._since_refresh += 1
+            if self._since_refresh >= self._refresh_every:
+                self._since_refresh = 0
+                self._cache.clear()
+
+    def quantile(self, q, default=None):
+        with self._lock:
+            if len(self._samples) < self._refresh_every:
+                return default
+            value = self._cache.get(q)
+            if value is None:
+                ordered = sorted(self._samples)
+                value = self._cache[q] = ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+            return value
+
+
+class Hedger:
+    """Sends a second copy of a slow idempotent call and keeps the first answer
+
+    The hedge goes out once the first attempt has run longer than the
+    `quantile` of recent attempt latencies, never earlier than `min_delay`.
+    call() never queues behind the `max_workers` pool threads: with none
+    free, the call runs unhedged on the caller's thread (counted as
+    `saturated`, like a hedge skipped for want of a thread), so the pool
+    neither caps concurrency nor delays a call.
+    Only fn(*args) that are safe to run twice may be hedged. At most
+    `max_hedge_ratio` of calls are hedged, so a uniformly slow upstream is
+    not hit with double the load. With call() the losing attempt cannot be
+    cancelled once sent and runs to completion in the background;
+    call_async() cancels it.
+    """
+
+    def __init__(self, quantile=0.95, min_delay=0.01, default_delay=0.1, max_hedge_ratio=0.1,
+                 max_workers=32):
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self.max_hedge_ratio = max_hedge_ratio
+        self.max_workers = max_workers
+        self.latencies = LatencyTracker()
+
+        self._executor = None
+        # One per pool thread, so a submitted attempt always starts at once
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+        # primary_won/hedge_won only count hedged calls
+        self._stats = {'calls': 0, 'not_hedged': 0, 'hedged': 0, 'primary_won': 0,
+                       'hedge_won': 0, 'failed': 0, 'over_budget': 0, 'saturated': 0}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='hedge')
+            return self._executor
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def delay(self):
+        """Seconds to wait for the first attempt before hedging"""
+        return max(self.min_delay, self.latencies.quantile(self.quantile, self.default_delay))
+
+    def _submit(self, fn, args, hedge=False):
+        """Run fn(*args) on an idle pool thread; None if every thread is busy
+
+        A hedge is also not sent when it would exceed the hedge budget.
+        """
+        if not self._slots.acquire(blocking=False):
+            self._count('saturated')
+            return None
+        if hedge and not self._may_hedge():
+            self._slots.release()
+            return None
+        try:
+            future = self._get_executor().submit(self._timed, fn, args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _timed(self, fn, args):
+        started = time.perf_counter()
+        result = fn(*args)
+        self.latencies.record(time.perf_counter() - started)
+        return result
+
+    def _unhedged(self, fn, *args):
+        try:
+            result = fn(*args)
+        except Exception:
+            self._count('failed')
+            raise
+        self._count('not_hedged')
+        return result
+
+    def _may_hedge(self):
+        with self._lock:
+            if self._stats['hedged'] + 1 > self.max_hedge_ratio * self._stats['calls']:
+                self._stats['over_budget'] += 1
+                return False
+            self._stats['hedged'] += 1
+            return True
+
+    def call(self, fn, *args):
+        """Return fn(*args) from whichever attempt succeeds first"""
+        self._count('calls')
+        primary = self._submit(fn, args)
+        if primary is None:
+            return self._unhedged(self._timed, fn, args)
+        done, _ = wait([primary], timeout=self.delay())
+        hedge = None if done else self._submit(fn, args, hedge=True)
+        if hedge is None:
+            return self._unhedged(primary.result)
+
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._count('primary_won' if future is primary else 'hedge_won')
+                    return future.result()
+                error = future.exception()
+        self._count('failed')
+        raise error
+
+    async def _timed_async(self, fn, args):
+        started = time.perf_counter()
+        result = await fn(*args)
+        self.latencies.record(time.perf_counter() - started)
+        return result
+
+    async def call_async(self, fn, *args):
+        """Return await fn(*args) from whichever attempt succeeds first"""
+        import asyncio
+
+        self._count('calls')
+        primary = asyncio.ensure_future(self._timed_async(fn, args))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait([primary], timeout=self.delay())
+            if done or not self._may_hedge():
+                try:
+                    result = await primary
+                except Exception:
+                    self._count('failed')
+                    raise
+                self._count('not_hedged')
+                return result
+
+            hedge = asyncio.ensure_future(self._timed_async(fn, args))
+            tasks.append(hedge)
+            pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._count('primary_won' if task is primary else 'hedge_won')
+                        return task.result()
+                    error = task.exception()
+            self._count('failed')
+            raise error
+        finally:
+            # The loser, or both attempts if the caller was cancelled
+            for task in tasks:
+                task.cancel()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['hedge_delay_seconds'] = self.delay()
+        stats['extra_request_ratio'] = stats['hedged'] / stats['calls'] if stats['calls'] else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
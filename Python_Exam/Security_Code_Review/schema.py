@@ -0,0 +1,67 @@
+"""
+user_data Schema
+Table definition and versioned migrations, applied once by the connection pool
+"""
+
+# Applied once per connection pool, not on every connect
+USER_DATA_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS user_data (
+        id INTEGER PRIMARY KEY,
+        username TEXT,
+        password_hash TEXT,      -- SECURE: Store bcrypt hash, not plain text
+        credit_card_encrypted BLOB,  -- SECURE: Encrypted credit card
+        ssn_encrypted BLOB,      -- SECURE: Encrypted SSN
+        created_at TIMESTAMP
+    )
+    """,
+)
+USER_DATA_COLUMNS = ('id', 'username', 'password_hash', 'credit_card_encrypted',
+                     'ssn_encrypted', 'created_at')
+
+# (version, statements); tracked with PRAGMA user_version so each runs once per database.
+# Append new migrations with a higher version; never edit one that has shipped.
+USER_DATA_MIGRATIONS = (
+    (1, (
+        "CREATE INDEX IF NOT EXISTS idx_user_data_username ON user_data (username)",
+        # (created_at, id) makes keyset pagination over a time range index-only ordered
+        "CREATE INDEX IF NOT EXISTS idx_user_data_created_at ON user_data (created_at, id)",
+    )),
+    (2, (
+        # Webhook deliveries already handled, with their result; see webhook_dedup
+        """
+        CREATE TABLE IF NOT EXISTS webhook_deliveries (
+            delivery_key TEXT PRIMARY KEY,
+            result TEXT,             -- NULL while the delivery is being processed
+            created_at REAL NOT NULL -- Unix time of the claim
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_created_at "
+        "ON webhook_deliveries (created_at)",
+    )),
+    (3, (
+        # Requester -> action grants for is_authorized; see permissions
+        """
+        CREATE TABLE IF NOT EXISTS permissions (
+            requester_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            granted INTEGER NOT NULL,    -- 0 keeps a revocation visible to incremental refresh
+            version INTEGER NOT NULL,    -- Increases with every change
+            PRIMARY KEY (requester_id, action)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_permissions_version ON permissions (version)",
+    )),
+)
+
+# Shard files hold only user_data: the same versions, without the tables that stay
+# in DATABASE_PATH. Add user_data migrations here too, under the same version.
+USER_DATA_SHARD_MIGRATIONS = (
+    USER_DATA_MIGRATIONS[0],
+    (2, ()),  # webhook_deliveries
+    (3, ()),  # permissions
+)
+
+# created_at is stored as text in this format, which sorts chronologically
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
@@ -0,0 +1,480 @@
+"""
+Secrets Scanner
+Finds the hard-coded credentials and insecure patterns of SECURITY_ISSUES_IDENTIFIED.md in source trees
+"""
+
+import hashlib
+import itertools
+import json
+import mmap
+import multiprocessing
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+SEVERITIES = ('LOW', 'MEDIUM', 'HIGH', 'CRITICAL')
+
+# (rule id, severity, CWE, description, pattern, literals). Every match of a
+# pattern lies within one line and contains one of its literals; the prefilter
+# relies on both. Patterns must not use capturing groups, as the combined
+# matcher names its own.
+RULES = (
+    ('hardcoded-credential', 'CRITICAL', 'CWE-798', "Credential assigned from a string literal",
+     rb"(?:API_KEY|PASSWORD|SECRET(?:_ACCESS)?(?:_KEY)?|TOKEN"
+     rb"|api_key|password|secret(?:_access)?(?:_key)?|token)"
+     rb"""['"]?[ \t]*[:=][ \t]*['"][^'"\s{}]{6,}['"]""",
+     (b'API_KEY', b'PASSWORD', b'SECRET', b'TOKEN', b'api_key', b'password', b'secret', b'token')),
+    ('aws-access-key-id', 'CRITICAL', 'CWE-798', "AWS access key id",
+     rb"\b(?:AKIA|ASIA)[0-9A-Z]{16}\b", (b'AKIA', b'ASIA')),
+    ('api-token', 'CRITICAL', 'CWE-798', "Secret API token",
+     rb"\bsk-[A-Za-z0-9]{20,}", (b'sk-',)),
+    ('private-key', 'CRITICAL', 'CWE-798', "Private key block",
+     rb"-----BEGIN (?:[A-Z]+ )?PRIVATE KEY-----", (b'PRIVATE KEY',)),
+    ('url-credentials', 'HIGH', 'CWE-798', "Credentials embedded in a connection URL",
+     rb"""\b[a-z][a-z0-9+.-]*://[^/\s:@'"]+:(?!\*+@)[^/\s@'"]+@""", (b'://',)),
+    ('tls-verify-disabled', 'CRITICAL', 'CWE-295', "TLS certificate verification disabled",
+     rb"\bverify[ \t]*=[ \t]*False\b", (b'verify',)),
+    ('tls-warnings-disabled', 'CRITICAL', 'CWE-295', "TLS warnings suppressed",
+     rb"\bdisable_warnings[ \t]*\(", (b'disable_warnings',)),
+    ('sql-fstring', 'CRITICAL', 'CWE-89', "SQL with a value interpolated by an f-string",
+     rb"""\bf(?:"[ \t]*(?:SELECT|INSERT|UPDATE|DELETE)\b[^"\n]*?[=<>][ \t]*'?\{"""
+     rb"""|'[ \t]*(?:SELECT|INSERT|UPDATE|DELETE)\b[^'\n]*?[=<>][ \t]*"?\{)""",
+     (b'SELECT', b'INSERT', b'UPDATE', b'DELETE')),
+    ('credential-in-log', 'HIGH', 'CWE-532', "Credential interpolated into a log message",
+     rb"""\b(?:logger|logging|log)\.(?:debug|info|warning|error|exception|critical)\([ \t]*"""
+     rb"""f['"][^\n]*?\{[^}\n]*(?:KEY|PASSWORD|SECRET|TOKEN|CONNECTION_STRING"""
+     rb"""|api_key|password|secret|token)[^}\n]*\}""",
+     (b'logger.', b'logging.', b'log.')),
+    ('cleartext-sensitive-column', 'HIGH', 'CWE-312', "Sensitive column stored as plain text",
+     rb"\b(?:password|credit_card|ssn)[ \t]+TEXT\b", (b'TEXT',)),
+    ('insecure-http-url', 'MEDIUM', 'CWE-319', "Plain HTTP URL to a remote host",
+     rb"""['"]http://(?!localhost\b|127\.|\[::1\]|0\.0\.0\.0|\{)[^'"\s]+""", (b'http://',)),
+)
+RULES_BY_ID = {rule[0]: rule for rule in RULES}
+
+# Findings on a line carrying this marker are dropped (same marker as bandit)
+SUPPRESS_MARKER = b'# nosec'
+
+# Below this many files a scan runs inline; starting workers would cost more
+INLINE_THRESHOLD = 32
+
+_REDACTIONS = (
+    (re.compile(rb"""(['"])([^'"\s]{3})[^'"\s]{3,}\1"""), rb"\1\2***\1"),
+    (re.compile(rb"(://[^/\s:@'\"]+:)[^/\s@'\"]+@"), rb"\1***@"),
+    (re.compile(rb"\b(AKIA|ASIA|sk-)[0-9A-Za-z]{8,}"), rb"\1***"),
+)
+
+
+def redact(line):
+    """Mask string literals, URL passwords and key-shaped tokens in a reported line"""
+    for pattern, replacement in _REDACTIONS:
+        line = pattern.sub(replacement, line)
+    return line
+
+
+def ruleset_version(rules=RULES):
+    """Fingerprint of the rules, so cached results from other rules are discarded"""
+    digest = hashlib.blake2b(repr(rules).encode(), digest_size=4).digest()
+    # Stored in PRAGMA user_version, a signed 32-bit integer
+    return int.from_bytes(digest, 'big') & 0x7FFFFFFF
+
+
+def _line_end(data, position):
+    end = data.find(b'\n', position)
+    return end if end != -1 else len(data)
+
+
+def _load_automaton():
+    """pyahocorasick automaton class, or None when the package is not installed"""
+    try:
+        import ahocorasick
+    except ImportError:
+        return None
+    return ahocorasick.Automaton
+
+
+class SecretsScanner:
+    """Combined-regex scanner for one buffer or file
+
+    Rules are compiled into one alternation per set of rules, and a literal
+    prefilter points it at the lines worth matching: only lines holding one
+    of the rules' literals are searched, and only for the rules those
+    literals belong to. Clean files never reach the regex engine. Python's
+    re cannot skip ahead through an alternation like this, so searching
+    whole files with it (prefilter='none') is slower than one regex per rule.
+
+    prefilter is 'aho' (pyahocorasick, one pass for every literal), 'find'
+    (one C-speed substring search per literal and line), 'none', or 'auto'
+    for 'aho' when installed and 'find' otherwise. Files are memory-mapped;
+    only 'aho' copies them, as it needs a str.
+    """
+
+    def __init__(self, rules=RULES, prefilter='auto', max_bytes=5 * 1024 * 1024):
+        self.rules = rules
+        self.max_bytes = max_bytes
+        automaton = _load_automaton() if prefilter in ('auto', 'aho') else None
+        if prefilter == 'aho' and automaton is None:
+            raise ValueError("prefilter 'aho' needs the pyahocorasick package")
+        if prefilter == 'auto':
+            prefilter = 'aho' if automaton else 'find'
+        if prefilter not in ('aho', 'find', 'none'):
+            raise ValueError(f"Unknown prefilter: {prefilter}")
+        self.prefilter = prefilter
+
+        self._matchers = {}
+        self._all = frozenset(range(len(rules)))
+        owners = {}
+        for index, rule in enumerate(rules):
+            for literal in rule[5]:
+                owners.setdefault(literal, set()).add(index)
+        self._literals = [(literal, frozenset(indexes)) for literal, indexes in owners.items()]
+        if prefilter == 'aho':
+            self._automaton = automaton()
+            for literal, indexes in self._literals:
+                self._automaton.add_word(literal.decode('latin-1'), (len(literal), indexes))
+            self._automaton.make_automaton()
+
+    def _matcher(self, indexes):
+        """Combined pattern for a set of rule indexes, compiled once per distinct set"""
+        matcher = self._matchers.get(indexes)
+        if matcher is None:
+            # Group names carry the rule index, so match.lastgroup identifies the rule;
+            # alternatives keep rule order, so overlapping rules resolve the same way
+            matcher = self._matchers[indexes] = re.compile(
+                b'|'.join(b'(?P<r%d>%s)' % (index, self.rules[index][4])
+                          for index in sorted(indexes))
+            )
+        return matcher
+
+    def _literal_hits(self, data):
+        """{line offset: rules with a literal on that line}, for lines holding any literal"""
+        lines = {}
+        if self.prefilter == 'find':
+            for literal, indexes in self._literals:
+                position = data.find(literal)
+                while position != -1:
+                    line_start = data.rfind(b'\n', 0, position) + 1
+                    lines[line_start] = lines.get(line_start, frozenset()) | indexes
+                    # Later hits on this line add nothing
+                    line_end = data.find(b'\n', position)
+                    position = data.find(literal, line_end) if line_end != -1 else -1
+        else:
+            text = data[:].decode('latin-1')  # One char per byte, so offsets carry over
+            for end, (length, indexes) in self._automaton.iter(text):
+                line_start = text.rfind('\n', 0, end - length + 1) + 1
+                lines[line_start] = lines.get(line_start, frozenset()) | indexes
+        return lines
+
+    def _matches(self, data):
+        if self.prefilter == 'none':
+            return self._matcher(self._all).finditer(data)
+        lines = self._literal_hits(data)
+        # Rules match within one line, so only lines holding a literal are
+        # searched, and only for the rules those literals belong to
+        return itertools.chain.from_iterable(
+            self._matcher(lines[line_start]).finditer(data, line_start, _line_end(data, line_start))
+            for line_start in sorted(lines)
+        )
+
+    def scan_buffer(self, data):
+        """Findings in a bytes-like object as [rule id, line, column, redacted line] lists"""
+        findings = []
+        line = 1
+        counted = 0
+        for match in self._matches(data):
+            start = match.start()
+            line_start = data.rfind(b'\n', 0, start) + 1
+            text = data[line_start:_line_end(data, start)]
+            # Matches come in order, so each newline is counted once
+            line += data[counted:line_start].count(b'\n')
+            counted = line_start
+            if SUPPRESS_MARKER in text:
+                continue
+            rule = self.rules[int(match.lastgroup[1:])]
+            excerpt = redact(text.strip())[:160].decode('utf-8', 'replace')
+            findings.append([rule[0], line, start - line_start + 1, excerpt])
+        return findings
+
+    def scan_file(self, path, cached=None):
+        """Return (path, size, mtime_ns, digest, findings, from_cache)
+
+        findings is None for skipped files: unreadable, empty, over max_bytes,
+        or binary (a NUL byte in the first 8 KiB). `cached(digest)` may return
+        stored findings for content already scanned, e.g. a file that was
+        touched, renamed or copied.
+        """
+        try:
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if not 0 < stat.st_size <= self.max_bytes:
+                    return path, stat.st_size, stat.st_mtime_ns, None, None, False
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    if b'\0' in data[:8192]:
+                        return path, stat.st_size, stat.st_mtime_ns, None, None, False
+                    digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+                    findings = cached(digest) if cached else None
+                    if findings is not None:
+                        return path, stat.st_size, stat.st_mtime_ns, digest, findings, True
+                    return (path, stat.st_size, stat.st_mtime_ns, digest,
+                            self.scan_buffer(data), False)
+        except (OSError, ValueError):
+            return path, None, None, None, None, False
+
+
+class ScanCache:
+    """Findings by content digest, plus a stat index to skip reading unchanged files
+
+    A file whose path, size and mtime match the index is not opened at all.
+    Otherwise it is hashed, and content already scanned (touched, renamed or
+    copied files) reuses the stored findings. The cache is cleared when the
+    rules change.
+    """
+
+    def __init__(self, path, version):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS scan_files (path TEXT PRIMARY KEY, size INTEGER, "
+                "mtime_ns INTEGER, digest TEXT) WITHOUT ROWID"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS scan_results (digest TEXT PRIMARY KEY, "
+                "findings TEXT) WITHOUT ROWID"
+            )
+            if self.conn.execute("PRAGMA user_version").fetchone()[0] != version:
+                self.conn.execute("DELETE FROM scan_files")
+                self.conn.execute("DELETE FROM scan_results")
+                self.conn.execute(f"PRAGMA user_version = {int(version)}")
+
+    def by_stat(self, path, stat):
+        row = self.conn.execute(
+            "SELECT r.findings FROM scan_files f JOIN scan_results r ON r.digest = f.digest "
+            "WHERE f.path = ? AND f.size = ? AND f.mtime_ns = ?",
+            (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def by_digest(self, digest):
+        row = self.conn.execute(
+            "SELECT findings FROM scan_results WHERE digest = ?", (digest,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def store(self, results, started):
+        """Record (path, size, mtime_ns, digest, findings) for files read by a scan"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO scan_results (digest, findings) VALUES (?, ?)",
+                [(digest, json.dumps(findings)) for _, _, _, digest, findings in results]
+            )
+            # A file modified within the mtime resolution of the scan could change
+            # again without changing its stat; leave it out of the stat index
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO scan_files (path, size, mtime_ns, digest) "
+                "VALUES (?, ?, ?, ?)",
+                [(os.path.abspath(path), size, mtime_ns, digest)
+                 for path, size, mtime_ns, digest, _ in results
+                 if mtime_ns < (started - 2) * 1e9]
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+_scanner = None
+_cache = None
+
+
+def _init_worker(prefilter, max_bytes, cache_path):
+    # Each worker compiles the rules once and reads the cache without writing it
+    global _scanner, _cache
+    _scanner = SecretsScanner(prefilter=prefilter, max_bytes=max_bytes)
+    if cache_path and os.path.exists(cache_path):
+        _cache = sqlite3.connect(f"file:{cache_path}?mode=ro", uri=True)
+
+
+def _cached_findings(digest):
+    row = _cache.execute("SELECT findings FROM scan_results WHERE digest = ?", (digest,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _scan_paths(paths):
+    cached = _cached_findings if _cache is not None else None
+    return [_scanner.scan_file(path, cached) for path in paths]
+
+
+class ScanReport:
+    """Findings and counters of one scan run"""
+
+    def __init__(self):
+        self.findings = []  # (path, [rule id, line, column, redacted line])
+        self.files_scanned = 0
+        self.files_cached = 0
+        self.files_skipped = 0
+        self.bytes_scanned = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def add(self, path, findings):
+        self.findings.extend((path, finding) for finding in findings)
+
+    def counts(self):
+        """Findings per severity"""
+        counts = dict.fromkeys(SEVERITIES, 0)
+        for _, finding in self.findings:
+            counts[RULES_BY_ID[finding[0]][1]] += 1
+        return counts
+
+    def as_dict(self):
+        return {
+            'files_scanned': self.files_scanned,
+            'files_cached': self.files_cached,
+            'files_skipped': self.files_skipped,
+            'bytes_scanned': self.bytes_scanned,
+            'elapsed_seconds': self.elapsed,
+            'findings': [
+                {'path': path, 'rule': rule_id, 'severity': RULES_BY_ID[rule_id][1],
+                 'cwe': RULES_BY_ID[rule_id][2], 'line': line, 'column': column,
+                 'excerpt': excerpt}
+                for path, (rule_id, line, column, excerpt) in self.findings
+            ],
+        }
+
+
+def iter_files(paths, exclude_dirs=('.git', '__pycache__', 'node_modules', '.venv', 'venv')):
+    """Every file under the given files and directories, skipping excluded directory names"""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path  # Missing paths are reported as skipped
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(name for name in dirs if name not in exclude_dirs)
+            for name in sorted(files):
+                yield os.path.join(root, name)
+
+
+def scan(paths, workers=None, cache_path=None, prefilter='auto', max_bytes=5 * 1024 * 1024,
+         chunk_size=64):
+    """Scan files and directories, returning a ScanReport
+
+    Unchanged files are answered from the cache at cache_path, if given.
+    The rest are scanned on a process pool of `workers` processes (default:
+    one per CPU), in chunks of chunk_size files; small scans run inline.
+    """
+    report = ScanReport()
+    started = time.time()
+    cache = ScanCache(cache_path, ruleset_version()) if cache_path else None
+    scanner = SecretsScanner(prefilter=prefilter, max_bytes=max_bytes)
+    try:
+        pending = []
+        for path in iter_files(paths):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                report.files_skipped += 1
+                continue
+            findings = cache.by_stat(path, stat) if cache else None
+            if findings is None:
+                pending.append(path)
+            else:
+                report.files_cached += 1
+                report.add(path, findings)
+
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(pending) <= INLINE_THRESHOLD:
+            lookup = cache.by_digest if cache else None
+            results = (scanner.scan_file(path, lookup) for path in pending)
+            executor = None
+        else:
+            # Workers only read the cache; this process writes it after the scan
+            executor = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(scanner.prefilter, max_bytes, cache_path)
+            )
+            chunks = [pending[start:start + chunk_size]
+                      for start in range(0, len(pending), chunk_size)]
+            results = (result for chunk in executor.map(_scan_paths, chunks) for result in chunk)
+
+        scanned = []
+        try:
+            for path, size, mtime_ns, digest, findings, from_cache in results:
+                if findings is None:
+                    report.files_skipped += 1
+                    continue
+                if from_cache:
+                    report.files_cached += 1
+                else:
+                    report.files_scanned += 1
+                    report.bytes_scanned += size
+                report.add(path, findings)
+                scanned.append((path, size, mtime_ns, digest, findings))
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+        if cache:
+            cache.store(scanned, started)
+    finally:
+        if cache:
+            cache.close()
+    report.finished = time.perf_counter()
+    return report
+
+
+def _default_cache_path():
+    root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'secrets_scanner.db')
+
+
+def main():
+    """Scan paths and exit non-zero if any finding reaches --fail-on"""
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('paths', nargs='*', default=['.'])
+    parser.add_argument('--workers', type=int, default=None,
+                        help="scanner processes (default: one per CPU)")
+    parser.add_argument('--cache', default=_default_cache_path(),
+                        help="results cache for incremental re-scans (default: %(default)s)")
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--prefilter', choices=('auto', 'aho', 'find', 'none'), default='auto')
+    parser.add_argument('--format', choices=('text', 'json'), default='text')
+    parser.add_argument('--fail-on', choices=SEVERITIES + ('never',), default='HIGH')
+    args = parser.parse_args()
+
+    report = scan(args.paths, workers=args.workers,
+                  cache_path=None if args.no_cache else args.cache, prefilter=args.prefilter)
+    if args.format == 'json':
+        print(json.dumps(report.as_dict(), indent=2))
+    else:
+        for path, (rule_id, line, column, excerpt) in report.findings:
+            _, severity, cwe, description, _, _ = RULES_BY_ID[rule_id]
+            print(f"{path}:{line}:{column}: {severity} {rule_id} ({cwe}) {description}: {excerpt}")
+        counts = report.counts()
+        print(f"{len(report.findings)} findings ("
+              + ', '.join(f"{counts[severity]} {severity.lower()}" for severity in reversed(SEVERITIES))
+              + f") in {report.files_scanned} scanned, {report.files_cached} cached, "
+              f"{report.files_skipped} skipped files, {report.elapsed:.2f}s", file=sys.stderr)
+
+    if args.fail_on != 'never':
+        threshold = SEVERITIES.index(args.fail_on)
+        if any(SEVERITIES.index(RULES_BY_ID[finding[0]][1]) >= threshold
+               for _, finding in report.findings):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Sharded user_data Storage
+Routes user_data rows across N SQLite files by user id, each file with its own writer lock
+"""
+
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from db_pool import SQLiteConnectionPool, get_pool
+from schema import (USER_DATA_COLUMNS, USER_DATA_MIGRATIONS, USER_DATA_SCHEMA,
+                    USER_DATA_SHARD_MIGRATIONS)
+
+_MASK64 = (1 << 64) - 1
+
+
+def shard_paths(database, count):
+    """Database files for a layout of `count` shards; one shard is the database itself
+
+    The shard count is part of the file name, so files of different layouts
+    never mix and a rebalance can write the new layout next to the old one.
+    """
+    if count == 1:
+        return [database]
+    root, ext = os.path.splitext(database)
+    return [f"{root}.shard{index}-of-{count}{ext or '.db'}" for index in range(count)]
+
+
+def shard_index(user_id, count):
+    """Stable shard of a user id; the same in every process and Python version"""
+    # Fibonacci hashing spreads sequential ids evenly without a digest per call
+    return ((user_id * 0x9E3779B97F4A7C15) & _MASK64) * count >> 64
+
+
+class ShardedUserStore:
+    """One connection pool per shard file, plus routing and scatter-gather helpers
+
+    Rows live on the shard chosen by shard_index(id). Each shard is a
+    separate SQLite file, so writes to different shards do not contend for
+    one writer lock. Queries that are not keyed by id run on every shard in
+    parallel through scatter().
+    """
+
+    def __init__(self, database, count, max_size=5, timeout=5.0):
+        if count < 2:
+            raise ValueError("A sharded store needs at least 2 shards")
+        self.count = count
+        self.paths = shard_paths(database, count)
+        self.pools = [
+            get_pool(path, schema=USER_DATA_SCHEMA, migrations=USER_DATA_SHARD_MIGRATIONS,
+                     max_size=max_size, timeout=timeout)
+            for path in self.paths
+        ]
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def shard_for(self, user_id):
+        return shard_index(user_id, self.count)
+
+    def pool_for(self, user_id):
+        return self.pools[shard_index(user_id, self.count)]
+
+    def group(self, items, key=None):
+        """Split ids (or rows, with `key` returning the id) into {shard: [items]}"""
+        groups = {}
+        for item in items:
+            user_id = item if key is None else key(item)
+            groups.setdefault(shard_index(user_id, self.count), []).append(item)
+        return groups
+
+    def scatter(self, fn, shards=None):
+        """Call fn(shard) for every shard (or the given ones) in parallel; results in order"""
+        shards = range(self.count) if shards is None else list(shards)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.count, thread_name_prefix='shard')
+            executor = self._executor
+        # sqlite3 releases the GIL while a statement runs, so shards are read concurrently
+        return list(executor.map(fn, shards))
+
+    def stats(self):
+        return [dict(pool.stats(), database=os.path.basename(pool.database))
+                for pool in self.pools]
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+def _open_layout(database, count):
+    """Create user_data and apply the migrations on every file of a layout
+
+    Returns one plain connection per file. The bootstrap pool is closed
+    first, so none of its connections outlives it.
+    """
+    # A single shard is DATABASE_PATH itself, which also holds the other tables
+    migrations = USER_DATA_MIGRATIONS if count == 1 else USER_DATA_SHARD_MIGRATIONS
+    connections = []
+    for path in shard_paths(database, count):
+        pool = SQLiteConnectionPool(path, schema=USER_DATA_SCHEMA, migrations=migrations,
+                                    max_size=1)
+        with pool.connection():
+            pass
+        pool.close_all()
+        connections.append(sqlite3.connect(path))
+    return connections
+
+
+def _count_rows(conn):
+    return conn.execute("SELECT COUNT(*) FROM user_data").fetchone()[0]
+
+
+def rebalance(database, from_count, to_count, batch_size=10000, drop_source=False, log=print):
+    """Copy user_data from one shard layout to another; run with the service stopped
+
+    Rows are streamed in id order and written to their new shard in batches,
+    one transaction per batch and shard. The target must be empty. Row counts
+    are checked at the end; the source is only cleared with drop_source=True,
+    after the check passes. Returns the number of rows copied.
+    """
+    if from_count == to_count:
+        raise ValueError("Source and target shard counts are the same")
+    sources = _open_layout(database, from_count)
+    targets = _open_layout(database, to_count)
+    if any(_count_rows(conn) for conn in targets):
+        raise ValueError(f"Target layout of {to_count} shards already has user_data rows")
+
+    columns = ', '.join(USER_DATA_COLUMNS)
+    insert = (f"INSERT INTO user_data ({columns}) "
+              f"VALUES ({', '.join('?' * len(USER_DATA_COLUMNS))})")
+    expected = sum(_count_rows(conn) for conn in sources)
+    copied = 0
+    for number, source in enumerate(sources):
+        last_id = 0
+        while True:
+            rows = source.execute(
+                f"SELECT {columns} FROM user_data WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            groups = {}
+            for row in rows:
+                groups.setdefault(shard_index(row[0], to_count), []).append(row)
+            for index, group in groups.items():
+                with targets[index]:
+                    targets[index].executemany(insert, group)
+            copied += len(rows)
+            last_id = rows[-1][0]
+        log(f"source {number + 1}/{from_count} copied, {copied}/{expected} rows")
+
+    written = sum(_count_rows(conn) for conn in targets)
+    if written != expected:
+        raise RuntimeError(f"Row count mismatch after rebalance: {written} != {expected}")
+
+    if drop_source and from_count == 1:
+        # The unsharded file also holds other tables; only empty user_data
+        with sources[0]:
+            sources[0].execute("DELETE FROM user_data")
+        sources[0].execute("VACUUM")
+    for conn in sources + targets:
+        conn.close()
+    if drop_source and from_count > 1:
+        for path in shard_paths(database, from_count):
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+    return copied
+
+
+def main():
+    """Offline shard rebalancing tool"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Move user_data between shard layouts. Stop the service first, "
+                    "then set SQLITE_SHARDS to the new count before starting it again."
+    )
+    parser.add_argument('--database', default=os.environ.get('DATABASE_PATH', 'app_data.db'))
+    parser.add_argument('--from-shards', type=int, required=True)
+    parser.add_argument('--to-shards', type=int, required=True)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--drop-source', action='store_true',
+                        help="remove the old layout's rows after a successful copy")
+    args = parser.parse_args()
+
+    copied = rebalance(args.database, args.from_shards, args.to_shards,
+                       batch_size=args.batch_size, drop_source=args.drop_source)
+    print(f"Copied {copied} rows into {args.to_shards} shard(s); "
+          f"now start the service with SQLITE_SHARDS={args.to_shards}")
+
+
+if __name__ == "__main__":
+    main()
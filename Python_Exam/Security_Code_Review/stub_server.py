@@ -0,0 +1,170 @@
+"""
+Local Stub HTTP Server
+Stand-in for API_BASE_URL and WEBHOOK_ENDPOINT in benchmarks and local testing
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from payload_codec import decode_body
+from rate_limit import TokenBucket
+
+# Request bodies the stub can decode
+ALL_TYPES = ('application/json', 'application/msgpack')
+ALL_ENCODINGS = ('identity', 'gzip', 'zstd')
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # Keep-alive so pooled clients can reuse connections
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # Request logging would dominate benchmark timings
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self._read_body()
+        stub = self.server.stub
+        stub.record_request(self.path)
+
+        if stub.throttle is not None and not stub.throttle.try_acquire():
+            stub.record_request('throttled')
+            self._send_json(429, {'error': 'rate limited'},
+                            headers={'Retry-After': f"{stub.retry_after:g}"})
+            return
+
+        if stub.latency:
+            time.sleep(stub.latency)
+
+        content_type = self.headers.get('Content-Type', 'application/json')
+        content_encoding = self.headers.get('Content-Encoding', 'identity')
+        if not stub.accepts(content_type, content_encoding):
+            stub.record_request('unsupported')
+            self._send_json(415, {'error': 'unsupported media type'}, headers={
+                'Accept': ', '.join(stub.accept_types),
+                'Accept-Encoding': ', '.join(stub.accept_encodings),
+            })
+            return
+
+        if self.path.endswith('/process'):
+            # Decoded like a real upstream would, so codec costs show in latency
+            decode_body(body, content_type, content_encoding)
+            self._send_json(200, {'status': 'ok', 'received_bytes': len(body)})
+        elif self.path.endswith('/process/batch'):
+            items = decode_body(body, content_type, content_encoding).get('items', [])
+            results = [{'status': 'ok', 'item': index} for index in range(len(items))]
+            self._send_json(200, {'results': results})
+        elif self.path.endswith('/webhook'):
+            self._send_json(200, {'status': 'accepted'})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+
+class StubServer:
+    """Threaded HTTP server on localhost answering /process, /process/batch and /webhook
+
+    Use as a context manager; `url` is the base URL to pass as api_base_url,
+    and `webhook_url` the endpoint to pass as webhook_endpoint. With
+    `throttle_rate` set, requests beyond that many per second (plus
+    `throttle_burst`) get 429 with a Retry-After of `retry_after` seconds,
+    counted under requests['throttled']. Request bodies in any of
+    `accept_types` and `accept_encodings` are decoded; others get 415 with
+    Accept / Accept-Encoding headers, counted under requests['unsupported'].
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, throttle_rate=0.0,
+                 throttle_burst=None, retry_after=1.0, accept_types=ALL_TYPES,
+                 accept_encodings=ALL_ENCODINGS):
+        self.latency = latency
+        self.accept_types = tuple(accept_types)
+        self.accept_encodings = tuple(accept_encodings)
+        self.throttle = TokenBucket(throttle_rate, throttle_burst) if throttle_rate else None
+        self.retry_after = retry_after
+        self._httpd = ThreadingHTTPServer((host, port), _StubHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread = None
+        self._lock = threading.Lock()
+        self.requests = {}
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def webhook_url(self):
+        return f"{self.url}/webhook"
+
+    def accepts(self, content_type, content_encoding):
+        media_type = content_type.split(';', 1)[0].strip().lower()
+        return (media_type in self.accept_types
+                and content_encoding.strip().lower() in self.accept_encodings)
+
+    def record_request(self, path):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def main():
+    """Run the stub server in the foreground"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="seconds to sleep before answering each request")
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help="answer 429 beyond this many requests per second (0 = never)")
+    parser.add_argument('--retry-after', type=float, default=1.0)
+    parser.add_argument('--accept-encodings', default=','.join(ALL_ENCODINGS),
+                        help="request Content-Encodings to accept; others get 415")
+    args = parser.parse_args()
+
+    server = StubServer(port=args.port, latency=args.latency, throttle_rate=args.throttle_rate,
+                        retry_after=args.retry_after,
+                        accept_encodings=args.accept_encodings.split(','))
+    print(f"Stub server listening on {server.url}")
+    server.start()
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Local Stub SMTP Server
+Stand-in for SMTP_SERVER in benchmarks and local testing; accepts any login and discards mail
+"""
+
+import socketserver
+import threading
+import time
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough ESMTP for smtplib: EHLO, AUTH, MAIL, RCPT, DATA, RSET, NOOP, QUIT"""
+
+    def _reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def _read_data(self):
+        size = 0
+        for line in self.rfile:
+            if line in (b'.\r\n', b'.\n'):
+                return size
+            size += len(line)
+        return None
+
+    def handle(self):
+        stub = self.server.stub
+        stub.record('connections')
+        self._reply('220 stub-smtp ESMTP ready')
+        for raw in self.rfile:
+            command = raw.decode('ascii', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                # No STARTTLS: the stub is for SMTP_USE_TLS=false on localhost only
+                self._reply('250-stub-smtp')
+                self._reply('250-AUTH PLAIN LOGIN')
+                self._reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self._reply('250 stub-smtp')
+            elif verb == 'AUTH':
+                if command.upper().startswith('AUTH LOGIN'):
+                    # Username and password prompts; the answers are not checked
+                    self._reply('334 VXNlcm5hbWU6')
+                    self.rfile.readline()
+                    self._reply('334 UGFzc3dvcmQ6')
+                    self.rfile.readline()
+                elif len(command.split()) < 3:
+                    self._reply('334 ')
+                    self.rfile.readline()
+                stub.record('logins')
+                self._reply('235 2.7.0 Authentication successful')
+            elif verb == 'RCPT' and any(address in command for address in stub.reject_recipients):
+                stub.record('refused')
+                self._reply('550 5.1.1 Mailbox unavailable')
+            elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self._reply('250 OK')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                size = self._read_data()
+                if size is None:
+                    return
+                if stub.latency:
+                    time.sleep(stub.latency)
+                stub.record('messages')
+                stub.record('bytes', size)
+                self._reply('250 OK queued')
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                self._reply('502 Command not implemented')
+
+
+class _ThreadingSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class StubSMTPServer:
+    """Threaded SMTP server on localhost that counts and discards every message
+
+    Use as a context manager and point SMTP_SERVER / SMTP_PORT at `host` and
+    `port` with SMTP_USE_TLS=false. Any AUTH succeeds. Recipients listed
+    in `reject_recipients` get a 550. Counters for connections, logins,
+    messages, bytes and refused recipients are kept in `stats`.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, reject_recipients=()):
+        self.latency = latency
+        self.reject_recipients = tuple(reject_recipients)
+        self._server = _ThreadingSMTPServer((host, port), _SMTPHandler)
+        self._server.stub = self
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {'connections': 0, 'logins': 0, 'messages': 0, 'bytes': 0, 'refused': 0}
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def record(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def main():
+    """Run the stub SMTP server in the foreground"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="seconds to sleep before accepting each message")
+    args = parser.parse_args()
+
+    server = StubSMTPServer(port=args.port, latency=args.latency)
+    print(f"Stub SMTP server listening on {server.host}:{server.port}")
+    server.start()
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
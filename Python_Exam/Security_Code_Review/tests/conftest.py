@@ -0,0 +1,55 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# The service modules are imported as top-level modules, like the benchmarks do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def service(tmp_path_factory):
+    """The FIXED service module, imported with throwaway secrets and a temporary database
+
+    Its settings are read at import, so every test in the session shares them.
+    """
+    fernet = pytest.importorskip('cryptography.fernet')
+    pytest.importorskip('requests')
+    with pytest.MonkeyPatch.context() as env:
+        for name in ('API_KEY', 'DATABASE_PASSWORD', 'AWS_ACCESS_KEY', 'AWS_SECRET_KEY',
+                     'SMTP_PASSWORD', 'WEBHOOK_SECRET'):
+            env.setenv(name, f'test-{name.lower()}')
+        env.setenv('ENCRYPTION_KEY', fernet.Fernet.generate_key().decode())
+        env.setenv('DATABASE_PATH', str(tmp_path_factory.mktemp('service') / 'app_data.db'))
+        env.setenv('BCRYPT_ROUNDS', '4')
+        env.setenv('CRYPTO_WORKERS', '1')
+        yield importlib.import_module('Security_Issue_Python_code_FIXED')
+
+
+@pytest.fixture
+def stub():
+    from stub_server import StubServer
+
+    with StubServer() as server:
+        yield server
+
+
+@pytest.fixture
+def processor(service, stub):
+    processor = service.SecureDataProcessor(api_base_url=stub.url, webhook_endpoint=stub.webhook_url)
+    try:
+        yield processor
+    finally:
+        processor.close()
+
+
+@pytest.fixture
+def sharded(processor, tmp_path):
+    """The processor with user_data split over two fresh shard files"""
+    from sharding import ShardedUserStore
+
+    processor.user_shards = ShardedUserStore(str(tmp_path / 'app.db'), 2)
+    yield processor
+    for pool in processor.user_shards.pools:
+        pool.close_all()
@@ -0,0 +1,98 @@
+"""Async call_external_api sharing the sync processor's breaker, codecs and hedger"""
+
+import asyncio
+import time
+
+import pytest
+
+from payload_codec import CodecNegotiator
+from resilience import CircuitBreaker, Hedger
+from stub_server import StubServer
+
+aiohttp = pytest.importorskip('aiohttp')
+
+
+def run(stub, scenario, setup=None):
+    from async_processor import AsyncSecureDataProcessor
+
+    async def main():
+        async with AsyncSecureDataProcessor(stub.url, stub.webhook_url) as processor:
+            if setup:
+                setup(processor.processor)
+            return await scenario(processor)
+
+    return asyncio.run(main())
+
+
+def test_throttled_calls_open_the_shared_breaker(service):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+
+    async def scenario(processor):
+        assert (await processor.call_external_api({'value': 1}))['status'] == 'ok'
+        for _ in range(2):
+            with pytest.raises(service.APIError):
+                await processor.call_external_api({'value': 1})
+
+    with StubServer(throttle_rate=0.01, throttle_burst=1, retry_after=0) as stub:
+        run(stub, scenario, lambda processor: setattr(processor, 'api_breaker', breaker))
+
+    # The third call failed fast without reaching the upstream
+    assert stub.requests == {'/process': 2, 'throttled': 1}
+    stats = breaker.stats()
+    assert (stats['state'], stats['rejected']) == ('open', 1)
+
+
+def test_unsupported_encoding_falls_back_like_the_sync_path(service):
+    def setup(processor):
+        processor._api_codecs = CodecNegotiator(compressions=('gzip', 'identity'),
+                                                min_compress_bytes=0)
+
+    async def scenario(processor):
+        results = [await processor.call_external_api({1: 'a'}) for _ in range(2)]
+        return results, processor.processor.api_codec_choices()
+
+    with StubServer(accept_encodings=('identity',)) as stub:
+        results, choices = run(stub, scenario, setup)
+
+    assert [result['status'] for result in results] == ['ok', 'ok']
+    assert stub.requests == {'/process': 3, 'unsupported': 1}
+    assert choices == {f"{stub.url}/process": 'json+identity'}
+
+
+def test_unencodable_payload_is_an_api_error(service, stub):
+    async def scenario(processor):
+        with pytest.raises(service.APIError):
+            await processor.call_external_api({'value': object()})
+        return processor.processor.api_breaker.stats()
+
+    circuit = run(stub, scenario)
+    assert stub.requests == {}
+    assert (circuit['failures'], circuit['state']) == (0, 'closed')
+
+
+def test_call_async_cancels_the_losing_attempt():
+    hedger = Hedger(min_delay=0.02, default_delay=0.02, max_hedge_ratio=1.0)
+    attempts = []
+
+    async def slow_first(value):
+        attempt = len(attempts)
+        attempts.append('started')
+        try:
+            await asyncio.sleep(0.5 if attempt == 0 else 0)
+        except asyncio.CancelledError:
+            attempts[attempt] = 'cancelled'
+            raise
+        attempts[attempt] = 'finished'
+        return value
+
+    async def scenario():
+        started = time.monotonic()
+        result = await hedger.call_async(slow_first, 'x')
+        await asyncio.sleep(0)  # Let the cancellation land
+        return result, time.monotonic() - started
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == 'x'
+    assert elapsed < 0.3
+    assert attempts == ['cancelled', 'finished']
+    assert hedger.stats()['hedge_won'] == 1
@@ -0,0 +1,80 @@
+"""MicroBatcher grouping and coalescing, and batched API calls behind the circuit breaker"""
+
+import threading
+from concurrent.futures import wait
+
+import pytest
+
+from batching import MicroBatcher
+from resilience import CircuitBreaker
+
+
+def test_identical_payloads_share_one_result():
+    sent = []
+    release = threading.Event()
+
+    def send_batch(payloads):
+        release.wait(5)
+        sent.append(list(payloads))
+        return [payload['n'] * 10 for payload in payloads]
+
+    batcher = MicroBatcher(send_batch, max_batch_size=10, max_delay=0.05)
+    try:
+        futures = [batcher.submit({'n': n % 3}) for n in range(9)]
+        release.set()
+        assert [future.result(5) for future in futures] == [n % 3 * 10 for n in range(9)]
+    finally:
+        batcher.close()
+
+    assert sum(len(batch) for batch in sent) == 3
+    assert batcher.metrics.snapshot()['coalesced'] == 6
+
+
+def test_batches_are_cut_by_size():
+    sizes = []
+
+    def send_batch(payloads):
+        sizes.append(len(payloads))
+        return payloads
+
+    batcher = MicroBatcher(send_batch, max_batch_size=4, max_delay=1.0, max_in_flight=1)
+    futures = [batcher.submit({'n': n}) for n in range(10)]
+    batcher.close()
+
+    assert [future.result() for future in futures] == [{'n': n} for n in range(10)]
+    assert sum(sizes) == 10 and max(sizes) == 4
+
+
+def test_failed_batch_fails_every_future():
+    def send_batch(payloads):
+        raise RuntimeError("upstream down")
+
+    batcher = MicroBatcher(send_batch, max_delay=0.01)
+    futures = [batcher.submit({'n': n}) for n in range(3)]
+    wait(futures, timeout=5)
+    batcher.close()
+
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result()
+    assert batcher.metrics.snapshot()['failed_batches'] == 1
+
+
+def test_batched_calls_reach_the_batch_endpoint(processor, stub):
+    futures = [processor.submit_external_api({'n': n % 2}) for n in range(6)]
+    results = [future.result(5) for future in futures]
+
+    assert all(result['status'] == 'ok' for result in results)
+    assert stub.requests.get('/process/batch', 0) >= 1
+    assert '/process' not in stub.requests
+    assert processor.api_batch_metrics()['items'] == 2
+
+
+def test_open_circuit_fails_batches_fast(service, processor, stub):
+    breaker = processor.api_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+
+    with pytest.raises(service.APIError):
+        processor.call_external_api_batched({'n': 1}, timeout=5)
+    assert stub.requests == {}
+    assert breaker.stats()['rejected'] == 1
@@ -0,0 +1,81 @@
+"""BulkIngestor's duplicate-row fallback, failed-shard retention and retry_failed"""
+
+import itertools
+import sqlite3
+
+from sharding import shard_index
+
+# Each test writes its own id range into the session's shared database
+_ids = itertools.count(1_000_000, 1000)
+
+
+def user(user_id, name=None):
+    return {'id': user_id, 'username': name or f'user{user_id}', 'password': 'ingest-password',
+            'credit_card': '4111-1111-1111-1111'}
+
+
+def stored_ids(processor, ids, shard=None):
+    with processor.connect_to_database(shard=shard) as conn:
+        rows = conn.execute(
+            f"SELECT id FROM user_data WHERE id IN ({', '.join('?' * len(ids))}) ORDER BY id", ids
+        ).fetchall()
+    return [user_id for (user_id,) in rows]
+
+
+def ingest_with_shard_down(processor, monkeypatch, ids, down=1):
+    def unavailable(timeout=None):
+        raise sqlite3.OperationalError("unable to open database file")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(processor.user_shards.pools[down], 'acquire', unavailable)
+        return processor.bulk_ingest([user(user_id) for user_id in ids], batch_size=100)
+
+
+def test_duplicate_rows_are_rejected_one_by_one(processor):
+    base = next(_ids)
+    processor.bulk_ingest([user(base + 1)])
+    rows = [user(base + 1), user(base + 2), user(base + 3), user(base + 2, 'again'),
+            user(base + 4)]
+
+    report = processor.bulk_ingest(rows, batch_size=10)
+
+    assert report.rows_written == 3
+    assert report.invalid_rows == [(0, "id already exists"), (3, "id already exists")]
+    assert report.failed_batches == []
+    assert stored_ids(processor, [base + n for n in range(1, 5)]) == [base + n for n in range(1, 5)]
+    with processor.connect_to_database() as conn:
+        assert conn.execute("SELECT username FROM user_data WHERE id = ?",
+                            (base + 2,)).fetchone() == (f'user{base + 2}',)
+
+
+def test_failed_shard_keeps_only_its_own_rows(sharded, monkeypatch):
+    ids = list(range(1, 13))
+    report = ingest_with_shard_down(sharded, monkeypatch, ids)
+
+    down = [user_id for user_id in ids if shard_index(user_id, 2) == 1]
+    up = [user_id for user_id in ids if shard_index(user_id, 2) == 0]
+    assert down and up
+    assert report.rows_written == len(up)
+    [batch] = report.failed_batches
+    assert batch.error == 'DatabaseError'
+    assert [row[0] for row in batch.rows] == down
+    # Input positions still point at the right rows for the caller's error report
+    assert [ids[index] for index in batch.indexes] == down
+    assert report.as_dict()['failed_rows'] == len(down)
+    assert stored_ids(sharded, up, shard=0) == up
+
+
+def test_retry_failed_writes_the_kept_rows_without_hashing_again(sharded, monkeypatch):
+    ids = list(range(1, 13))
+    report = ingest_with_shard_down(sharded, monkeypatch, ids)
+    down = [row[0] for row in report.failed_batches[0].rows]
+
+    def no_rehash(passwords):
+        raise AssertionError("retry must reuse the hashed rows")
+
+    monkeypatch.setattr(sharded, 'hash_passwords', no_rehash)
+    report = sharded.retry_ingest(report)
+
+    assert report.failed_batches == []
+    assert report.rows_written == len(ids)
+    assert stored_ids(sharded, down, shard=1) == down
@@ -0,0 +1,99 @@
+"""UserRecordCache eviction, expiry and per-user invalidation"""
+
+import time
+
+from cache import UserRecordCache, row_size
+
+
+def row(user_id, padding=0):
+    return (user_id, f'user{user_id}', 'hash', b'card' + b'x' * padding, b'ssn', '2024-01-01')
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = UserRecordCache(max_entries=2)
+    cache.put(1, row(1))
+    cache.put(2, row(2))
+    assert cache.get(1) == row(1)
+    cache.put(3, row(3))
+
+    assert cache.get(2) is None
+    assert (cache.get(1), cache.get(3)) == (row(1), row(3))
+    assert cache.stats()['evictions'] == 1
+
+
+def test_byte_budget_evicts_and_skips_oversized_rows():
+    size = row_size(row(1, padding=1000))
+    cache = UserRecordCache(max_bytes=2 * size + size // 2)
+    for user_id in (1, 2, 3):
+        cache.put(user_id, row(user_id, padding=1000))
+
+    stats = cache.stats()
+    assert stats['entries'] == 2 and stats['bytes'] <= cache.max_bytes
+    assert cache.get(1) is None
+
+    cache.put(4, row(4, padding=10 * size))
+    assert cache.get(4) is None
+    assert cache.stats()['entries'] == 2
+
+
+def test_entries_expire_after_the_ttl():
+    cache = UserRecordCache(ttl=0.05)
+    cache.put(1, row(1))
+    assert cache.get(1) == row(1)
+    time.sleep(0.06)
+
+    assert cache.get(1) is None
+    stats = cache.stats()
+    assert (stats['expired'], stats['entries'], stats['bytes']) == (1, 0, 0)
+
+
+def test_invalidation_only_drops_the_written_users():
+    cache = UserRecordCache()
+    for user_id in (1, 2, 3):
+        cache.put(user_id, row(user_id))
+    cache.invalidate([2])
+
+    assert [cache.get(user_id) for user_id in (1, 2, 3)] == [row(1), None, row(3)]
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_read_racing_an_invalidation_of_its_own_user_is_not_cached():
+    cache = UserRecordCache()
+    token = cache.generation()
+    # Rows for users 1 and 2 are being read while user 1 is written
+    cache.invalidate([1])
+    cache.put(1, row(1), token)
+    cache.put(2, row(2), token)
+
+    assert cache.get(1) is None
+    assert cache.get(2) == row(2)
+    cache.put(1, row(1), cache.generation())
+    assert cache.get(1) == row(1)
+
+
+def test_forgotten_invalidations_reject_reads_older_than_them():
+    cache = UserRecordCache(max_entries=2)
+    token = cache.generation()
+    cache.invalidate([1])
+    cache.invalidate([2])
+    cache.invalidate([3])  # User 1's invalidation is no longer remembered
+
+    cache.put(1, row(1), token)
+    assert cache.get(1) is None
+    cache.put(4, row(4), cache.generation())
+    assert cache.get(4) == row(4)
+
+
+def test_processor_write_invalidates_only_that_user(processor):
+    processor.user_cache = UserRecordCache()
+    with processor.connect_to_database() as conn:
+        conn.executemany("INSERT INTO user_data (id, username) VALUES (?, ?)",
+                         [(2_000_001, 'kept'), (2_000_002, 'deleted')])
+    for user_id in (2_000_001, 2_000_002):
+        processor.fetch_user_data(user_id)
+
+    processor.delete_user(2_000_002)
+
+    assert processor.user_cache.get(2_000_001)[1] == 'kept'
+    assert processor.user_cache.get(2_000_002) is None
+    assert processor.fetch_user_data(2_000_002) is None
@@ -0,0 +1,155 @@
+"""S3Uploader against moto's in-process S3 stand-in"""
+
+import gc
+import hashlib
+
+import pytest
+
+boto3 = pytest.importorskip('boto3')
+moto = pytest.importorskip('moto')
+
+from cloud_storage import (  # noqa: E402
+    HASH_METADATA_KEY, MB, BufferReader, S3MultipartWriter, S3Uploader, as_byte_view
+)
+
+BUCKET = 'test-bucket'
+# Smallest part size S3 (and moto) accept for every part but the last
+PART = 5 * MB
+
+
+@pytest.fixture
+def s3():
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name='us-east-1', aws_access_key_id='testing',
+                              aws_secret_access_key='testing')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def record_parts(client):
+    """(part number, body size) of every UploadPart call made through client"""
+    parts = []
+
+    def record(params, **kwargs):
+        body = params['Body']
+        parts.append((params['PartNumber'], len(body) if hasattr(body, '__len__') else None))
+
+    client.meta.events.register('provide-client-params.s3.UploadPart', record)
+    return parts
+
+
+def uploader(client, **kwargs):
+    return S3Uploader(client, max_workers=4, multipart_threshold=PART,
+                      multipart_chunksize=PART, max_concurrency=2, **kwargs)
+
+
+def test_upload_buffer_splits_into_zero_copy_parts(s3):
+    data = bytes(range(256)) * (12 * MB // 256) + b'tail'
+    parts = record_parts(s3)
+
+    result = uploader(s3).upload_buffer(bytearray(data), BUCKET, 'buffer.bin')
+
+    assert result.status == 'uploaded'
+    assert sorted(parts) == [(1, PART), (2, PART), (3, len(data) - 2 * PART)]
+    stored = s3.get_object(Bucket=BUCKET, Key='buffer.bin')
+    assert stored['Body'].read() == data
+    assert stored['Metadata'][HASH_METADATA_KEY] == hashlib.sha256(data).hexdigest()
+
+
+def test_upload_buffer_below_threshold_is_one_put(s3):
+    parts = record_parts(s3)
+
+    result = uploader(s3).upload_buffer(memoryview(b'small payload'), BUCKET, 'small.bin')
+
+    assert result.status == 'uploaded'
+    assert parts == []
+    assert s3.get_object(Bucket=BUCKET, Key='small.bin')['Body'].read() == b'small payload'
+
+
+def test_upload_many_uses_multipart_for_large_files(s3, tmp_path):
+    path = tmp_path / 'large.bin'
+    path.write_bytes(b'x' * (2 * PART + 1))
+
+    [result] = uploader(s3).upload_many([str(path)], BUCKET)
+
+    assert result.status == 'uploaded'
+    # Multipart ETags end in the number of parts
+    assert s3.head_object(Bucket=BUCKET, Key='large.bin')['ETag'].strip('"').endswith('-3')
+
+
+def test_upload_many_skips_unchanged_files(s3, tmp_path):
+    paths = []
+    for name in ('a.txt', 'b.txt'):
+        path = tmp_path / name
+        path.write_text(f"contents of {name}")
+        paths.append(str(path))
+    s3_uploader = uploader(s3)
+
+    first = s3_uploader.upload_many(paths, BUCKET, key_prefix='batch/')
+    assert [result.status for result in first] == ['uploaded', 'uploaded']
+    assert [result.key for result in first] == ['batch/a.txt', 'batch/b.txt']
+
+    second = s3_uploader.upload_many(paths, BUCKET, key_prefix='batch/')
+    assert [result.status for result in second] == ['skipped', 'skipped']
+
+    (tmp_path / 'b.txt').write_text("changed")
+    third = s3_uploader.upload_many(paths, BUCKET, key_prefix='batch/')
+    assert [result.status for result in third] == ['skipped', 'uploaded']
+    assert s3.get_object(Bucket=BUCKET, Key='batch/b.txt')['Body'].read() == b"changed"
+
+    forced = s3_uploader.upload_many(paths, BUCKET, key_prefix='batch/', skip_unchanged=False)
+    assert [result.status for result in forced] == ['uploaded', 'uploaded']
+
+
+def test_upload_many_reports_failures_per_file(s3, tmp_path):
+    good = tmp_path / 'good.txt'
+    good.write_text("ok")
+    missing = tmp_path / 'missing.txt'
+
+    results = uploader(s3).upload_many([str(missing), str(good)], BUCKET)
+
+    assert [result.status for result in results] == ['failed', 'uploaded']
+    assert results[0].error == 'FileNotFoundError'
+    assert all(result.seconds >= 0 for result in results)
+
+
+def test_buffer_reader_returns_views_not_copies():
+    data = bytearray(b'abcdef')
+    reader = BufferReader(as_byte_view(data))
+
+    chunk = reader.read(3)
+    data[0] = ord('z')
+    assert isinstance(chunk, memoryview) and chunk.obj is data
+    assert bytes(chunk) == b'zbc'
+    assert bytes(reader.read()) == b'def'
+
+
+def test_upload_buffer_parts_read_straight_from_the_buffer(s3):
+    data = bytearray(b'p' * (2 * PART + 10))
+    bodies = []
+    s3.meta.events.register('provide-client-params.s3.UploadPart',
+                            lambda params, **kwargs: bodies.append(params['Body']))
+
+    assert uploader(s3).upload_buffer(data, BUCKET, 'views.bin').status == 'uploaded'
+
+    assert len(bodies) == 3
+    for body in bodies:
+        body.seek(0)
+        assert body.read(16).obj is data
+
+
+def test_abandoned_multipart_writer_is_aborted(s3):
+    writer = S3MultipartWriter(s3, BUCKET, 'abandoned.bin', part_size=PART)
+    writer.write(b'partial')
+    del writer
+    gc.collect()
+
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get('Uploads', []) == []
+    assert 'Contents' not in s3.list_objects_v2(Bucket=BUCKET, Prefix='abandoned')
+
+
+def test_multipart_writer_completes_on_close(s3):
+    with S3MultipartWriter(s3, BUCKET, 'streamed.bin', part_size=PART) as writer:
+        writer.write(b's' * (PART + 1))
+
+    assert len(s3.get_object(Bucket=BUCKET, Key='streamed.bin')['Body'].read()) == PART + 1
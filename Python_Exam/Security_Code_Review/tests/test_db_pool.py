@@ -0,0 +1,69 @@
+"""Nested checkouts of one pooled connection sharing, not ending, the outer transaction"""
+
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+
+from db_pool import SQLiteConnectionPool
+
+SCHEMA = ("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY)",)
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / 'pool.db'), schema=SCHEMA, max_size=2)
+    yield pool
+    pool.close_all()
+
+
+def committed_ids(pool):
+    conn = sqlite3.connect(pool.database)
+    try:
+        return [item_id for (item_id,) in conn.execute("SELECT id FROM items ORDER BY id")]
+    finally:
+        conn.close()
+
+
+@contextmanager
+def checkout(pool):
+    """What connect_to_database does with a pool"""
+    conn = pool.acquire()
+    try:
+        with pool.transaction(conn):
+            yield conn
+    finally:
+        pool.release(conn)
+
+
+def test_nested_checkout_does_not_commit_the_outer_transaction(pool):
+    with checkout(pool) as outer:
+        outer.execute("INSERT INTO items VALUES (1)")
+        with checkout(pool) as inner:
+            assert inner is outer
+            inner.execute("INSERT INTO items VALUES (2)")
+        assert committed_ids(pool) == []
+        assert outer.in_transaction
+    assert committed_ids(pool) == [1, 2]
+
+
+def test_failed_nested_checkout_only_undoes_its_own_work(pool):
+    with checkout(pool) as outer:
+        outer.execute("INSERT INTO items VALUES (1)")
+        with pytest.raises(sqlite3.IntegrityError):
+            with checkout(pool) as inner:
+                inner.execute("INSERT INTO items VALUES (2)")
+                inner.execute("INSERT INTO items VALUES (1)")
+        outer.execute("INSERT INTO items VALUES (3)")
+    assert committed_ids(pool) == [1, 3]
+
+
+def test_outer_failure_rolls_back_nested_work(pool):
+    with pytest.raises(RuntimeError):
+        with checkout(pool) as outer:
+            outer.execute("INSERT INTO items VALUES (1)")
+            with checkout(pool) as inner:
+                inner.execute("INSERT INTO items VALUES (2)")
+            raise RuntimeError("outer block failed")
+    assert committed_ids(pool) == []
+    assert pool.stats()['in_use'] == 0
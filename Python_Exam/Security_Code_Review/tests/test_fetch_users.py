@@ -0,0 +1,69 @@
+"""fetch_users splitting large id lists into chunked IN queries"""
+
+import pytest
+
+STORED = list(range(4_000_001, 4_000_026))
+
+
+@pytest.fixture
+def stored(processor):
+    with processor.connect_to_database() as conn:
+        conn.executemany("INSERT OR IGNORE INTO user_data (id, username) VALUES (?, ?)",
+                         [(user_id, f'bulk{user_id}') for user_id in STORED])
+    return STORED
+
+
+def spy_on_chunks(processor, monkeypatch):
+    chunks = []
+    fetch_chunk = processor._fetch_chunk
+
+    def recording(chunk, shard=None):
+        chunks.append(list(chunk))
+        return fetch_chunk(chunk, shard)
+
+    monkeypatch.setattr(processor, '_fetch_chunk', recording)
+    return chunks
+
+
+def test_more_ids_than_one_chunk_with_duplicates_and_missing_ids(processor, stored, monkeypatch):
+    missing = [4_100_000 + n for n in range(6)]
+    requested = stored[::-1] + stored[:10] + missing + [stored[3]]
+    chunks = spy_on_chunks(processor, monkeypatch)
+
+    rows = list(processor.fetch_users(requested, chunk_size=4))
+
+    assert sorted(row[0] for row in rows) == stored
+    assert {row[1] for row in rows} == {f'bulk{user_id}' for user_id in stored}
+    # Every id is queried once, in the caller's order of first appearance
+    assert [user_id for chunk in chunks for user_id in chunk] == stored[::-1] + missing
+    assert all(len(chunk) <= 4 for chunk in chunks)
+    assert len(chunks) == 8
+
+
+def test_default_chunks_stay_under_the_sqlite_variable_limit(service, processor, stored,
+                                                             monkeypatch):
+    requested = list(range(4_000_001, 4_000_001 + 2 * service.SQLITE_MAX_VARIABLES))
+    chunks = spy_on_chunks(processor, monkeypatch)
+
+    rows = list(processor.fetch_users(requested))
+
+    assert [row[0] for row in rows] == stored
+    assert max(map(len, chunks)) <= service.FETCH_USERS_CHUNK_SIZE
+
+
+def test_sharded_chunks_return_each_row_once(sharded, monkeypatch):
+    for user_id in STORED:
+        with sharded.connect_to_database(user_id) as conn:
+            conn.execute("INSERT INTO user_data (id, username) VALUES (?, ?)",
+                         (user_id, f'bulk{user_id}'))
+
+    rows = list(sharded.fetch_users(STORED + STORED[:5] + [4_100_000], chunk_size=6))
+    assert sorted(row[0] for row in rows) == STORED
+    assert len(rows) == len(STORED)
+
+
+def test_invalid_ids_fail_before_any_query(processor, monkeypatch):
+    chunks = spy_on_chunks(processor, monkeypatch)
+    with pytest.raises(ValueError, match="1 values"):
+        processor.fetch_users(STORED + [0])
+    assert chunks == []
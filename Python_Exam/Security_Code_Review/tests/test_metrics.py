@@ -0,0 +1,25 @@
+"""configure_metrics falling back to record-only when another worker holds the port"""
+
+import logging
+import socket
+
+
+def test_taken_metrics_port_records_without_serving(service, monkeypatch, caplog):
+    with socket.socket() as holder:
+        holder.bind(('127.0.0.1', 0))
+        holder.listen()
+        monkeypatch.setattr(service, 'METRICS_HOST', '127.0.0.1')
+        monkeypatch.setattr(service, 'METRICS_PORT', holder.getsockname()[1])
+        monkeypatch.setattr(service, '_metrics_registry', None)
+        monkeypatch.setattr(service, '_metrics_server', None)
+
+        with caplog.at_level(logging.WARNING):
+            registry = service.configure_metrics()
+
+    assert registry is service.configure_metrics()
+    assert service._metrics_server is None
+    assert 'recording without serving' in caplog.text
+
+    record = registry.wrap('probe', lambda: 1)
+    assert record() == 1
+    assert 'method="probe"' in registry.render()
@@ -0,0 +1,91 @@
+"""NotificationQueue delivery, failure handling and shutdown against the stub SMTP server"""
+
+import socket
+import time
+
+import pytest
+
+from notifications import NotificationQueue, SMTPConnectionPool
+from stub_smtp import StubSMTPServer
+
+SENDER = 'notifications@example.com'
+
+
+@pytest.fixture
+def smtp():
+    with StubSMTPServer(reject_recipients=('bounce@example.com',)) as server:
+        yield server
+
+
+def make_queue(host, port, **kwargs):
+    pool = SMTPConnectionPool(host, port, username=SENDER, password='secret', use_tls=False,
+                              max_size=2, timeout=5)
+    return NotificationQueue(pool, SENDER, **kwargs)
+
+
+def test_batches_share_one_connection(smtp):
+    notifications = make_queue(smtp.host, smtp.port, batch_size=50, workers=1)
+    for number in range(20):
+        notifications.enqueue(f"user{number}@example.com", "Subject", "Body")
+    notifications.flush()
+    assert notifications.close() is True
+
+    stats = notifications.stats()
+    assert (stats['sent'], stats['failed'], stats['queued']) == (20, 0, 0)
+    assert smtp.stats['messages'] == 20
+    assert smtp.stats['logins'] == stats['connects'] == 1
+
+
+def test_refused_message_fails_alone(smtp):
+    notifications = make_queue(smtp.host, smtp.port, batch_size=50, workers=1)
+    notifications.enqueue("first@example.com", "Subject", "Body")
+    notifications.enqueue("bounce@example.com", "Subject", "Body")
+    notifications.enqueue("last@example.com", "Subject", "Body")
+    notifications.flush()
+    notifications.close()
+
+    stats = notifications.stats()
+    assert (stats['sent'], stats['failed']) == (2, 1)
+    assert smtp.stats['refused'] == 1
+    # A 550 is about the message; the connection is kept for the rest of the batch
+    assert stats['connects'] == 1
+
+
+def test_unsendable_message_does_not_kill_the_worker(smtp):
+    notifications = make_queue(smtp.host, smtp.port, batch_size=1, workers=1)
+    # Non-ASCII addresses need SMTPUTF8, which the server does not offer
+    notifications.enqueue("usér@example.com", "Subject", "Body")
+    notifications.flush()
+    notifications.enqueue("after@example.com", "Subject", "Body")
+    notifications.flush()
+
+    assert notifications.close(timeout=5) is True
+    stats = notifications.stats()
+    assert (stats['sent'], stats['failed']) == (1, 1)
+
+
+def test_unreachable_server_fails_messages_and_closes():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]  # Nothing listens here once the socket closes
+
+    notifications = make_queue('127.0.0.1', port, batch_size=10, workers=2)
+    for number in range(5):
+        notifications.enqueue(f"user{number}@example.com", "Subject", "Body")
+
+    assert notifications.close(timeout=5) is True
+    stats = notifications.stats()
+    assert (stats['sent'], stats['failed'], stats['queued']) == (0, 5, 0)
+
+
+def test_close_gives_up_after_timeout():
+    with StubSMTPServer(latency=2.0) as slow:
+        notifications = make_queue(slow.host, slow.port, batch_size=1, workers=1, max_queue=1)
+        notifications.enqueue("first@example.com", "Subject", "Body")
+        time.sleep(0.2)  # The worker is now inside the slow send
+        notifications.enqueue("second@example.com", "Subject", "Body")
+
+        started = time.monotonic()
+        assert notifications.close(timeout=0.3) is False
+        assert time.monotonic() - started < 1.5
+        assert notifications.stats()['queued'] == 1
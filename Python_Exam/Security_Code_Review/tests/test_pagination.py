@@ -0,0 +1,67 @@
+"""Keyset pages over user_data where many rows share one created_at"""
+
+import io
+import json
+import random
+
+import pytest
+
+from export import UserDataExporter
+
+# 3 timestamps x 7 rows each, so every page boundary falls inside a run of ties
+TIMESTAMPS = ('2031-05-01 00:00:00', '2031-05-01 00:00:01', '2031-05-02 12:00:00')
+
+
+def insert_ties(processor, first_id):
+    rows = [(first_id + n, f'tie{n}', TIMESTAMPS[n % 3]) for n in range(21)]
+    random.Random(3).shuffle(rows)  # Insertion order must not matter
+    for user_id, username, created_at in rows:
+        with processor.connect_to_database(user_id) as conn:
+            conn.execute("INSERT INTO user_data (id, username, created_at) VALUES (?, ?, ?)",
+                         (user_id, username, created_at))
+    return sorted((created_at, user_id) for user_id, _, created_at in rows)
+
+
+def all_pages(processor, limit):
+    keys, pages, cursor = [], 0, None
+    while True:
+        rows, cursor = processor.list_users_created_between(
+            '2031-01-01 00:00:00', '2032-01-01 00:00:00', limit=limit, after=cursor
+        )
+        keys += [(row[5], row[0]) for row in rows]
+        pages += 1
+        if cursor is None:
+            return keys, pages
+
+
+@pytest.mark.parametrize('limit', [1, 3, 5, 7, 20, 21])
+def test_pages_break_created_at_ties_by_id(processor, limit):
+    expected = insert_ties(processor, 3_000_000 + 100 * limit)
+    try:
+        keys, pages = all_pages(processor, limit)
+    finally:
+        processor.delete_users([user_id for _, user_id in expected])
+
+    assert keys == expected
+    # Every page but the last is full; a full last page is followed by an empty one
+    assert pages == len(expected) // limit + 1
+
+
+def test_sharded_pages_merge_ties_across_shards(sharded):
+    expected = insert_ties(sharded, 1)
+    assert len({sharded.user_shards.shard_for(user_id) for _, user_id in expected}) == 2
+
+    keys, pages = all_pages(sharded, 4)
+    assert keys == expected
+    assert pages == 6
+
+
+def test_export_pages_visit_every_row_once(sharded):
+    expected = insert_ties(sharded, 1)
+    out = io.BytesIO()
+    stats = UserDataExporter(sharded, page_size=4, decrypt=()).export(out)
+
+    exported = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert sorted((row['created_at'], row['id']) for row in exported) == expected
+    assert stats['rows'] == len(expected)
+    assert stats['pages'] > 2
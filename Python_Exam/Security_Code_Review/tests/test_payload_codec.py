@@ -0,0 +1,36 @@
+"""Payload encoding of call_external_api, including what orjson refuses to encode"""
+
+import json
+
+import pytest
+
+from payload_codec import EncodeError, PayloadCodec, get_serializer
+
+
+def test_orjson_falls_back_to_json_for_non_string_keys():
+    pytest.importorskip('orjson')
+    serializer = get_serializer('orjson')
+    payload = {1: 'a', 'big': 2 ** 70}
+    assert json.loads(serializer.dumps(payload)) == {'1': 'a', 'big': 2 ** 70}
+
+
+def test_unencodable_payload_raises_encode_error_without_the_value():
+    codec = PayloadCodec(get_serializer('json'))
+    with pytest.raises(EncodeError) as excinfo:
+        codec.encode({'secret': {'4111-1111'}})
+    assert '4111' not in str(excinfo.value)
+
+
+def test_call_external_api_with_non_string_keys(processor, stub):
+    assert processor.call_external_api({1: 'a'})['status'] == 'ok'
+    assert stub.requests == {'/process': 1}
+
+
+def test_unencodable_payload_is_an_api_error_and_never_sent(service, processor, stub):
+    with pytest.raises(service.APIError) as excinfo:
+        processor.call_external_api({'value': object()})
+    assert isinstance(excinfo.value.__cause__, EncodeError)
+
+    assert stub.requests == {}
+    circuit = processor.api_resilience_stats()['circuit']
+    assert (circuit['failures'], circuit['state']) == (0, 'closed')
@@ -0,0 +1,149 @@
+"""PermissionIndex refreshes, the async webhook path staying responsive, and seeding grants"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from permissions import PermissionIndex, main
+from schema import USER_DATA_MIGRATIONS
+
+REQUESTER = 7
+
+
+class SlowDatabase:
+    """Permissions table in a temporary file whose connections take `delay` seconds"""
+
+    def __init__(self, path, delay=0.0):
+        self.path = str(path)
+        self.delay = delay
+        self.connects = 0
+        with self.connect() as conn:
+            for _, statements in USER_DATA_MIGRATIONS:
+                for statement in statements:
+                    if 'permissions' in statement:
+                        conn.execute(statement)
+
+    @contextmanager
+    def connect(self):
+        self.connects += 1
+        time.sleep(self.delay)
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def test_due_refresh_runs_in_the_background(tmp_path):
+    database = SlowDatabase(tmp_path / 'permissions.db')
+    index = PermissionIndex(database.connect, refresh_interval=0.05)
+    index.grant(REQUESTER, 'update_user')
+    assert index.allows(REQUESTER, 'update_user')
+
+    # Another worker revokes the grant; this index sees it on its next refresh
+    other = PermissionIndex(database.connect)
+    other.revoke(REQUESTER, 'update_user')
+    database.delay = 0.3
+    time.sleep(0.06)
+
+    started = time.monotonic()
+    assert index.allows(REQUESTER, 'update_user')  # Answered from the current index
+    assert time.monotonic() - started < 0.1
+
+    deadline = time.monotonic() + 2
+    while index.allows(REQUESTER, 'update_user') and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert not index.allows(REQUESTER, 'update_user')
+    assert index.stats()['refreshes'] >= 1
+
+
+def test_ensure_loaded_loads_once(tmp_path):
+    database = SlowDatabase(tmp_path / 'permissions.db')
+    index = PermissionIndex(database.connect, refresh_interval=60)
+    assert not index.loaded
+
+    threads = [threading.Thread(target=index.ensure_loaded) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert index.loaded
+    assert index.stats()['full_loads'] == 1
+
+
+def test_async_webhook_does_not_block_the_event_loop_on_the_first_load(
+        service, stub, tmp_path):
+    pytest.importorskip('aiohttp')
+    from async_processor import AsyncSecureDataProcessor
+
+    database = SlowDatabase(tmp_path / 'permissions.db')
+    PermissionIndex(database.connect).grant(REQUESTER, 'update_user')
+    database.delay = 0.3
+    data = {'user_id': 1, 'action': 'update_user', 'requester_id': REQUESTER}
+    body = json.dumps(data, sort_keys=True).encode()
+    signature = hmac.new(service.WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+    async def deliver():
+        async with AsyncSecureDataProcessor(stub.url, stub.webhook_url) as processor:
+            processor.processor._permissions = PermissionIndex(database.connect)
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticking = asyncio.create_task(ticker())
+            result = await processor.process_webhook_data(data, signature)
+            ticking.cancel()
+            return result, ticks
+
+    result, ticks = asyncio.run(deliver())
+    assert result == {'status': 'processed', 'webhook_response': 200}
+    # The 0.3s load ran in a worker thread while the loop kept ticking
+    assert ticks >= 15
+
+
+def test_seed_cli_grants_on_a_fresh_database(tmp_path, capsys):
+    database = str(tmp_path / 'fresh.db')
+    grants = tmp_path / 'grants.txt'
+    grants.write_text("# requester:action\n8:update_user\n\n9:delete_user  # ops\n")
+    main(['--database', database, '--grant', f'{REQUESTER}:update_user', '--file', str(grants),
+          '--revoke', '9:delete_user'])
+    assert "Wrote 4 permission change(s)" in capsys.readouterr().out
+
+    @contextmanager
+    def connect():
+        conn = sqlite3.connect(database)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    index = PermissionIndex(connect, logger=logging.getLogger('test'))
+    assert index.allows(REQUESTER, 'update_user')
+    assert index.allows(8, 'update_user')
+    assert not index.allows(9, 'delete_user')
+
+    with pytest.raises(SystemExit):
+        main(['--database', database, '--grant', 'seven:update_user'])
+
+
+def test_empty_permissions_table_warns_on_load(tmp_path, caplog):
+    database = SlowDatabase(tmp_path / 'permissions.db')
+    index = PermissionIndex(database.connect, logger=logging.getLogger('test'))
+    with caplog.at_level(logging.WARNING):
+        assert not index.allows(REQUESTER, 'update_user')
+    assert "every webhook is denied" in caplog.text
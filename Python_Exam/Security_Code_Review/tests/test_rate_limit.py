@@ -0,0 +1,150 @@
+"""TokenBucket, AdaptiveConcurrency and EndpointLimiter against the stub server's 429 throttling"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from rate_limit import AdaptiveConcurrency, EndpointLimiter, RateLimited, parse_retry_after
+from stub_server import StubServer
+
+requests = pytest.importorskip('requests')
+
+
+def post(session, limiter, stub):
+    """One limited call to the stub, reported back to the limiter like the processor does"""
+    started = limiter.acquire()
+    try:
+        response = session.post(f"{stub.url}/process", json={'value': 1}, timeout=5)
+    except requests.RequestException:
+        limiter.release(started, error=True)
+        raise
+    limiter.release(started, status=response.status_code,
+                    retry_after=parse_retry_after(response.headers.get('Retry-After')))
+    return response.status_code
+
+
+def test_token_bucket_keeps_client_under_upstream_rate():
+    with StubServer(throttle_rate=20, throttle_burst=5) as stub, requests.Session() as session:
+        limiter = EndpointLimiter('stub', rate=15, burst=5)
+        statuses = [post(session, limiter, stub) for _ in range(20)]
+
+    assert statuses == [200] * 20
+    assert 'throttled' not in stub.requests
+
+
+def test_throttling_cuts_concurrency():
+    with StubServer(throttle_rate=5, throttle_burst=2, retry_after=0.1) as stub:
+        limiter = EndpointLimiter('stub', initial=8, max_limit=8, cooldown=0.0)
+
+        def worker():
+            with requests.Session() as session:
+                for _ in range(3):
+                    post(session, limiter, stub)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    stats = limiter.stats()
+    assert stub.requests['throttled'] > 0
+    assert stats['throttled'] == stub.requests['throttled']
+    assert stats['decreases'] > 0
+    assert stats['limit'] < 8
+    assert stats['in_flight'] == 0
+
+
+def test_retry_after_pauses_the_next_call():
+    with StubServer(throttle_rate=1, throttle_burst=1, retry_after=1) as stub, \
+            requests.Session() as session:
+        limiter = EndpointLimiter('stub')
+        assert post(session, limiter, stub) == 200
+        assert post(session, limiter, stub) == 429
+
+        started = time.monotonic()
+        assert post(session, limiter, stub) == 200
+        assert time.monotonic() - started >= 0.9
+
+    assert stub.requests['throttled'] == 1
+
+
+def test_fast_outlier_and_client_errors_do_not_pin_the_baseline():
+    limiter = AdaptiveConcurrency(initial=4, max_limit=64, baseline_window=20, cooldown=0.0)
+
+    def call(latency, status=200):
+        limiter.acquire(timeout=0)
+        limiter.release(latency, status=status)
+
+    for _ in range(20):
+        call(0.010)
+    call(0.0001)
+    for _ in range(10):
+        call(0.0001, status=404)
+    for _ in range(40):
+        call(0.010)
+
+    stats = limiter.stats()
+    assert stats['slow'] == 0
+    assert stats['decreases'] == 0
+    assert stats['baseline_latency'] == pytest.approx(0.010)
+
+
+def test_baseline_follows_a_lasting_slowdown():
+    limiter = AdaptiveConcurrency(initial=4, baseline_window=20, cooldown=0.0)
+    for latency in [0.010] * 20 + [0.050] * 40:
+        limiter.acquire(timeout=0)
+        limiter.release(latency, status=200)
+
+    stats = limiter.stats()
+    assert stats['baseline_latency'] == pytest.approx(0.050)
+    # Only the calls before the window caught up counted as slow
+    assert 0 < stats['slow'] < 40
+
+
+def test_acquire_applies_one_deadline_and_refunds_the_token():
+    limiter = EndpointLimiter('stub', rate=2, burst=1, initial=1, max_limit=1)
+    held = limiter.acquire()
+
+    started = time.monotonic()
+    with pytest.raises(RateLimited):
+        # Half a second for the token, then no slot: both within the 0.6s timeout
+        limiter.acquire(timeout=0.6)
+    elapsed = time.monotonic() - started
+    assert 0.55 <= elapsed < 0.9
+
+    assert limiter.bucket.try_acquire()
+    limiter.release(held, status=200)
+    assert limiter.stats()['in_flight'] == 0
+
+
+def test_acquire_async_applies_one_deadline_and_refunds_the_token():
+    limiter = EndpointLimiter('stub', rate=2, burst=1, initial=1, max_limit=1)
+
+    async def scenario():
+        held = await limiter.acquire_async()
+        started = time.monotonic()
+        with pytest.raises(RateLimited):
+            await limiter.acquire_async(timeout=0.6)
+        elapsed = time.monotonic() - started
+        limiter.release(held, status=200)
+        return elapsed
+
+    assert 0.55 <= asyncio.run(scenario()) < 0.9
+    assert limiter.bucket.try_acquire()
+    assert limiter.stats()['in_flight'] == 0
+
+
+def test_stats_report_the_peak_in_flight():
+    limiter = AdaptiveConcurrency(initial=3, max_limit=3)
+    for _ in range(3):
+        limiter.acquire(timeout=0)
+    with pytest.raises(RateLimited):
+        limiter.acquire(timeout=0)
+    for _ in range(3):
+        limiter.release(0.01, status=200)
+
+    stats = limiter.stats()
+    assert (stats['in_flight'], stats['peak_in_flight']) == (0, 3)
@@ -0,0 +1,73 @@
+"""Circuit breaker and hedging behaviour of call_external_api and the Hedger"""
+
+import threading
+import time
+
+import pytest
+
+from resilience import CircuitBreaker, Hedger
+
+
+def test_failed_half_open_probe_does_not_wedge_the_breaker(service, processor, monkeypatch):
+    breaker = processor.api_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    def broken(*args):
+        raise RuntimeError("bug before the request was sent")
+
+    # The half-open probe fails with something other than APIError
+    monkeypatch.setattr(processor, '_post_api', broken)
+    with pytest.raises(RuntimeError):
+        processor.call_external_api({'value': 1})
+    monkeypatch.undo()
+
+    assert processor.call_external_api({'value': 1})['status'] == 'ok'
+    assert breaker.stats()['state'] == CircuitBreaker.CLOSED
+
+
+def test_open_breaker_fails_fast(service, processor):
+    breaker = processor.api_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+
+    with pytest.raises(service.APIError):
+        processor.call_external_api({'value': 1})
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_saturated_pool_runs_the_call_on_the_callers_thread():
+    hedger = Hedger(min_delay=0.05, default_delay=0.05, max_hedge_ratio=1.0, max_workers=1)
+    busy = threading.Event()
+    # A slow call holds the only pool thread
+    holder = threading.Thread(target=hedger.call, args=(busy.wait, 5))
+    holder.start()
+    time.sleep(0.02)
+    try:
+        started = time.monotonic()
+        assert hedger.call(lambda: threading.current_thread()) is threading.current_thread()
+        assert time.monotonic() - started < 0.05
+    finally:
+        busy.set()
+        holder.join()
+        hedger.close()
+
+    stats = hedger.stats()
+    assert stats['saturated'] >= 1
+    assert (stats['hedged'], stats['not_hedged']) == (0, 2)
+
+
+def test_slow_attempt_is_hedged():
+    hedger = Hedger(min_delay=0.02, default_delay=0.02, max_hedge_ratio=1.0)
+    calls = []
+
+    def slow_first(value):
+        calls.append(value)
+        if len(calls) == 1:
+            time.sleep(0.3)
+        return value
+
+    try:
+        assert hedger.call(slow_first, 'x') == 'x'
+    finally:
+        hedger.close()
+    assert hedger.stats()['hedge_won'] == 1
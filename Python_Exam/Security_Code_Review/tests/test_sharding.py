@@ -0,0 +1,81 @@
+"""Shard routing, scatter-gather ordering and an offline rebalance round-trip"""
+
+import sqlite3
+import time
+from collections import Counter
+
+from schema import USER_DATA_COLUMNS
+from sharding import ShardedUserStore, rebalance, shard_index, shard_paths
+
+
+def tables(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+
+
+def user_rows(database, count):
+    rows = []
+    for path in shard_paths(database, count):
+        conn = sqlite3.connect(path)
+        try:
+            rows += conn.execute("SELECT * FROM user_data").fetchall()
+        finally:
+            conn.close()
+    return sorted(rows)
+
+
+def test_shard_index_is_stable_and_even():
+    # Pinned: changing the hash silently moves every row to the wrong shard
+    assert ([shard_index(user_id, 4) for user_id in range(1, 13)]
+            == [2, 0, 3, 1, 0, 2, 1, 3, 2, 0, 3, 1])
+    assert [shard_index(user_id, 7) for user_id in (1, 1000, 123456789, 2 ** 62)] == [4, 0, 5, 1]
+
+    spread = Counter(shard_index(user_id, 8) for user_id in range(1, 8001))
+    assert set(spread) == set(range(8))
+    assert max(spread.values()) - min(spread.values()) < 100
+
+
+def test_scatter_returns_results_in_shard_order(tmp_path):
+    store = ShardedUserStore(str(tmp_path / 'app.db'), 4)
+    try:
+        def slowest_first(shard):
+            time.sleep(0.05 * (4 - shard))
+            return shard
+
+        assert store.scatter(slowest_first) == [0, 1, 2, 3]
+        assert store.scatter(slowest_first, shards=[3, 1]) == [3, 1]
+    finally:
+        store.close()
+        for pool in store.pools:
+            pool.close_all()
+
+
+def test_rebalance_round_trip(tmp_path):
+    database = str(tmp_path / 'app.db')
+    rows = [(user_id, f'user{user_id}', 'hash', b'card', b'ssn', '2024-01-01 00:00:00')
+            for user_id in range(1, 251)]
+    conn = sqlite3.connect(database)
+    with conn:
+        conn.execute(f"CREATE TABLE user_data ({', '.join(USER_DATA_COLUMNS)})")
+        conn.executemany("INSERT INTO user_data VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.close()
+
+    assert rebalance(database, 1, 3, batch_size=40, drop_source=True, log=lambda _: None) == 250
+    assert user_rows(database, 1) == []
+    for index, path in enumerate(shard_paths(database, 3)):
+        conn = sqlite3.connect(path)
+        ids = [user_id for (user_id,) in conn.execute("SELECT id FROM user_data")]
+        conn.close()
+        assert ids and all(shard_index(user_id, 3) == index for user_id in ids)
+        # Webhook deliveries and permissions stay in the main database
+        assert tables(path) == {'user_data'}
+
+    assert rebalance(database, 3, 2, batch_size=40, drop_source=True, log=lambda _: None) == 250
+    assert user_rows(database, 2) == rows
+    assert not any(tmp_path.glob('app.shard*-of-3*'))
+
+    assert rebalance(database, 2, 1, log=lambda _: None) == 250
+    assert user_rows(database, 1) == rows
@@ -0,0 +1,103 @@
+"""Webhook delivery dedup on the sync, queued and async paths"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+import uuid
+
+import pytest
+
+REQUESTER = 7
+
+
+def sign(service, webhook_data):
+    body = json.dumps(webhook_data, sort_keys=True).encode()
+    return hmac.new(service.WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+@pytest.fixture
+def webhook(service, processor):
+    processor.grant_permission(REQUESTER, 'update_user')
+    data = {'user_id': 1, 'action': 'update_user', 'requester_id': REQUESTER}
+    return data, sign(service, data)
+
+
+def test_identical_payloads_without_delivery_id_are_both_processed(processor, stub, webhook):
+    data, signature = webhook
+    first = processor.process_webhook_data(data, signature)
+    second = processor.process_webhook_data(data, signature)
+
+    assert first == second == {'status': 'processed', 'webhook_response': 200}
+    assert stub.requests['/webhook'] == 2
+
+
+def test_repeated_delivery_id_is_answered_from_the_stored_result(processor, stub, webhook):
+    data, signature = webhook
+    delivery_id = uuid.uuid4().hex
+    first = processor.process_webhook_data(data, signature, delivery_id=delivery_id)
+    second = processor.process_webhook_data(data, signature, delivery_id=delivery_id)
+
+    assert first == second == {'status': 'processed', 'webhook_response': 200}
+    assert stub.requests['/webhook'] == 1
+
+
+def test_ingestor_queues_identical_payloads_without_delivery_id(processor, stub, webhook):
+    from webhook_ingest import WebhookIngestor
+
+    data, signature = webhook
+    ingestor = WebhookIngestor(processor, workers=1)
+    delivery_id = uuid.uuid4().hex
+    for _ in range(2):
+        ingestor.submit(data, signature)
+        ingestor.submit(data, signature, delivery_id=delivery_id)
+    ingestor.close()
+
+    stats = ingestor.stats()
+    assert (stats['accepted'], stats['duplicates'], stats['processed']) == (3, 1, 3)
+    assert stub.requests['/webhook'] == 3
+
+
+def test_async_path_deduplicates_delivery_ids(service, stub, webhook):
+    pytest.importorskip('aiohttp')
+    from async_processor import AsyncSecureDataProcessor
+
+    data, signature = webhook
+    delivery_id = uuid.uuid4().hex
+
+    async def deliver():
+        async with AsyncSecureDataProcessor(stub.url, stub.webhook_url) as processor:
+            return [
+                await processor.process_webhook_data(data, signature, delivery_id=delivery_id),
+                await processor.process_webhook_data(data, signature, delivery_id=delivery_id),
+                await processor.process_webhook_data(data, signature),
+            ]
+
+    results = asyncio.run(deliver())
+    assert results == [{'status': 'processed', 'webhook_response': 200}] * 3
+    assert stub.requests['/webhook'] == 2
+
+
+def test_claim_timeout_outlasts_the_slowest_delivery(service, processor):
+    slowest = (service.OUTBOUND_ACQUIRE_TIMEOUT + 2 * service.WEBHOOK_FORWARD_TIMEOUT
+               + 2 * service.DB_POOL_TIMEOUT)
+    assert service.WEBHOOK_DEDUP_CLAIM_TIMEOUT > slowest
+    assert processor.webhook_dedup.claim_timeout == service.WEBHOOK_DEDUP_CLAIM_TIMEOUT
+
+
+def test_renewed_claim_is_not_taken_over(processor):
+    from webhook_dedup import WebhookDedupStore
+
+    store = WebhookDedupStore(processor.connect_to_database, capacity=1000, claim_timeout=0.3)
+    key = uuid.uuid4().hex
+    assert store.claim(key) == (True, None)
+
+    time.sleep(0.2)
+    store.renew([key])
+    time.sleep(0.2)
+    # Past the original timeout, but within the renewed one
+    assert store.claim(key) == (False, None)
+
+    time.sleep(0.35)
+    assert store.claim(key) == (True, None)
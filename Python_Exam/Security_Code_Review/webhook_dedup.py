@@ -0,0 +1,219 @@
+"""
+Webhook Deduplication
+Time-windowed delivery dedup: a rotating Bloom filter in front of an exact SQLite table
+"""
+
+import hashlib
+import json
+import math
+import threading
+import time
+
+
+class RotatingBloomFilter:
+    """Fixed-memory Bloom filter that forgets keys older than `window` seconds
+
+    Made of `generations` slices, each covering window / (generations - 1)
+    seconds. Keys go into the newest slice and are looked up in all of them;
+    when the newest slice's period ends the oldest one is cleared and reused.
+    A key is therefore remembered for at least `window` seconds, and memory
+    never grows with traffic. `capacity` is the number of keys expected per
+    window, at which the false positive rate stays below `error_rate`.
+    """
+
+    def __init__(self, capacity, error_rate=0.001, window=86400.0, generations=4):
+        if generations < 2:
+            raise ValueError("generations must be at least 2")
+        self.window = window
+        self.period = window / (generations - 1)
+        per_slice = max(1, math.ceil(capacity / (generations - 1)))
+        # A lookup checks every slice, so each gets a share of the error budget
+        slice_error = error_rate / generations
+        self.num_bits = max(8, math.ceil(-per_slice * math.log(slice_error) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / per_slice * math.log(2)))
+
+        self._slices = [bytearray((self.num_bits + 7) // 8) for _ in range(generations)]
+        self._current = 0
+        self._period_ends = time.monotonic() + self.period
+        self._lock = threading.Lock()
+
+    @property
+    def memory_bytes(self):
+        return sum(len(bits) for bits in self._slices)
+
+    def _positions(self, key):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def _rotate(self, now):
+        # Called with the lock held
+        while now >= self._period_ends:
+            self._current = (self._current + 1) % len(self._slices)
+            self._slices[self._current] = bytearray(len(self._slices[self._current]))
+            self._period_ends += self.period
+
+    def add(self, key):
+        positions = self._positions(key)
+        with self._lock:
+            self._rotate(time.monotonic())
+            bits = self._slices[self._current]
+            for position in positions:
+                bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        positions = self._positions(key)
+        with self._lock:
+            self._rotate(time.monotonic())
+            return any(all(bits[position >> 3] & (1 << (position & 7)) for position in positions)
+                       for bits in self._slices)
+
+
+class WebhookDedupStore:
+    """Exactly-once claims on webhook deliveries, with stored results for duplicates
+
+    claim() returns (True, None) when the caller should process a delivery,
+    or (False, result) for a duplicate: the stored result, or None while the
+    first delivery is still being processed. After processing, complete()
+    stores the result to answer later duplicates; release() forgets a claim
+    that failed transiently so the sender's retry is processed again.
+
+    The webhook_deliveries table is the source of truth and is shared by every
+    worker process on the database. The in-process Bloom filter only answers
+    "definitely new" for the common case, so a new delivery costs one insert
+    and no lookup. Claims older than `window` seconds are purged, and a claim
+    still unfinished after `claim_timeout` seconds (e.g. its worker died) can
+    be taken over. Size `claim_timeout` above the slowest processing time, or
+    renew() claims that are held longer, e.g. while queued.
+    """
+
+    def __init__(self, connect, window=86400.0, capacity=1000000, error_rate=0.001,
+                 claim_timeout=60.0, purge_every=10000):
+        self.connect = connect  # Context manager yielding a connection, committing on exit
+        self.window = window
+        self.claim_timeout = claim_timeout
+        self.purge_every = purge_every
+        self.bloom = RotatingBloomFilter(capacity, error_rate, window)
+
+        self._claims = 0
+        self._lock = threading.Lock()
+        self._stats = {'claimed': 0, 'duplicates': 0, 'in_progress': 0, 'bloom_negative': 0,
+                       'bloom_false_positive': 0, 'purged': 0}
+        self._warm()
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _warm(self):
+        """Load keys still inside the window, so a restart does not forget recent deliveries"""
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT delivery_key FROM webhook_deliveries WHERE created_at >= ?",
+                (time.time() - self.window,)
+            )
+            for (key,) in rows:
+                self.bloom.add(key)
+
+    def claim(self, key):
+        """Return (True, None) to process the delivery, or (False, stored result or None)"""
+        now = time.time()
+        if key in self.bloom:
+            with self.connect() as conn:
+                row = conn.execute(
+                    "SELECT result, created_at FROM webhook_deliveries WHERE delivery_key = ?",
+                    (key,)
+                ).fetchone()
+            if row is not None and row[1] >= now - self.window:
+                if row[0] is not None:
+                    self._count('duplicates')
+                    return False, json.loads(row[0])
+                if row[1] >= now - self.claim_timeout:
+                    self._count('in_progress')
+                    return False, None
+            elif row is None:
+                self._count('bloom_false_positive')
+        else:
+            self._count('bloom_negative')
+
+        with self.connect() as conn:
+            # Inserts, or takes over an expired or abandoned claim; a concurrent
+            # claim from another thread or process leaves rowcount at 0
+            claimed = conn.execute(
+                """
+                INSERT INTO webhook_deliveries (delivery_key, result, created_at)
+                VALUES (?, NULL, ?)
+                ON CONFLICT (delivery_key) DO UPDATE
+                SET result = NULL, created_at = excluded.created_at
+                WHERE webhook_deliveries.created_at < ?
+                   OR (webhook_deliveries.result IS NULL AND webhook_deliveries.created_at < ?)
+                """,
+                (key, now, now - self.window, now - self.claim_timeout)
+            ).rowcount == 1
+            if not claimed:
+                # Lost the race; the winner may already have finished
+                row = conn.execute(
+                    "SELECT result FROM webhook_deliveries WHERE delivery_key = ?", (key,)
+                ).fetchone()
+        self.bloom.add(key)
+        if not claimed:
+            if row is not None and row[0] is not None:
+                self._count('duplicates')
+                return False, json.loads(row[0])
+            self._count('in_progress')
+            return False, None
+
+        self._count('claimed')
+        self._maybe_purge(now)
+        return True, None
+
+    def complete(self, key, result):
+        """Store the result returned to later duplicates of this delivery"""
+        with self.connect() as conn:
+            conn.execute(
+                "UPDATE webhook_deliveries SET result = ? WHERE delivery_key = ?",
+                (json.dumps(result), key)
+            )
+
+    def renew(self, keys):
+        """Restart the claim timeout of unfinished claims still being worked on"""
+        now = time.time()
+        with self.connect() as conn:
+            conn.executemany(
+                "UPDATE webhook_deliveries SET created_at = ? "
+                "WHERE delivery_key = ? AND result IS NULL",
+                ((now, key) for key in keys)
+            )
+
+    def release(self, key):
+        """Drop an unfinished claim so a retry of the delivery is processed"""
+        with self.connect() as conn:
+            conn.execute(
+                "DELETE FROM webhook_deliveries WHERE delivery_key = ? AND result IS NULL",
+                (key,)
+            )
+
+    def _maybe_purge(self, now):
+        with self._lock:
+            self._claims += 1
+            if self._claims % self.purge_every:
+                return
+        self.purge(now)
+
+    def purge(self, now=None):
+        """Delete claims older than the window; returns how many were removed"""
+        cutoff = (time.time() if now is None else now) - self.window
+        with self.connect() as conn:
+            removed = conn.execute(
+                "DELETE FROM webhook_deliveries WHERE created_at < ?", (cutoff,)
+            ).rowcount
+        self._count('purged', removed)
+        return removed
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['bloom_bytes'] = self.bloom.memory_bytes
+        return stats
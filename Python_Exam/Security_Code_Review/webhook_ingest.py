@@ -0,0 +1,224 @@
+"""
+Webhook Ingestion
+Acknowledge verified webhooks immediately and process them on a worker pool
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', '10000'))
+WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', '2'))
+WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', '200'))
+WEBHOOK_FORWARD_CONCURRENCY = int(os.environ.get('WEBHOOK_FORWARD_CONCURRENCY', '16'))
+WEBHOOK_ENQUEUE_TIMEOUT = float(os.environ.get('WEBHOOK_ENQUEUE_TIMEOUT', '0.5'))
+
+
+class IngestQueueFull(Exception):
+    """Raised when the ingestion queue stays full for the whole enqueue timeout"""
+    pass
+
+
+class WebhookIngestor:
+    """Bounded queue plus workers that batch deletes and forward concurrently
+
+    submit() verifies the HMAC signature on the caller's thread and returns as
+    soon as the webhook is queued. Workers take up to `batch_size` webhooks at
+    a time, validate and authorize each one, delete every `delete_user` target
+    of the batch in one transaction and then forward the batch downstream
+    concurrently. When the queue is full, submit() blocks for up to
+    `enqueue_timeout` seconds and then raises IngestQueueFull so callers can
+    answer 429/503 and let the sender retry. With the processor's dedup store
+    enabled, a repeated delivery id is answered from the stored result (or
+    as still accepted) and never queued twice.
+    """
+
+    _STOP = object()
+
+    def __init__(self, processor, max_queue=WEBHOOK_QUEUE_SIZE, workers=WEBHOOK_WORKERS,
+                 batch_size=WEBHOOK_BATCH_SIZE, forward_concurrency=WEBHOOK_FORWARD_CONCURRENCY,
+                 enqueue_timeout=WEBHOOK_ENQUEUE_TIMEOUT):
+        self.processor = processor
+        self.logger = processor.logger
+        self.batch_size = batch_size
+        self.enqueue_timeout = enqueue_timeout
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._forwarder = ThreadPoolExecutor(forward_concurrency, thread_name_prefix='webhook-fwd')
+        self._stats_lock = threading.Lock()
+        self._stats = {'accepted': 0, 'rejected': 0, 'duplicates': 0, 'processed': 0,
+                       'invalid': 0, 'unauthorized': 0, 'failed': 0, 'delete_batches': 0}
+        self._workers = [
+            threading.Thread(target=self._run, name=f'webhook-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, webhook_data, signature, delivery_id=None):
+        """Verify and queue a webhook; raises AuthenticationError or IngestQueueFull"""
+        self.processor.verify_webhook_signature(webhook_data, signature)
+        return self._enqueue(webhook_data, self.processor.webhook_delivery_key(delivery_id))
+
+    def submit_body(self, raw_body, signature, delivery_id=None):
+        """Verify the HMAC over the raw body, parse it and queue the webhook
+
+        Raises AuthenticationError, ValueError for malformed JSON, or IngestQueueFull.
+        """
+        webhook_data = self.processor.verify_webhook_body(raw_body, signature)
+        return self._enqueue(webhook_data, self.processor.webhook_delivery_key(delivery_id))
+
+    def _enqueue(self, webhook_data, key):
+        dedup = self.processor.webhook_dedup if key else None
+        if dedup is not None:
+            claimed, stored = dedup.claim(key)
+            if not claimed:
+                self._count('duplicates')
+                return stored or {"status": "accepted"}
+        try:
+            self._queue.put((key, webhook_data), timeout=self.enqueue_timeout)
+        except queue.Full as e:
+            if dedup is not None:
+                dedup.release(key)
+            self._count('rejected')
+            self.logger.warning("Webhook queue full, rejecting delivery")
+            raise IngestQueueFull("Webhook queue is full") from e
+        self._count('accepted')
+        return {"status": "accepted"}
+
+    def _settle(self, key, result=None):
+        """Store a delivery's final result, or release it (result None) for a retry"""
+        dedup = self.processor.webhook_dedup if key else None
+        if dedup is None:
+            return
+        if result is None:
+            dedup.release(key)
+        else:
+            dedup.complete(key, result)
+
+    def _renew(self, keys):
+        """Keep the claims of webhooks still queued or being processed from timing out"""
+        dedup = self.processor.webhook_dedup
+        keys = [key for key in keys if key]
+        if dedup is not None and keys:
+            dedup.renew(keys)
+        return dedup
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _next_batch(self):
+        item = self._queue.get()
+        batch = [item]
+        while item is not self._STOP and len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is self._STOP
+            webhooks = batch[:-1] if stop else batch
+            settled = set()
+            try:
+                if webhooks:
+                    self._process_batch(webhooks, settled)
+            except Exception as e:
+                self.logger.error("Webhook batch failed: %s", type(e).__name__)
+                # Webhooks that already have an outcome keep it and are counted once
+                for index, (key, _) in enumerate(webhooks):
+                    if index not in settled:
+                        self._finish(key, 'failed')
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _finish(self, key, outcome, result=None):
+        """Count a webhook's outcome and store its result (None releases it for a retry)"""
+        self._count(outcome)
+        self._settle(key, result)
+
+    def _process_batch(self, webhooks, settled):
+        """Validate, delete and forward a batch; adds the index of each finished webhook to settled"""
+        # The queue wait counted against the claims; restart their timeout
+        dedup = self._renew([key for key, _ in webhooks])
+        valid = []
+        delete_ids = []
+        update_ids = []
+        for index, (key, webhook_data) in enumerate(webhooks):
+            # Same outcomes as SecureDataProcessor.process_webhook_data
+            try:
+                user_id, action = self.processor.validate_webhook(webhook_data)
+            except ValueError as e:
+                self.logger.error("Webhook validation failed: %s", e)
+                self._finish(key, 'invalid', {"status": "error", "message": "Invalid webhook data"})
+                settled.add(index)
+                continue
+            except PermissionError as e:
+                self.logger.warning("Webhook rejected: %s", e)
+                self._finish(key, 'unauthorized', {"status": "error", "message": "Not authorized"})
+                settled.add(index)
+                continue
+            except Exception as e:
+                # e.g. PermissionsUnavailable; the sender's retry may succeed
+                self.logger.error("Webhook processing failed: %s", type(e).__name__)
+                self._finish(key, 'failed')
+                settled.add(index)
+                continue
+            valid.append((index, key, webhook_data))
+            if action == 'delete_user':
+                delete_ids.append(user_id)
+            elif action == 'update_user':
+                update_ids.append(user_id)
+
+        if delete_ids:
+            # One transaction for every delete in the batch
+            self.processor.delete_users(delete_ids)
+            self._count('delete_batches')
+        if update_ids:
+            self.processor.invalidate_cached_users(update_ids)
+
+        futures = [self._forwarder.submit(self.processor.forward_webhook, webhook_data)
+                   for _, _, webhook_data in valid]
+        pending = set(futures)
+        while pending:
+            # A large batch can outlast the claim timeout, so renew as it goes
+            _, pending = wait(pending, timeout=dedup.claim_timeout / 3 if dedup else None)
+            if pending:
+                self._renew([key for (_, key, _), future in zip(valid, futures)
+                             if future in pending])
+        for (index, key, _), future in zip(valid, futures):
+            error = future.exception()
+            if error is None:
+                self._finish(key, 'processed',
+                             {"status": "processed", "webhook_response": future.result()})
+            else:
+                self.logger.error("Webhook forward failed: %s", type(error).__name__)
+                self._finish(key, 'failed')
+            settled.add(index)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+    def flush(self):
+        """Block until every queued webhook has been processed"""
+        self._queue.join()
+
+    def close(self):
+        """Process what is queued, then stop the workers"""
+        for _ in self._workers:
+            self._queue.put(self._STOP)
+        for worker in self._workers:
+            worker.join()
+        self._forwarder.shutdown(wait=True)